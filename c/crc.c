@@ -1,17 +1,202 @@
 /* Library for CRC calculation */
 
+#include <stddef.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <strings.h>
+#include <pthread.h>
 #include "crc.h"
 
+/*
+** the folding engine uses the carry-less multiply (PCLMULQDQ) and crc32
+** (SSE4.2) instructions; it is compiled in on x86 with gcc or clang and
+** used when the CPU reports the instructions at run time; define
+** CRC_NO_FOLD to leave it out
+*/
+#if !defined(CRC_NO_FOLD) && defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#define CRC_HAVE_FOLD 1
+#include <immintrin.h>
+#endif
+
 #define TRUE  1
 #define FALSE 0
 #define NONE  0
 
-/* lookup table for table driven CRC algorithm */
-uint32_t crcLookupTable[256];
-uint32_t lastPoly = 0;
+/* number of lookup tables kept in the table cache */
+#define CRC_CACHE_SIZE 8
+
+/* largest number of tables for the slicing-by-N algorithm */
+#define CRC_MAX_SLICES 16
+
+/*
+** message sizes from which crc_update() switches from the byte at a time
+** loop to slicing-by-8 and slicing-by-16
+*/
+#define CRC_SLICE8_THRESHOLD  64
+#define CRC_SLICE16_THRESHOLD 1024
+
+/*
+** crc_parallel() gives each thread at least this many bytes, and threads
+** pass their chunk to the table engine in pieces of at most this size
+*/
+#define CRC_PARALLEL_MIN_CHUNK (1 << 20)
+#define CRC_PARALLEL_PIECE     (1 << 24)
+
+/* message size from which crc_update() uses the folding engine */
+#define CRC_FOLD_THRESHOLD 256
+
+/* crc_update_range() forms the xor of the old and new bytes in pieces of this size */
+#define CRC_RANGE_PIECE 1024
+
+/* crc_iov() passes fragments to the engine in pieces of at most this size */
+#define CRC_IOV_PIECE (1 << 30)
+
+/*
+** crc_multi_update() runs every model over a block of this size before
+** moving on, so that each block is read from memory once and then stays in
+** the level 1 cache for the other models
+*/
+#define CRC_MULTI_BLOCK (16 << 10)
+
+/*
+** engines a model can use, noted when its tables are built; they only run
+** if the CPU has them too (see crcCpuEngines)
+*/
+#define CRC_ENGINE_CLMUL  0x01
+#define CRC_ENGINE_CRC32C 0x02
+
+/* mask to restrict a value to width bits */
+#define CRC_WMASK(width) ((width) == 64 ? ~(uint64_t) 0 : ((uint64_t) 1 << (width)) - 1)
+
+/*
+** widths which are not a multiple of 8 are run in a register of whole bytes:
+** MSB-first models keep their register left-aligned in it, padded with
+** zero bits below; reflected models keep it right-aligned, as the reflected
+** algorithm works for any width
+*/
+#define CRC_ALIGNED(width) ((width) < 8 ? 8 : ((width) + 7) & ~7)
+#define CRC_PAD(p)         ((p)->refin ? 0 : CRC_ALIGNED((p)->width) - (p)->width)
+#define CRC_REGWIDTH(p)    ((p)->width + CRC_PAD(p))
+
+typedef uint64_t crc_table_t[256];
+
+/*
+** constants for the folding engine: the multipliers which move a 128 bit
+** block forward by 512 bits (four blocks) and by 128 bits (one block), as
+** the pair of 64 bit lanes they are multiplied with
+*/
+typedef struct crc_fold
+{
+    uint8_t  engine;
+    uint64_t k512[2];
+    uint64_t k128[2];
+} crc_fold_t;
+
+/*
+** lookup tables for the table driven CRC algorithm are kept in a small
+** LRU cache keyed on (poly, width, reflected) so that switching between
+** models does not rebuild the table every time; each entry holds the
+** lookup table followed by as many slicing-by-N tables as have been needed
+*/
+typedef struct crc_cache_entry
+{
+    uint64_t poly;
+    uint8_t  width;
+    uint8_t  reflected;
+    uint8_t  valid;
+    uint8_t  slices;
+    uint32_t lastUsed;
+    crc_fold_t  fold;
+    crc_table_t table[CRC_MAX_SLICES];
+} crc_cache_entry_t;
+
+/*
+** each thread has its own table cache, created on first use and freed when
+** the thread exits, so crc() and crc_update() are reentrant without a lock:
+** a lookup may add slicing tables to an entry or evict it, which a cache
+** shared between threads could only do under a lock, or by never freeing a
+** table another thread might still be reading
+**
+** the caches of all threads are kept in a list so that crc_cache_stats() can
+** add up their counters for the whole process; each thread only writes its
+** own counters, and they are read with relaxed atomic loads; the counters of
+** threads which have exited are added to crcRetiredStats, and crcStatsBase
+** holds the totals at the last crc_cache_clear()
+*/
+typedef struct crc_cache
+{
+    crc_cache_entry_t entries[CRC_CACHE_SIZE];
+    crc_cache_stats_t stats;
+    uint32_t clock;
+    struct crc_cache *next;
+} crc_cache_t;
+
+pthread_key_t crcCacheKey;
+pthread_once_t crcCacheOnce = PTHREAD_ONCE_INIT;
+
+pthread_mutex_t crcCacheLock = PTHREAD_MUTEX_INITIALIZER;
+crc_cache_t *crcCaches;
+crc_cache_stats_t crcRetiredStats;
+crc_cache_stats_t crcStatsBase;
+
+#ifdef __GNUC__
+#define CRC_COUNT(counter) \
+    __atomic_store_n(&(counter), __atomic_load_n(&(counter), __ATOMIC_RELAXED) + 1, __ATOMIC_RELAXED)
+#define CRC_READ(counter)  __atomic_load_n(&(counter), __ATOMIC_RELAXED)
+#else
+#define CRC_COUNT(counter) ((counter)++)
+#define CRC_READ(counter)  (counter)
+#endif
+
+/*
+** a context holds the tables for one parameter set; once built it is only
+** read, so one context can be shared by any number of threads; tables points
+** at the generated tables of a preset, or at the tables the context owns
+*/
+struct crc_ctx
+{
+    crc_t       pars;
+    crc_fold_t  fold;
+    const crc_table_t *tables;
+    crc_table_t own[CRC_MAX_SLICES];
+};
+
+/*
+** the lookup tables and fold constants of the preset models are generated
+** at build time by python/gentables.py into crctables.h, and compiled in
+** with -DCRC_STATIC_TABLES (see the Makefile), so they are not built at run
+** time and live in read-only memory
+*/
+typedef struct crc_static
+{
+    uint64_t poly;
+    uint8_t  width;
+    uint8_t  reflected;
+    const crc_table_t *tables;
+    crc_fold_t fold;
+} crc_static_t;
+
+#ifdef CRC_STATIC_TABLES
+#include "crctables.h"
+#endif
+
+#ifdef CRC_HAVE_FOLD
+/* the engines the CPU has, found when the library is loaded */
+uint8_t crcCpuEngines;
+
+__attribute__((constructor))
+void _cpuEngines(void)
+{
+    __builtin_cpu_init();
+
+    if (__builtin_cpu_supports("pclmul") && __builtin_cpu_supports("ssse3"))
+        crcCpuEngines |= CRC_ENGINE_CLMUL;
+
+    if (__builtin_cpu_supports("sse4.2"))
+        crcCpuEngines |= CRC_ENGINE_CRC32C;
+}
+#endif
 
 /* function to reflect byte values in-position */
 int _reflect(int size, uint8_t *data)
@@ -44,39 +229,47 @@ int _reflect(int size, uint8_t *data)
 }
 
 
-int _buildLookupTable(uint32_t poly, uint32_t width)
+int _buildLookupTable(uint64_t poly, uint32_t width, uint64_t *crcLookupTable)
 {
-    int m;
-    int n;
+    uint32_t n;
     int control;
     int done;
     uint8_t  index;
     uint8_t  hibit;
-    uint8_t  iter;
-    uint8_t  endOfChain;
+    int      iter;
+    int      endOfChain;
     uint8_t  pipeline[256];
-    uint8_t  numStore;
-    uint32_t reg;
-    uint32_t operand;
-    uint32_t wmask;
-    uint32_t mask;
-    uint32_t store[256];
-
-    /* width should be byte aligned, and a maximum of 32 */
-    if ((width % 8 != 0) || width > 32)
+    int      numStore;
+    uint64_t reg;
+    uint64_t operand;
+    uint64_t wmask;
+    uint64_t mask;
+
+    /* a chain can visit every control value, plus the 8 leading entries */
+    uint64_t store[256 + 16];
+
+    if (width < 1 || width > 64)
         return -1;
 
+    /*
+    ** for a width which is not byte aligned, build the table of the
+    ** left-aligned register: the poly is shifted up to a whole number of
+    ** bytes, and so is every entry
+    */
+    if (width % 8 != 0)
+        return _buildLookupTable((poly & CRC_WMASK(width)) << (CRC_ALIGNED(width) - width),
+                                 CRC_ALIGNED(width), crcLookupTable);
+
     /* calculate a mask to restrict the value to width bits */
     wmask = 0;
     for (n = 0; n < width / 8; n++)
         wmask = (wmask << 8) + 0xff;
 
     /* bitwise AND the poly in case it runs over width bits */
-    lastPoly = poly;
     poly = poly & wmask;
 
     /* zero the lookup table */
-    memset(crcLookupTable, 0, 256 * sizeof(uint32_t));
+    memset(crcLookupTable, 0, 256 * sizeof(uint64_t));
     memset(pipeline, 0, 256);
 
     /*
@@ -96,7 +289,7 @@ int _buildLookupTable(uint32_t poly, uint32_t width)
             continue;
 
         /* load the top byte of register with the control value */
-        reg = control << (width - 8);
+        reg = (uint64_t) control << (width - 8);
 
         /*
         ** store[i] holds the control value at iteration i-8
@@ -105,7 +298,7 @@ int _buildLookupTable(uint32_t poly, uint32_t width)
         ** pipeline[i] identifies control values that are in the current
         ** chain and will be calculated
         */
-        memset(store, NONE, 256 * sizeof(uint32_t));
+        memset(store, NONE, sizeof(store));
         numStore = 8;
 
         iter = 0;
@@ -161,200 +354,1743 @@ int _buildLookupTable(uint32_t poly, uint32_t width)
 }
 
 
-int _dumpLookupTable(void)
+/*
+** convert a lookup table into its reflected (LSB-first) variant in-position:
+** the entry for index n moves to the reflected index and is itself reflected
+** over the register width, which leaves the entries of a left-aligned table
+** right-aligned
+*/
+int _reflectLookupTable(uint32_t width, uint64_t *table)
 {
-    int m, n;
+    int n;
+    uint32_t b;
+    uint8_t index;
+    uint64_t value;
+    uint64_t reflected;
+    uint64_t reftable[256];
 
-    for (m = 0; m < 16; m++)
+    width = CRC_ALIGNED(width);
+
+    for (n = 0; n < 256; n++)
     {
-        for (n = 0; n < 16; n++)
-            printf("%04x  ", crcLookupTable[m * 16 + n]);
+        index = (uint8_t) n;
+        _reflect(1, &index);
 
-        printf("\n");
+        value = table[n];
+        reflected = 0;
+        for (b = 0; b < width; b++)
+        {
+            reflected = (reflected << 1) + (value & 1);
+            value = value >> 1;
+        }
+
+        reftable[index] = reflected;
     }
 
+    memcpy(table, reftable, 256 * sizeof(uint64_t));
+
     return 0;
 }
 
 
-uint8_t crc8_onewire(uint32_t size, uint8_t *m)
+/*
+** extend the lookup table in tables[0] to the tables for the slicing-by-N
+** algorithm: tables[k][n] is the register value for the byte n followed by
+** k zero bytes; tables[0] to tables[from - 1] are already built
+*/
+int _sliceLookupTables(uint32_t width, uint8_t reflected, crc_table_t *tables, int from, int to)
 {
-    crc_t crcpars;
-    uint8_t cksum;
+    int k;
+    int n;
+    uint64_t r;
+    uint64_t wmask;
 
-    crcpars.poly   = 0x31;
-    crcpars.width  = 8;
-    crcpars.init   = 0x00;
-    crcpars.refin  = TRUE;
-    crcpars.refout = TRUE;
-    crcpars.xorout = 0x00;
+    width = CRC_ALIGNED(width);
+    wmask = CRC_WMASK(width);
 
-    cksum = (uint8_t) crc(&crcpars, size, m);
-    return cksum;
+    for (k = from; k < to; k++)
+    {
+        for (n = 0; n < 256; n++)
+        {
+            r = tables[k - 1][n];
+
+            if (reflected)
+                tables[k][n] = (r >> 8) ^ tables[0][r & 0xff];
+            else
+                tables[k][n] = ((r << 8) & wmask) ^ tables[0][r >> (width - 8)];
+        }
+    }
+
+    return 0;
 }
 
 
-uint16_t crc16_arc(uint32_t size, uint8_t *m)
+/* x^n mod P, where P is the full polynomial of width bits */
+uint64_t _xPowMod(uint32_t n, uint64_t poly, uint32_t width)
 {
-    crc_t crcpars;
-    uint16_t cksum;
+    uint64_t r;
+    uint64_t hibit;
+    uint64_t wmask;
 
-    crcpars.poly   = 0x8005;
-    crcpars.width  = 16;
-    crcpars.init   = 0x0000;
-    crcpars.refin  = TRUE;
-    crcpars.refout = TRUE;
-    crcpars.xorout = 0x0000;
+    wmask = CRC_WMASK(width);
+    r = 1;
 
-    cksum = (uint16_t) crc(&crcpars, size, m);
-    return cksum;
+    while (n--)
+    {
+        hibit = (r >> (width - 1)) & 1;
+        r = (r << 1) & wmask;
+
+        if (hibit)
+            r = r ^ poly;
+    }
+
+    return r;
 }
 
 
-uint16_t crc16_ccitt(uint32_t size, uint8_t *m)
+/* reflect the bits of a 64 bit value */
+uint64_t _reflect64(uint64_t x)
 {
-    crc_t crcpars;
-    uint16_t cksum;
+    int n;
+    uint64_t reflected;
 
-    crcpars.poly   = 0x1021;
-    crcpars.width  = 16;
-    crcpars.init   = 0xffff;
-    crcpars.refin  = FALSE;
-    crcpars.refout = FALSE;
-    crcpars.xorout = 0x0000;
+    reflected = 0;
+    for (n = 0; n < 64; n++)
+    {
+        reflected = (reflected << 1) + (x & 1);
+        x = x >> 1;
+    }
 
-    cksum = (uint16_t) crc(&crcpars, size, m);
-    return cksum;
+    return reflected;
 }
 
 
-uint16_t crc16_xmodem(uint32_t size, uint8_t *m)
+/*
+** calculate the fold constants of a model from its parameters and note the
+** engines it can use (python/gentables.py does the same for the presets):
+**
+** a block A = H.x^64 + L is moved forward by d bits as H.(x^(d+64) mod P) +
+** L.(x^d mod P); for reflected models the lanes hold reflected values and
+** the product of two reflected values comes out one bit short, which is
+** made up by using x^(d+63) and x^(d-1) instead
+*/
+void _foldConstants(crc_fold_t *fold, uint64_t poly, uint32_t width, uint8_t reflected)
 {
-    crc_t crcpars;
-    uint16_t cksum;
+    memset(fold, 0, sizeof(crc_fold_t));
+
+    /* bitwise AND the poly in case it runs over width bits */
+    poly = poly & CRC_WMASK(width);
 
-    crcpars.poly   = 0x8408;
-    crcpars.width  = 16;
-    crcpars.init   = 0x0000;
-    crcpars.refin  = TRUE;
-    crcpars.refout = TRUE;
-    crcpars.xorout = 0x0000;
+    /* MSB-first models fold the left-aligned register */
+    if (!reflected && width % 8 != 0)
+    {
+        poly = poly << (CRC_ALIGNED(width) - width);
+        width = CRC_ALIGNED(width);
+    }
 
-    cksum = (uint16_t) crc(&crcpars, size, m);
-    return cksum;
+    fold->engine = CRC_ENGINE_CLMUL;
+
+    if (reflected)
+    {
+        fold->k512[0] = _reflect64(_xPowMod(512 + 63, poly, width));
+        fold->k512[1] = _reflect64(_xPowMod(512 - 1, poly, width));
+        fold->k128[0] = _reflect64(_xPowMod(128 + 63, poly, width));
+        fold->k128[1] = _reflect64(_xPowMod(128 - 1, poly, width));
+    }
+    else
+    {
+        fold->k512[0] = _xPowMod(512, poly, width);
+        fold->k512[1] = _xPowMod(512 + 64, poly, width);
+        fold->k128[0] = _xPowMod(128, poly, width);
+        fold->k128[1] = _xPowMod(128 + 64, poly, width);
+    }
+
+    /* the crc32 instruction implements the reflected CRC-32C polynomial */
+    if (reflected && width == 32 && poly == 0x1edc6f41)
+        fold->engine |= CRC_ENGINE_CRC32C;
 }
 
 
-uint32_t crc32(uint32_t size, uint8_t *m)
+/* return the generated tables for the given parameters, or NULL if there are none */
+const crc_static_t *_staticTables(uint64_t poly, uint32_t width, uint8_t reflected)
+{
+#ifdef CRC_STATIC_TABLES
+    int n;
+    const crc_static_t *s;
+
+    poly = poly & CRC_WMASK(width);
+    reflected = reflected ? TRUE : FALSE;
+
+    for (n = 0; n < CRC_NUM_STATIC; n++)
+    {
+        s = &crcStaticTables[n];
+        if (s->poly == poly && s->width == width && s->reflected == reflected)
+            return s;
+    }
+#else
+    (void) poly;
+    (void) width;
+    (void) reflected;
+#endif
+
+    return NULL;
+}
+
+
+/* free the table cache of a thread which exits, keeping its counters */
+void _freeCache(void *p)
 {
-    crc_t crcpars;
-    uint32_t cksum;
+    crc_cache_t *cache;
+    crc_cache_t **link;
 
-    crcpars.poly   = 0x04c11db7;
-    crcpars.width  = 32;
-    crcpars.init   = 0xffffffff;
-    crcpars.refin  = TRUE;
-    crcpars.refout = TRUE;
-    crcpars.xorout = 0xffffffff;
+    cache = p;
 
-    cksum = (uint32_t) crc(&crcpars, size, m);
-    return cksum;
+    pthread_mutex_lock(&crcCacheLock);
+
+    crcRetiredStats.hits += cache->stats.hits;
+    crcRetiredStats.misses += cache->stats.misses;
+    crcRetiredStats.evictions += cache->stats.evictions;
+
+    for (link = &crcCaches; *link != NULL; link = &(*link)->next)
+    {
+        if (*link == cache)
+        {
+            *link = cache->next;
+            break;
+        }
+    }
+
+    pthread_mutex_unlock(&crcCacheLock);
+
+    free(cache);
 }
 
 
-uint32_t crc32c(uint32_t size, uint8_t *m)
+void _createCacheKey(void)
+{
+    pthread_key_create(&crcCacheKey, _freeCache);
+}
+
+
+/* return the table cache of the calling thread, creating it if necessary */
+crc_cache_t *_threadCache(void)
 {
-    crc_t crcpars;
-    uint32_t cksum;
+    crc_cache_t *cache;
 
-    crcpars.poly   = 0x1edc6f41;
-    crcpars.width  = 32;
-    crcpars.init   = 0xffffffff;
-    crcpars.refin  = FALSE;
-    crcpars.refout = FALSE;
-    crcpars.xorout = 0x00000000;
+    pthread_once(&crcCacheOnce, _createCacheKey);
 
-    cksum = (uint32_t) crc(&crcpars, size, m);
-    return cksum;
+    cache = pthread_getspecific(crcCacheKey);
+    if (cache == NULL)
+    {
+        cache = calloc(1, sizeof(crc_cache_t));
+        if (cache == NULL)
+            return NULL;
+
+        pthread_setspecific(crcCacheKey, cache);
+
+        pthread_mutex_lock(&crcCacheLock);
+        cache->next = crcCaches;
+        crcCaches = cache;
+        pthread_mutex_unlock(&crcCacheLock);
+    }
+
+    return cache;
 }
 
 
-uint32_t crc(crc_t *p, uint32_t size, uint8_t *m)
+/*
+** return the lookup tables for the given parameters from the generated
+** tables or the table cache, building them if necessary; the result holds at
+** least the given number of slicing tables; when the cache is full the least
+** recently used entry is evicted; if fold is not NULL it is set to the fold
+** constants of the tables
+*/
+const crc_table_t *_lookupTables(uint64_t poly, uint32_t width, uint8_t reflected, int slices, const crc_fold_t **fold)
 {
     int n;
-    uint32_t reg;
-    uint32_t regout;
-    uint8_t regbytes[4];
-    uint8_t index;
-    uint8_t hireg;
-    uint8_t *data;
-    uint32_t wmask;
+    const crc_static_t *generated;
+    crc_cache_t *cache;
+    crc_cache_entry_t *entry;
+    crc_cache_entry_t *victim;
 
-    data = NULL;
+    /* width should be from 1 to 64 bits */
+    if (width < 1 || width > 64)
+        return NULL;
 
-    /* calculate a mask to restrict the value to width bits */
-    wmask = 0;
-    for (n = 0; n < p->width / 8; n++)
-        wmask = (wmask << 8) + 0xff;
+    if (slices < 1 || slices > CRC_MAX_SLICES)
+        return NULL;
+
+    /* generated tables hold all the slicing tables and are not cached */
+    generated = _staticTables(poly, width, reflected);
+    if (generated != NULL)
+    {
+        if (fold != NULL)
+            *fold = &generated->fold;
+
+        return generated->tables;
+    }
+
+    cache = _threadCache();
+    if (cache == NULL)
+        return NULL;
+
+    reflected = reflected ? TRUE : FALSE;
+    cache->clock++;
+
+    victim = &cache->entries[0];
+    for (n = 0; n < CRC_CACHE_SIZE; n++)
+    {
+        entry = &cache->entries[n];
+
+        if (entry->valid && entry->poly == poly && entry->width == width &&
+            entry->reflected == reflected)
+        {
+            CRC_COUNT(cache->stats.hits);
+            entry->lastUsed = cache->clock;
+
+            if (entry->slices < slices)
+            {
+                _sliceLookupTables(width, reflected, entry->table, entry->slices, slices);
+                entry->slices = slices;
+            }
+
+            if (fold != NULL)
+                *fold = &entry->fold;
+
+            return entry->table;
+        }
+
+        /* prefer an empty slot, otherwise the least recently used one */
+        if (victim->valid && (!entry->valid || entry->lastUsed < victim->lastUsed))
+            victim = entry;
+    }
+
+    CRC_COUNT(cache->stats.misses);
+
+    _buildLookupTable(poly, width, victim->table[0]);
+    if (reflected)
+        _reflectLookupTable(width, victim->table[0]);
+
+    _sliceLookupTables(width, reflected, victim->table, 1, slices);
+    _foldConstants(&victim->fold, poly, width, reflected);
+
+    if (victim->valid)
+        CRC_COUNT(cache->stats.evictions);
+
+    victim->poly = poly;
+    victim->width = width;
+    victim->reflected = reflected;
+    victim->valid = TRUE;
+    victim->slices = slices;
+    victim->lastUsed = cache->clock;
+
+    if (fold != NULL)
+        *fold = &victim->fold;
+
+    return victim->table;
+}
+
+
+/* the counters of the table caches of all threads, added up; called with crcCacheLock held */
+void _cacheTotals(crc_cache_stats_t *totals)
+{
+    crc_cache_t *cache;
+
+    *totals = crcRetiredStats;
 
-    /* build the lookup table if necessary */
-    if (lastPoly != p->poly)
+    for (cache = crcCaches; cache != NULL; cache = cache->next)
     {
-        _buildLookupTable(p->poly, p->width);
-        // _dumpLookupTable();
+        totals->hits += CRC_READ(cache->stats.hits);
+        totals->misses += CRC_READ(cache->stats.misses);
+        totals->evictions += CRC_READ(cache->stats.evictions);
+    }
+}
+
+
+/* the table cache counters of the whole process since the last crc_cache_clear() */
+void crc_cache_stats(crc_cache_stats_t *stats)
+{
+    pthread_mutex_lock(&crcCacheLock);
+
+    _cacheTotals(stats);
+
+    stats->hits -= crcStatsBase.hits;
+    stats->misses -= crcStatsBase.misses;
+    stats->evictions -= crcStatsBase.evictions;
+
+    pthread_mutex_unlock(&crcCacheLock);
+}
+
+
+/*
+** discard all tables cached by the calling thread and start the counters of
+** the process from zero; the caches of other threads are left as they are
+*/
+void crc_cache_clear(void)
+{
+    crc_cache_t *cache;
+
+    cache = _threadCache();
+    if (cache != NULL)
+    {
+        memset(cache->entries, 0, sizeof(cache->entries));
+        cache->clock = 0;
+    }
+
+    pthread_mutex_lock(&crcCacheLock);
+    _cacheTotals(&crcStatsBase);
+    pthread_mutex_unlock(&crcCacheLock);
+}
+
+
+int _dumpLookupTable(uint64_t *crcLookupTable)
+{
+    int m, n;
+
+    for (m = 0; m < 16; m++)
+    {
+        for (n = 0; n < 16; n++)
+            printf("%04llx  ", (unsigned long long) crcLookupTable[m * 16 + n]);
+
+        printf("\n");
+    }
+
+    return 0;
+}
+
+
+/*
+** fill in a context: the parameters and all the tables it needs, which are
+** the generated tables if there are any for the parameters; otherwise the
+** context builds its own
+*/
+int _buildContext(crc_ctx_t *ctx, crc_t *p)
+{
+    const crc_static_t *generated;
+
+    ctx->pars = *p;
+
+    generated = _staticTables(p->poly, p->width, p->refin);
+    if (generated != NULL)
+    {
+        ctx->tables = generated->tables;
+        ctx->fold = generated->fold;
+        return 0;
     }
 
-    /* make a copy of the data... */
-    data = malloc(size);
-    memcpy(data, m, size);
+    if (_buildLookupTable(p->poly, p->width, ctx->own[0]) < 0)
+        return -1;
 
-    /* and reflect it if necessary */
     if (p->refin)
-        _reflect(size, data);
+        _reflectLookupTable(p->width, ctx->own[0]);
 
-    /* load initial register value */
-    reg = p->init;
+    _sliceLookupTables(p->width, p->refin, ctx->own, 1, CRC_MAX_SLICES);
+    _foldConstants(&ctx->fold, p->poly, p->width, p->refin);
+    ctx->tables = ctx->own;
 
-    for (n = 0; n < size; n++)
+    return 0;
+}
+
+
+/* parameters of the common crc algorithms */
+#define PRESET_ONEWIRE 0
+#define PRESET_ARC     1
+#define PRESET_CCITT   2
+#define PRESET_XMODEM  3
+#define PRESET_CRC32   4
+#define PRESET_CRC32C  5
+#define PRESET_ECMA    6
+#define PRESET_XZ      7
+#define PRESET_GO_ISO  8
+#define NUM_PRESETS    9
+
+/*
+** named models: the presets of the direct call functions and, after them,
+** the catalogue of parametrised CRC models after Greg Cook's "Catalogue of
+** parametrised CRC algorithms" (reveng) up to 64 bits; aliases are separated
+** by spaces, and check is the checksum of the ASCII string "123456789"
+**
+** only the parameters are kept here: the tables of a catalogue model are
+** built the first time it is used, by the table cache or a context
+*/
+crc_model_t crcModels[] = {
+    /* the presets of the direct call functions, in the order of the PRESET_ numbers */
+    { "crc8_onewire", NULL,
+      { 0x31, 8, 0x00, TRUE, TRUE, 0x00 }, 0xa1 },
+    { "crc16_arc", NULL,
+      { 0x8005, 16, 0x0000, TRUE, TRUE, 0x0000 }, 0xbb3d },
+    { "crc16_ccitt", NULL,
+      { 0x1021, 16, 0xffff, FALSE, FALSE, 0x0000 }, 0x29b1 },
+    { "crc16_xmodem", NULL,
+      { 0x8408, 16, 0x0000, TRUE, TRUE, 0x0000 }, 0x0c73 },
+    { "crc32", NULL,
+      { 0x04c11db7, 32, 0xffffffff, TRUE, TRUE, 0xffffffff }, 0xcbf43926 },
+    { "crc32c", NULL,
+      { 0x1edc6f41, 32, 0xffffffff, FALSE, FALSE, 0x00000000 }, 0xfabbf0ea },
+    { "crc64_ecma", NULL,
+      { 0x42f0e1eba9ea3693ULL, 64, 0x0000000000000000ULL, FALSE, FALSE, 0x0000000000000000ULL }, 0x6c40df5f0b497347ULL },
+    { "crc64_xz", NULL,
+      { 0x42f0e1eba9ea3693ULL, 64, 0xffffffffffffffffULL, TRUE, TRUE, 0xffffffffffffffffULL }, 0x995dc9bbdf1939faULL },
+    { "crc64_go_iso", NULL,
+      { 0x000000000000001bULL, 64, 0xffffffffffffffffULL, TRUE, TRUE, 0xffffffffffffffffULL }, 0xb90956c775a41001ULL },
+
+    /* the catalogue of parametrised CRC models */
+    { "CRC-3/GSM", NULL,
+      { 0x3, 3, 0x0, FALSE, FALSE, 0x7 }, 0x4 },
+    { "CRC-3/ROHC", NULL,
+      { 0x3, 3, 0x7, TRUE, TRUE, 0x0 }, 0x6 },
+    { "CRC-4/G-704", "CRC-4/ITU",
+      { 0x3, 4, 0x0, TRUE, TRUE, 0x0 }, 0x7 },
+    { "CRC-4/INTERLAKEN", NULL,
+      { 0x3, 4, 0xf, FALSE, FALSE, 0xf }, 0xb },
+    { "CRC-5/EPC-C1G2", "CRC-5/EPC",
+      { 0x09, 5, 0x09, FALSE, FALSE, 0x00 }, 0x00 },
+    { "CRC-5/G-704", "CRC-5/ITU",
+      { 0x15, 5, 0x00, TRUE, TRUE, 0x00 }, 0x07 },
+    { "CRC-5/USB", NULL,
+      { 0x05, 5, 0x1f, TRUE, TRUE, 0x1f }, 0x19 },
+    { "CRC-6/CDMA2000-A", NULL,
+      { 0x27, 6, 0x3f, FALSE, FALSE, 0x00 }, 0x0d },
+    { "CRC-6/CDMA2000-B", NULL,
+      { 0x07, 6, 0x3f, FALSE, FALSE, 0x00 }, 0x3b },
+    { "CRC-6/DARC", NULL,
+      { 0x19, 6, 0x00, TRUE, TRUE, 0x00 }, 0x26 },
+    { "CRC-6/G-704", "CRC-6/ITU",
+      { 0x03, 6, 0x00, TRUE, TRUE, 0x00 }, 0x06 },
+    { "CRC-6/GSM", NULL,
+      { 0x2f, 6, 0x00, FALSE, FALSE, 0x3f }, 0x13 },
+    { "CRC-7/MMC", "CRC-7",
+      { 0x09, 7, 0x00, FALSE, FALSE, 0x00 }, 0x75 },
+    { "CRC-7/ROHC", NULL,
+      { 0x4f, 7, 0x7f, TRUE, TRUE, 0x00 }, 0x53 },
+    { "CRC-7/UMTS", NULL,
+      { 0x45, 7, 0x00, FALSE, FALSE, 0x00 }, 0x61 },
+    { "CRC-8/AUTOSAR", NULL,
+      { 0x2f, 8, 0xff, FALSE, FALSE, 0xff }, 0xdf },
+    { "CRC-8/BLUETOOTH", NULL,
+      { 0xa7, 8, 0x00, TRUE, TRUE, 0x00 }, 0x26 },
+    { "CRC-8/CDMA2000", NULL,
+      { 0x9b, 8, 0xff, FALSE, FALSE, 0x00 }, 0xda },
+    { "CRC-8/DARC", NULL,
+      { 0x39, 8, 0x00, TRUE, TRUE, 0x00 }, 0x15 },
+    { "CRC-8/DVB-S2", NULL,
+      { 0xd5, 8, 0x00, FALSE, FALSE, 0x00 }, 0xbc },
+    { "CRC-8/GSM-A", NULL,
+      { 0x1d, 8, 0x00, FALSE, FALSE, 0x00 }, 0x37 },
+    { "CRC-8/GSM-B", NULL,
+      { 0x49, 8, 0x00, FALSE, FALSE, 0xff }, 0x94 },
+    { "CRC-8/HITAG", NULL,
+      { 0x1d, 8, 0xff, FALSE, FALSE, 0x00 }, 0xb4 },
+    { "CRC-8/I-432-1", "CRC-8/ITU",
+      { 0x07, 8, 0x00, FALSE, FALSE, 0x55 }, 0xa1 },
+    { "CRC-8/I-CODE", NULL,
+      { 0x1d, 8, 0xfd, FALSE, FALSE, 0x00 }, 0x7e },
+    { "CRC-8/LTE", NULL,
+      { 0x9b, 8, 0x00, FALSE, FALSE, 0x00 }, 0xea },
+    { "CRC-8/MAXIM-DOW", "CRC-8/MAXIM DOW-CRC",
+      { 0x31, 8, 0x00, TRUE, TRUE, 0x00 }, 0xa1 },
+    { "CRC-8/MIFARE-MAD", NULL,
+      { 0x1d, 8, 0xc7, FALSE, FALSE, 0x00 }, 0x99 },
+    { "CRC-8/NRSC-5", NULL,
+      { 0x31, 8, 0xff, FALSE, FALSE, 0x00 }, 0xf7 },
+    { "CRC-8/OPENSAFETY", NULL,
+      { 0x2f, 8, 0x00, FALSE, FALSE, 0x00 }, 0x3e },
+    { "CRC-8/ROHC", NULL,
+      { 0x07, 8, 0xff, TRUE, TRUE, 0x00 }, 0xd0 },
+    { "CRC-8/SAE-J1850", NULL,
+      { 0x1d, 8, 0xff, FALSE, FALSE, 0xff }, 0x4b },
+    { "CRC-8/SMBUS", "CRC-8",
+      { 0x07, 8, 0x00, FALSE, FALSE, 0x00 }, 0xf4 },
+    { "CRC-8/TECH-3250", "CRC-8/AES CRC-8/EBU",
+      { 0x1d, 8, 0xff, TRUE, TRUE, 0x00 }, 0x97 },
+    { "CRC-8/WCDMA", NULL,
+      { 0x9b, 8, 0x00, TRUE, TRUE, 0x00 }, 0x25 },
+    { "CRC-10/ATM", "CRC-10 CRC-10/I-610",
+      { 0x233, 10, 0x000, FALSE, FALSE, 0x000 }, 0x199 },
+    { "CRC-10/CDMA2000", NULL,
+      { 0x3d9, 10, 0x3ff, FALSE, FALSE, 0x000 }, 0x233 },
+    { "CRC-10/GSM", NULL,
+      { 0x175, 10, 0x000, FALSE, FALSE, 0x3ff }, 0x12a },
+    { "CRC-11/FLEXRAY", "CRC-11",
+      { 0x385, 11, 0x01a, FALSE, FALSE, 0x000 }, 0x5a3 },
+    { "CRC-11/UMTS", NULL,
+      { 0x307, 11, 0x000, FALSE, FALSE, 0x000 }, 0x061 },
+    { "CRC-12/CDMA2000", NULL,
+      { 0xf13, 12, 0xfff, FALSE, FALSE, 0x000 }, 0xd4d },
+    { "CRC-12/DECT", "X-CRC-12",
+      { 0x80f, 12, 0x000, FALSE, FALSE, 0x000 }, 0xf5b },
+    { "CRC-12/GSM", NULL,
+      { 0xd31, 12, 0x000, FALSE, FALSE, 0xfff }, 0xb34 },
+    { "CRC-12/UMTS", "CRC-12/3GPP",
+      { 0x80f, 12, 0x000, FALSE, TRUE, 0x000 }, 0xdaf },
+    { "CRC-13/BBC", NULL,
+      { 0x1cf5, 13, 0x0000, FALSE, FALSE, 0x0000 }, 0x04fa },
+    { "CRC-14/DARC", NULL,
+      { 0x0805, 14, 0x0000, TRUE, TRUE, 0x0000 }, 0x082d },
+    { "CRC-14/GSM", NULL,
+      { 0x202d, 14, 0x0000, FALSE, FALSE, 0x3fff }, 0x30ae },
+    { "CRC-15/CAN", "CRC-15",
+      { 0x4599, 15, 0x0000, FALSE, FALSE, 0x0000 }, 0x059e },
+    { "CRC-15/MPT1327", NULL,
+      { 0x6815, 15, 0x0000, FALSE, FALSE, 0x0001 }, 0x2566 },
+    { "CRC-16/ARC", "ARC CRC-16 CRC-16/LHA CRC-IBM",
+      { 0x8005, 16, 0x0000, TRUE, TRUE, 0x0000 }, 0xbb3d },
+    { "CRC-16/CDMA2000", NULL,
+      { 0xc867, 16, 0xffff, FALSE, FALSE, 0x0000 }, 0x4c06 },
+    { "CRC-16/CMS", NULL,
+      { 0x8005, 16, 0xffff, FALSE, FALSE, 0x0000 }, 0xaee7 },
+    { "CRC-16/DDS-110", NULL,
+      { 0x8005, 16, 0x800d, FALSE, FALSE, 0x0000 }, 0x9ecf },
+    { "CRC-16/DECT-R", "R-CRC-16",
+      { 0x0589, 16, 0x0000, FALSE, FALSE, 0x0001 }, 0x007e },
+    { "CRC-16/DECT-X", "X-CRC-16",
+      { 0x0589, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0x007f },
+    { "CRC-16/DNP", NULL,
+      { 0x3d65, 16, 0x0000, TRUE, TRUE, 0xffff }, 0xea82 },
+    { "CRC-16/EN-13757", NULL,
+      { 0x3d65, 16, 0x0000, FALSE, FALSE, 0xffff }, 0xc2b7 },
+    { "CRC-16/GENIBUS", "CRC-16/DARC CRC-16/EPC CRC-16/EPC-C1G2 CRC-16/I-CODE",
+      { 0x1021, 16, 0xffff, FALSE, FALSE, 0xffff }, 0xd64e },
+    { "CRC-16/GSM", NULL,
+      { 0x1021, 16, 0x0000, FALSE, FALSE, 0xffff }, 0xce3c },
+    { "CRC-16/IBM-3740", "CRC-16/AUTOSAR CRC-16/CCITT-FALSE",
+      { 0x1021, 16, 0xffff, FALSE, FALSE, 0x0000 }, 0x29b1 },
+    { "CRC-16/IBM-SDLC", "CRC-16/ISO-HDLC CRC-16/ISO-IEC-14443-3-B CRC-16/X-25 CRC-B X-25",
+      { 0x1021, 16, 0xffff, TRUE, TRUE, 0xffff }, 0x906e },
+    { "CRC-16/ISO-IEC-14443-3-A", "CRC-A",
+      { 0x1021, 16, 0xc6c6, TRUE, TRUE, 0x0000 }, 0xbf05 },
+    { "CRC-16/KERMIT", "CRC-16/BLUETOOTH CRC-16/CCITT CRC-16/CCITT-TRUE CRC-16/V-41-LSB CRC-CCITT KERMIT",
+      { 0x1021, 16, 0x0000, TRUE, TRUE, 0x0000 }, 0x2189 },
+    { "CRC-16/LJ1200", NULL,
+      { 0x6f63, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0xbdf4 },
+    { "CRC-16/M17", NULL,
+      { 0x5935, 16, 0xffff, FALSE, FALSE, 0x0000 }, 0x772b },
+    { "CRC-16/MAXIM-DOW", "CRC-16/MAXIM",
+      { 0x8005, 16, 0x0000, TRUE, TRUE, 0xffff }, 0x44c2 },
+    { "CRC-16/MCRF4XX", NULL,
+      { 0x1021, 16, 0xffff, TRUE, TRUE, 0x0000 }, 0x6f91 },
+    { "CRC-16/MODBUS", "MODBUS",
+      { 0x8005, 16, 0xffff, TRUE, TRUE, 0x0000 }, 0x4b37 },
+    { "CRC-16/NRSC-5", NULL,
+      { 0x080b, 16, 0xffff, TRUE, TRUE, 0x0000 }, 0xa066 },
+    { "CRC-16/OPENSAFETY-A", NULL,
+      { 0x5935, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0x5d38 },
+    { "CRC-16/OPENSAFETY-B", NULL,
+      { 0x755b, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0x20fe },
+    { "CRC-16/PROFIBUS", "CRC-16/IEC-61158-2",
+      { 0x1dcf, 16, 0xffff, FALSE, FALSE, 0xffff }, 0xa819 },
+    { "CRC-16/RIELLO", NULL,
+      { 0x1021, 16, 0xb2aa, TRUE, TRUE, 0x0000 }, 0x63d0 },
+    { "CRC-16/SPI-FUJITSU", "CRC-16/AUG-CCITT",
+      { 0x1021, 16, 0x1d0f, FALSE, FALSE, 0x0000 }, 0xe5cc },
+    { "CRC-16/T10-DIF", NULL,
+      { 0x8bb7, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0xd0db },
+    { "CRC-16/TELEDISK", NULL,
+      { 0xa097, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0x0fb3 },
+    { "CRC-16/TMS37157", NULL,
+      { 0x1021, 16, 0x89ec, TRUE, TRUE, 0x0000 }, 0x26b1 },
+    { "CRC-16/UMTS", "CRC-16/BUYPASS CRC-16/VERIFONE",
+      { 0x8005, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0xfee8 },
+    { "CRC-16/USB", NULL,
+      { 0x8005, 16, 0xffff, TRUE, TRUE, 0xffff }, 0xb4c8 },
+    { "CRC-16/XMODEM", "CRC-16/ACORN CRC-16/LTE CRC-16/V-41-MSB XMODEM ZMODEM",
+      { 0x1021, 16, 0x0000, FALSE, FALSE, 0x0000 }, 0x31c3 },
+    { "CRC-17/CAN-FD", NULL,
+      { 0x1685b, 17, 0x00000, FALSE, FALSE, 0x00000 }, 0x04f03 },
+    { "CRC-21/CAN-FD", NULL,
+      { 0x102899, 21, 0x000000, FALSE, FALSE, 0x000000 }, 0x0ed841 },
+    { "CRC-24/BLE", NULL,
+      { 0x00065b, 24, 0x555555, TRUE, TRUE, 0x000000 }, 0xc25a56 },
+    { "CRC-24/FLEXRAY-A", NULL,
+      { 0x5d6dcb, 24, 0xfedcba, FALSE, FALSE, 0x000000 }, 0x7979bd },
+    { "CRC-24/FLEXRAY-B", NULL,
+      { 0x5d6dcb, 24, 0xabcdef, FALSE, FALSE, 0x000000 }, 0x1f23b8 },
+    { "CRC-24/INTERLAKEN", NULL,
+      { 0x328b63, 24, 0xffffff, FALSE, FALSE, 0xffffff }, 0xb4f3e6 },
+    { "CRC-24/LTE-A", NULL,
+      { 0x864cfb, 24, 0x000000, FALSE, FALSE, 0x000000 }, 0xcde703 },
+    { "CRC-24/LTE-B", NULL,
+      { 0x800063, 24, 0x000000, FALSE, FALSE, 0x000000 }, 0x23ef52 },
+    { "CRC-24/OPENPGP", "CRC-24",
+      { 0x864cfb, 24, 0xb704ce, FALSE, FALSE, 0x000000 }, 0x21cf02 },
+    { "CRC-24/OS-9", NULL,
+      { 0x800063, 24, 0xffffff, FALSE, FALSE, 0xffffff }, 0x200fa5 },
+    { "CRC-30/CDMA", NULL,
+      { 0x2030b9c7, 30, 0x3fffffff, FALSE, FALSE, 0x3fffffff }, 0x04c34abf },
+    { "CRC-31/PHILIPS", NULL,
+      { 0x04c11db7, 31, 0x7fffffff, FALSE, FALSE, 0x7fffffff }, 0x0ce9e46c },
+    { "CRC-32/AIXM", "CRC-32Q",
+      { 0x814141ab, 32, 0x00000000, FALSE, FALSE, 0x00000000 }, 0x3010bf7f },
+    { "CRC-32/AUTOSAR", NULL,
+      { 0xf4acfb13, 32, 0xffffffff, TRUE, TRUE, 0xffffffff }, 0x1697d06a },
+    { "CRC-32/BASE91-D", "CRC-32D",
+      { 0xa833982b, 32, 0xffffffff, TRUE, TRUE, 0xffffffff }, 0x87315576 },
+    { "CRC-32/BZIP2", "CRC-32/AAL5 CRC-32/DECT-B B-CRC-32",
+      { 0x04c11db7, 32, 0xffffffff, FALSE, FALSE, 0xffffffff }, 0xfc891918 },
+    { "CRC-32/CD-ROM-EDC", NULL,
+      { 0x8001801b, 32, 0x00000000, TRUE, TRUE, 0x00000000 }, 0x6ec2edc4 },
+    { "CRC-32/CKSUM", "CKSUM CRC-32/POSIX",
+      { 0x04c11db7, 32, 0x00000000, FALSE, FALSE, 0xffffffff }, 0x765e7680 },
+    { "CRC-32/ISCSI", "CRC-32/BASE91-C CRC-32/CASTAGNOLI CRC-32/INTERLAKEN CRC-32C CRC-32/NVME",
+      { 0x1edc6f41, 32, 0xffffffff, TRUE, TRUE, 0xffffffff }, 0xe3069283 },
+    { "CRC-32/ISO-HDLC", "CRC-32 CRC-32/ADCCP CRC-32/V-42 CRC-32/XZ PKZIP",
+      { 0x04c11db7, 32, 0xffffffff, TRUE, TRUE, 0xffffffff }, 0xcbf43926 },
+    { "CRC-32/JAMCRC", "JAMCRC",
+      { 0x04c11db7, 32, 0xffffffff, TRUE, TRUE, 0x00000000 }, 0x340bc6d9 },
+    { "CRC-32/MEF", NULL,
+      { 0x741b8cd7, 32, 0xffffffff, TRUE, TRUE, 0x00000000 }, 0xd2c22f51 },
+    { "CRC-32/MPEG-2", NULL,
+      { 0x04c11db7, 32, 0xffffffff, FALSE, FALSE, 0x00000000 }, 0x0376e6e7 },
+    { "CRC-32/XFER", "XFER",
+      { 0x000000af, 32, 0x00000000, FALSE, FALSE, 0x00000000 }, 0xbd0be338 },
+    { "CRC-40/GSM", NULL,
+      { 0x0004820009ULL, 40, 0x0000000000ULL, FALSE, FALSE, 0xffffffffffULL }, 0xd4164fc646ULL },
+    { "CRC-64/ECMA-182", "CRC-64",
+      { 0x42f0e1eba9ea3693ULL, 64, 0x0000000000000000ULL, FALSE, FALSE, 0x0000000000000000ULL }, 0x6c40df5f0b497347ULL },
+    { "CRC-64/GO-ISO", NULL,
+      { 0x000000000000001bULL, 64, 0xffffffffffffffffULL, TRUE, TRUE, 0xffffffffffffffffULL }, 0xb90956c775a41001ULL },
+    { "CRC-64/MS", NULL,
+      { 0x259c84cba6426349ULL, 64, 0xffffffffffffffffULL, TRUE, TRUE, 0x0000000000000000ULL }, 0x75d4b74f024eceeaULL },
+    { "CRC-64/NVME", NULL,
+      { 0xad93d23594c93659ULL, 64, 0xffffffffffffffffULL, TRUE, TRUE, 0xffffffffffffffffULL }, 0xae8b14860a799888ULL },
+    { "CRC-64/REDIS", NULL,
+      { 0xad93d23594c935a9ULL, 64, 0x0000000000000000ULL, TRUE, TRUE, 0x0000000000000000ULL }, 0xe9c6d914c4b8d9caULL },
+    { "CRC-64/WE", NULL,
+      { 0x42f0e1eba9ea3693ULL, 64, 0xffffffffffffffffULL, FALSE, FALSE, 0xffffffffffffffffULL }, 0x62ec59e3f1a4f00aULL },
+    { "CRC-64/XZ", "CRC-64/GO-ECMA",
+      { 0x42f0e1eba9ea3693ULL, 64, 0xffffffffffffffffULL, TRUE, TRUE, 0xffffffffffffffffULL }, 0x995dc9bbdf1939faULL },
+};
+
+#define NUM_MODELS ((int) (sizeof(crcModels) / sizeof(crcModels[0])))
+
+/* contexts for the common algorithms, built once and shared by all threads */
+crc_ctx_t crcPresets[NUM_PRESETS];
+pthread_once_t crcPresetsOnce = PTHREAD_ONCE_INIT;
+
+
+void _buildPresets(void)
+{
+    int n;
+
+    for (n = 0; n < NUM_PRESETS; n++)
+        _buildContext(&crcPresets[n], &crcModels[n].pars);
+}
+
+
+crc_ctx_t *_preset(int n)
+{
+    pthread_once(&crcPresetsOnce, _buildPresets);
+    return &crcPresets[n];
+}
+
+
+uint8_t crc8_onewire(uint32_t size, uint8_t *m)
+{
+    return (uint8_t) crc_ctx_compute(_preset(PRESET_ONEWIRE), size, m);
+}
+
+
+uint16_t crc16_arc(uint32_t size, uint8_t *m)
+{
+    return (uint16_t) crc_ctx_compute(_preset(PRESET_ARC), size, m);
+}
+
+
+uint16_t crc16_ccitt(uint32_t size, uint8_t *m)
+{
+    return (uint16_t) crc_ctx_compute(_preset(PRESET_CCITT), size, m);
+}
+
+
+uint16_t crc16_xmodem(uint32_t size, uint8_t *m)
+{
+    return (uint16_t) crc_ctx_compute(_preset(PRESET_XMODEM), size, m);
+}
+
+
+uint32_t crc32(uint32_t size, uint8_t *m)
+{
+    return (uint32_t) crc_ctx_compute(_preset(PRESET_CRC32), size, m);
+}
+
+
+uint32_t crc32c(uint32_t size, uint8_t *m)
+{
+    return (uint32_t) crc_ctx_compute(_preset(PRESET_CRC32C), size, m);
+}
+
+
+uint64_t crc64_ecma(uint32_t size, uint8_t *m)
+{
+    return crc_ctx_compute(_preset(PRESET_ECMA), size, m);
+}
+
+
+uint64_t crc64_xz(uint32_t size, uint8_t *m)
+{
+    return crc_ctx_compute(_preset(PRESET_XZ), size, m);
+}
+
+
+uint64_t crc64_go_iso(uint32_t size, uint8_t *m)
+{
+    return crc_ctx_compute(_preset(PRESET_GO_ISO), size, m);
+}
+
+
+/* TRUE if name is the given word, or one of the words of a list, in any case */
+int _nameMatches(const char *name, const char *words)
+{
+    size_t len;
+
+    if (words == NULL)
+        return FALSE;
+
+    len = strlen(name);
+
+    while (*words)
     {
-        /* pop one byte from register, and use it to calculate next index */
-        hireg = (reg >> (p->width - 8)) & 0xff;
-        reg = (reg << 8) & wmask;
+        if (strncasecmp(words, name, len) == 0 && (words[len] == ' ' || words[len] == '\0'))
+            return TRUE;
 
-        index = hireg ^ data[n];
-        reg = reg ^ crcLookupTable[index];
+        words = strchr(words, ' ');
+        if (words == NULL)
+            break;
+
+        words++;
     }
 
-    /* we don't need the data copy any more */
-    free(data);
+    return FALSE;
+}
+
 
-    /*
-    ** if the register value is to be reflected, the register must be treated
-    ** as a single value and reflected; equivalently we can reverse the byte
-    ** order of byte-wise reflected values
-    */
-    regout = reg;
-    if (p->refout)
+/*
+** copy the model of the given name or alias into model: a preset name of the
+** direct call functions (crc32 etc.), which comes first, or a catalogue
+** name or alias, in any case; returns -1 if there is no such model
+*/
+int crc_model(const char *name, crc_model_t *model)
+{
+    int n;
+
+    /* the lists of aliases are separated by spaces, which no name holds */
+    if (*name == '\0' || strchr(name, ' ') != NULL)
+        return -1;
+
+    for (n = 0; n < NUM_MODELS; n++)
     {
-        /* decompose reg into bytes... */
-        for (n = 0; n < p->width / 8; n++)
+        if (_nameMatches(name, crcModels[n].name) || _nameMatches(name, crcModels[n].aliases))
         {
-            regbytes[n] = regout & 0xff;
-            regout = regout >> 8;
+            *model = crcModels[n];
+            return 0;
         }
+    }
 
-        /* ... reflect... */
-        _reflect(p->width / 8, regbytes);
+    return -1;
+}
 
-        /* ... and reconstruct */
-        regout = 0;
-        for (n = 0; n < p->width / 8; n++)
-            regout = (regout << 8) + regbytes[n];
-    }
 
-    /* xor register before returning its value */
-    regout = regout ^ p->xorout;
+/* copy the n-th named model into model, to list them; returns -1 past the end */
+int crc_model_at(int n, crc_model_t *model)
+{
+    if (n < 0 || n >= NUM_MODELS)
+        return -1;
 
-    return regout;
+    *model = crcModels[n];
+    return 0;
 }
 
+
+/* reflect the bits of a value over width bits */
+uint64_t _reflectValue(uint64_t x, uint32_t width)
+{
+    uint32_t n;
+    uint64_t reflected;
+
+    reflected = 0;
+    for (n = 0; n < width; n++)
+    {
+        reflected = (reflected << 1) + (x & 1);
+        x = x >> 1;
+    }
+
+    return reflected;
+}
+
+
+/*
+** the crc calculation is split into three steps so that a message can be
+** processed in chunks: crc_init() returns the initial register value,
+** crc_update() advances the register over a chunk of the message and
+** crc_final() applies refout and xorout to produce the checksum
+**
+** for refin models the register is held reflected and the reflected
+** (LSB-first) tables are used, so the message is read as it is, without
+** reflecting each byte
+*/
+uint64_t crc_init(crc_t *p)
+{
+    if (p->refin)
+        return _reflectValue(p->init, p->width);
+
+    return (p->init & CRC_WMASK(p->width)) << CRC_PAD(p);
+}
+
+
+/*
+** consume one block of the given number of message bytes with the
+** slicing-by-N algorithm: the top bytes of the register are combined with
+** the first message bytes, and each byte is looked up in the table for the
+** number of bytes which follow it in the block
+**
+** the register is lined up with the top of 64 bits (shift is 64 - width);
+** a register of more than 32 bits reaches into the second word of the block,
+** or past the end of a 4 byte block, where its low bits are carried over
+*/
+static inline uint64_t _sliceBlock(const crc_table_t *t, int slices, int shift, uint64_t reg, uint8_t *d)
+{
+    int k;
+    uint32_t x;
+    uint64_t a;
+
+    a = reg << shift;
+
+    x = (uint32_t) (a >> 32) ^ (((uint32_t) d[0] << 24) | ((uint32_t) d[1] << 16) |
+                                ((uint32_t) d[2] << 8) | (uint32_t) d[3]);
+
+    reg = t[slices - 1][x >> 24] ^ t[slices - 2][(x >> 16) & 0xff] ^
+          t[slices - 3][(x >> 8) & 0xff] ^ t[slices - 4][x & 0xff];
+
+    if (slices == 4)
+        return reg ^ ((a << 32) >> shift);
+
+    x = (uint32_t) a ^ (((uint32_t) d[4] << 24) | ((uint32_t) d[5] << 16) |
+                        ((uint32_t) d[6] << 8) | (uint32_t) d[7]);
+
+    reg = reg ^ t[slices - 5][x >> 24] ^ t[slices - 6][(x >> 16) & 0xff] ^
+          t[slices - 7][(x >> 8) & 0xff] ^ t[slices - 8][x & 0xff];
+
+    for (k = 8; k < slices; k++)
+        reg = reg ^ t[slices - 1 - k][d[k]];
+
+    return reg;
+}
+
+
+/*
+** as _sliceBlock() for the reflected tables: the register is held in the
+** low bits, so it is combined with the first message bytes little-endian
+*/
+static inline uint64_t _sliceBlockReflected(const crc_table_t *t, int slices, uint64_t reg, uint8_t *d)
+{
+    int k;
+    uint32_t x;
+    uint64_t hi;
+
+    hi = reg >> 32;
+
+    x = (uint32_t) reg ^ ((uint32_t) d[0] | ((uint32_t) d[1] << 8) |
+                          ((uint32_t) d[2] << 16) | ((uint32_t) d[3] << 24));
+
+    reg = t[slices - 1][x & 0xff] ^ t[slices - 2][(x >> 8) & 0xff] ^
+          t[slices - 3][(x >> 16) & 0xff] ^ t[slices - 4][x >> 24];
+
+    if (slices == 4)
+        return reg ^ hi;
+
+    x = (uint32_t) hi ^ ((uint32_t) d[4] | ((uint32_t) d[5] << 8) |
+                         ((uint32_t) d[6] << 16) | ((uint32_t) d[7] << 24));
+
+    reg = reg ^ t[slices - 5][x & 0xff] ^ t[slices - 6][(x >> 8) & 0xff] ^
+          t[slices - 7][(x >> 16) & 0xff] ^ t[slices - 8][x >> 24];
+
+    for (k = 8; k < slices; k++)
+        reg = reg ^ t[slices - 1 - k][d[k]];
+
+    return reg;
+}
+
+
+/*
+** advance the register over the message using the lookup tables; slices
+** selects the byte at a time loop (1) or slicing-by-4, 8 or 16, and any
+** bytes left over after the last whole block go through the byte loop
+*/
+uint64_t _crcUpdateTables(crc_t *p, const crc_table_t *t, int slices, uint64_t reg, uint32_t size, uint8_t *data)
+{
+    uint32_t n;
+    uint8_t index;
+    uint8_t hireg;
+    uint64_t wmask;
+    int shift;
+
+    /* calculate a mask to restrict the value to width bits */
+    wmask = CRC_WMASK(CRC_REGWIDTH(p));
+    shift = 64 - CRC_REGWIDTH(p);
+
+    n = 0;
+
+    if (p->refin)
+    {
+        switch (slices)
+        {
+            case 4:
+                for (; n + 4 <= size; n += 4)
+                    reg = _sliceBlockReflected(t, 4, reg, data + n);
+                break;
+
+            case 8:
+                for (; n + 8 <= size; n += 8)
+                    reg = _sliceBlockReflected(t, 8, reg, data + n);
+                break;
+
+            case 16:
+                for (; n + 16 <= size; n += 16)
+                    reg = _sliceBlockReflected(t, 16, reg, data + n);
+                break;
+        }
+
+        /* the low byte of the register meets the next message byte */
+        for (; n < size; n++)
+            reg = (reg >> 8) ^ t[0][(reg ^ data[n]) & 0xff];
+
+        return reg;
+    }
+
+    switch (slices)
+    {
+        case 4:
+            for (; n + 4 <= size; n += 4)
+                reg = _sliceBlock(t, 4, shift, reg, data + n);
+            break;
+
+        case 8:
+            for (; n + 8 <= size; n += 8)
+                reg = _sliceBlock(t, 8, shift, reg, data + n);
+            break;
+
+        case 16:
+            for (; n + 16 <= size; n += 16)
+                reg = _sliceBlock(t, 16, shift, reg, data + n);
+            break;
+    }
+
+    for (; n < size; n++)
+    {
+        /* pop one byte from register, and use it to calculate next index */
+        hireg = (reg >> (CRC_REGWIDTH(p) - 8)) & 0xff;
+        reg = (reg << 8) & wmask;
+
+        index = hireg ^ data[n];
+        reg = reg ^ t[0][index];
+    }
+
+    return reg;
+}
+
+
+/* choose the number of slices for a chunk of the given size */
+int _sliceCount(uint64_t size)
+{
+    if (size >= CRC_SLICE16_THRESHOLD)
+        return 16;
+
+    if (size >= CRC_SLICE8_THRESHOLD)
+        return 8;
+
+    return 1;
+}
+
+
+#ifdef CRC_HAVE_FOLD
+
+/* move a block forward by the distance of the constants k, and add the next block */
+__attribute__((target("pclmul,ssse3")))
+static inline __m128i _foldBlock(__m128i a, __m128i k, __m128i next)
+{
+    return _mm_xor_si128(_mm_xor_si128(_mm_clmulepi64_si128(a, k, 0x00),
+                                       _mm_clmulepi64_si128(a, k, 0x11)), next);
+}
+
+
+/*
+** advance the register over a message of a multiple of 16 bytes, at least
+** 64, by folding: four blocks are carried in parallel and moved forward over
+** each other with carry-less multiplies, which keeps every block congruent
+** to the message so far modulo P; the last block is then reduced with the
+** lookup table
+**
+** blocks are loaded so that the polynomial reads in the order of the model:
+** byte-swapped to big-endian for MSB-first models and as they are for
+** reflected ones; the register is added to the top (first) bits of the
+** first block, which then stands for the message with the register applied
+*/
+__attribute__((target("pclmul,ssse3")))
+uint64_t _crcFold(crc_t *p, const crc_table_t *tables, const crc_fold_t *fold, uint64_t reg, uint32_t size, uint8_t *data)
+{
+    int n;
+    uint32_t done;
+    uint8_t last[16];
+    __m128i swap;
+    __m128i k512;
+    __m128i k128;
+    __m128i a[4];
+
+    swap = _mm_set_epi8(0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15);
+    k512 = _mm_set_epi64x(fold->k512[1], fold->k512[0]);
+    k128 = _mm_set_epi64x(fold->k128[1], fold->k128[0]);
+
+#define LOAD(d) (p->refin ? _mm_loadu_si128((__m128i *) (d)) : \
+                 _mm_shuffle_epi8(_mm_loadu_si128((__m128i *) (d)), swap))
+
+    for (n = 0; n < 4; n++)
+        a[n] = LOAD(data + 16 * n);
+
+    if (p->refin)
+        a[0] = _mm_xor_si128(a[0], _mm_set_epi64x(0, reg));
+    else
+        a[0] = _mm_xor_si128(a[0], _mm_set_epi64x((uint64_t) reg << (64 - CRC_REGWIDTH(p)), 0));
+
+    for (done = 64; done + 64 <= size; done += 64)
+    {
+        for (n = 0; n < 4; n++)
+            a[n] = _foldBlock(a[n], k512, LOAD(data + done + 16 * n));
+    }
+
+    /* fold the four blocks into one, and then any blocks left over */
+    for (n = 1; n < 4; n++)
+        a[0] = _foldBlock(a[0], k128, a[n]);
+
+    for (; done < size; done += 16)
+        a[0] = _foldBlock(a[0], k128, LOAD(data + done));
+
+#undef LOAD
+
+    if (!p->refin)
+        a[0] = _mm_shuffle_epi8(a[0], swap);
+
+    _mm_storeu_si128((__m128i *) last, a[0]);
+
+    return _crcUpdateTables(p, tables, 1, 0, 16, last);
+}
+
+
+/* advance the register of the reflected CRC-32C with the crc32 instruction */
+__attribute__((target("sse4.2")))
+uint32_t _crcUpdateCrc32c(uint32_t reg, uint32_t size, uint8_t *data)
+{
+    uint32_t n;
+#ifdef __x86_64__
+    uint64_t word;
+    uint64_t reg64;
+
+    reg64 = reg;
+    for (n = 0; n + 8 <= size; n += 8)
+    {
+        memcpy(&word, data + n, 8);
+        reg64 = _mm_crc32_u64(reg64, word);
+    }
+
+    reg = (uint32_t) reg64;
+#else
+    uint32_t word;
+
+    for (n = 0; n + 4 <= size; n += 4)
+    {
+        memcpy(&word, data + n, 4);
+        reg = _mm_crc32_u32(reg, word);
+    }
+#endif
+
+    for (; n < size; n++)
+        reg = _mm_crc32_u8(reg, data[n]);
+
+    return reg;
+}
+
+#endif
+
+
+/*
+** advance the register over the message using lookup tables which have
+** already been fetched; this does not touch the table cache, and the
+** message is read in place
+**
+** if fold is not NULL, the folding engine takes the 16 byte blocks of a
+** large message and the crc32 instruction takes the CRC-32C messages, when
+** the CPU has them; the rest goes through the table engine
+*/
+uint64_t _crcUpdate(crc_t *p, const crc_table_t *tables, const crc_fold_t *fold, int slices, uint64_t reg, uint32_t size, uint8_t *m)
+{
+#ifdef CRC_HAVE_FOLD
+    uint32_t n;
+    uint8_t engine;
+
+    engine = (fold != NULL) ? fold->engine & crcCpuEngines : 0;
+    if (engine)
+    {
+        n = 0;
+        if ((engine & CRC_ENGINE_CLMUL) && size >= CRC_FOLD_THRESHOLD)
+        {
+            n = size & ~15;
+            reg = _crcFold(p, tables, fold, reg, n, m);
+        }
+
+        if (engine & CRC_ENGINE_CRC32C)
+            return _crcUpdateCrc32c(reg, size - n, m + n);
+
+        return _crcUpdateTables(p, tables, slices, reg, size - n, m + n);
+    }
+#else
+    (void) fold;
+#endif
+
+    return _crcUpdateTables(p, tables, slices, reg, size, m);
+}
+
+
+/*
+** advance the register *reg over a chunk of the message using the
+** slicing-by-N algorithm with the given number of slices (1, 4, 8 or 16), or
+** 0 to choose the algorithm from the size of the chunk; returns -1, leaving
+** the register as it is, for any other number of slices or if the tables
+** cannot be built
+*/
+int crc_update_sliced(crc_t *p, uint64_t *reg, int slices, uint32_t size, uint8_t *m)
+{
+    int automatic;
+    const crc_fold_t *fold;
+    const crc_table_t *tables;
+
+    automatic = (slices == CRC_SLICE_AUTO);
+    if (automatic)
+        slices = _sliceCount(size);
+
+    if (slices != 1 && slices != 4 && slices != 8 && slices != 16)
+        return -1;
+
+    /* fetch the lookup tables, building them if necessary */
+    tables = _lookupTables(p->poly, p->width, p->refin, slices, &fold);
+    if (tables == NULL)
+        return -1;
+    // _dumpLookupTable(tables[0]);
+
+    /* a particular number of slices asks for the table engine */
+    *reg = _crcUpdate(p, tables, automatic ? fold : NULL, slices, *reg, size, m);
+
+    return 0;
+}
+
+
+uint64_t crc_update(crc_t *p, uint64_t reg, uint32_t size, uint8_t *m)
+{
+    if (crc_update_sliced(p, &reg, CRC_SLICE_AUTO, size, m) != 0)
+        return 0;
+
+    return reg;
+}
+
+
+uint64_t crc_final(crc_t *p, uint64_t reg)
+{
+    uint64_t regout;
+
+    /*
+    ** the register of a refin model is already reflected, so it only has
+    ** to be reflected when refin and refout differ
+    */
+    regout = reg >> CRC_PAD(p);
+    if (p->refin != p->refout)
+        regout = _reflectValue(regout, p->width);
+
+    /* xor register before returning its value */
+    regout = regout ^ p->xorout;
+
+    return regout;
+}
+
+
+/* convert a checksum back into the register value it was made from */
+uint64_t _crcUnfinal(crc_t *p, uint64_t cksum)
+{
+    uint64_t reg;
+
+    reg = cksum ^ p->xorout;
+    if (p->refin != p->refout)
+        reg = _reflectValue(reg, p->width);
+
+    return reg << CRC_PAD(p);
+}
+
+
+/*
+** GF(2) matrix operations as in zlib's crc32_combine: a matrix is an array
+** of width columns, column n being the image of the vector with bit n set
+*/
+uint64_t _gf2MatrixTimes(uint64_t *mat, uint64_t vec)
+{
+    uint64_t sum;
+
+    sum = 0;
+    while (vec)
+    {
+        if (vec & 1)
+            sum ^= *mat;
+
+        vec >>= 1;
+        mat++;
+    }
+
+    return sum;
+}
+
+
+void _gf2MatrixSquare(uint64_t *square, uint64_t *mat, uint32_t width)
+{
+    uint32_t n;
+
+    for (n = 0; n < width; n++)
+        square[n] = _gf2MatrixTimes(mat, mat[n]);
+}
+
+
+/*
+** advance the register over nbytes zero bytes in O(log nbytes) steps: with
+** no message bytes coming in the register update is linear, so the operator
+** for one zero byte is squared to get the operators for 2, 4, 8... bytes
+*/
+uint64_t _crcShift(crc_t *p, const crc_table_t *tables, uint64_t reg, uint64_t nbytes)
+{
+    int n;
+    uint8_t zero;
+    uint64_t even[64];
+    uint64_t odd[64];
+    uint64_t *op;
+    uint64_t *next;
+    uint64_t *swap;
+
+    zero = 0;
+    for (n = 0; n < CRC_REGWIDTH(p); n++)
+        odd[n] = _crcUpdateTables(p, tables, 1, (uint64_t) 1 << n, 1, &zero);
+
+    op = odd;
+    next = even;
+
+    while (nbytes)
+    {
+        if (nbytes & 1)
+            reg = _gf2MatrixTimes(op, reg);
+
+        nbytes >>= 1;
+        if (nbytes)
+        {
+            _gf2MatrixSquare(next, op, CRC_REGWIDTH(p));
+            swap = op;
+            op = next;
+            next = swap;
+        }
+    }
+
+    return reg;
+}
+
+
+/*
+** calculate the checksum of the concatenated message A + B from the
+** checksums of A and B and the length of B, without the message data
+*/
+uint64_t crc_combine(crc_t *p, uint64_t crc_a, uint64_t crc_b, uint64_t len_b)
+{
+    uint64_t reg;
+    const crc_table_t *tables;
+
+    tables = _lookupTables(p->poly, p->width, p->refin, 1, NULL);
+    if (tables == NULL)
+        return 0;
+
+    /*
+    ** the register after A is carried across B, where B on its own was
+    ** started from the initial register; the difference is the register
+    ** after A xor the initial value, shifted over len_b zero bytes
+    */
+    reg = _crcShift(p, tables, _crcUnfinal(p, crc_a) ^ crc_init(p), len_b);
+
+    return crc_final(p, reg) ^ p->xorout ^ crc_b;
+}
+
+
+/*
+** checksum of a buffer of total_len bytes after the size bytes at offset
+** have changed from old_bytes to new_bytes, from its checksum before the
+** change; the checksum is linear in the message, so the change to the
+** checksum is the register for the xor of the old and new bytes, started
+** from zero and shifted over the bytes after them, which takes
+** O(log total_len) steps however large the buffer is
+*/
+uint64_t _crcUpdateRange(crc_t *p, const crc_table_t *tables, const crc_fold_t *fold, uint64_t old_crc,
+                         uint64_t total_len, uint64_t offset, uint32_t size, uint8_t *old_bytes, uint8_t *new_bytes)
+{
+    uint32_t n;
+    uint32_t piece;
+    uint64_t reg;
+    uint8_t delta[CRC_RANGE_PIECE];
+
+    /* the changed bytes must lie within the buffer */
+    if (offset > total_len || size > total_len - offset)
+        return 0;
+
+    reg = 0;
+    while (size)
+    {
+        piece = size < CRC_RANGE_PIECE ? size : CRC_RANGE_PIECE;
+        for (n = 0; n < piece; n++)
+            delta[n] = old_bytes[n] ^ new_bytes[n];
+
+        reg = _crcUpdate(p, tables, fold, _sliceCount(piece), reg, piece, delta);
+
+        offset += piece;
+        size -= piece;
+        old_bytes += piece;
+        new_bytes += piece;
+    }
+
+    reg = _crcShift(p, tables, reg, total_len - offset);
+
+    return old_crc ^ crc_final(p, reg) ^ p->xorout;
+}
+
+
+uint64_t crc_update_range(crc_t *p, uint64_t old_crc, uint64_t total_len, uint64_t offset,
+                          uint32_t size, uint8_t *old_bytes, uint8_t *new_bytes)
+{
+    const crc_fold_t *fold;
+    const crc_table_t *tables;
+
+    tables = _lookupTables(p->poly, p->width, p->refin, _sliceCount(size), &fold);
+    if (tables == NULL)
+        return 0;
+
+    return _crcUpdateRange(p, tables, fold, old_crc, total_len, offset, size, old_bytes, new_bytes);
+}
+
+
+/* work for one thread of crc_parallel() */
+typedef struct crc_chunk
+{
+    crc_t       *p;
+    const crc_table_t *tables;
+    const crc_fold_t  *fold;
+    uint8_t     *data;
+    uint64_t    size;
+    uint64_t    cksum;
+} crc_chunk_t;
+
+
+/* checksum one chunk, in pieces small enough for a uint32_t size */
+void *_crcChunk(void *arg)
+{
+    uint64_t reg;
+    uint32_t len;
+    uint64_t done;
+    crc_chunk_t *chunk;
+
+    chunk = (crc_chunk_t *) arg;
+    reg = crc_init(chunk->p);
+
+    for (done = 0; done < chunk->size; done += len)
+    {
+        len = (chunk->size - done > CRC_PARALLEL_PIECE) ? CRC_PARALLEL_PIECE : chunk->size - done;
+        reg = _crcUpdate(chunk->p, chunk->tables, chunk->fold, CRC_MAX_SLICES, reg, len, chunk->data + done);
+    }
+
+    chunk->cksum = crc_final(chunk->p, reg);
+
+    return NULL;
+}
+
+
+/*
+** calculate the checksum of a large buffer with nthreads threads: the buffer
+** is split into one chunk per thread, the chunks are checksummed
+** concurrently and the chunk checksums are joined with crc_combine()
+*/
+uint64_t crc_parallel(crc_t *p, uint64_t size, uint8_t *buf, int nthreads)
+{
+    int n;
+    int started;
+    uint64_t cksum;
+    uint64_t chunkSize;
+    const crc_fold_t *fold;
+    const crc_table_t *tables;
+    crc_chunk_t *chunks;
+    pthread_t *threads;
+
+    /* not worth starting threads for small buffers */
+    if ((uint64_t) nthreads > size / CRC_PARALLEL_MIN_CHUNK)
+        nthreads = size / CRC_PARALLEL_MIN_CHUNK;
+
+    if (nthreads < 1)
+        nthreads = 1;
+
+    /*
+    ** fetch the tables here: the threads only read them and do not touch
+    ** the table cache
+    */
+    tables = _lookupTables(p->poly, p->width, p->refin, CRC_MAX_SLICES, &fold);
+    if (tables == NULL)
+        return 0;
+
+    chunks = calloc(nthreads, sizeof(crc_chunk_t));
+    threads = calloc(nthreads, sizeof(pthread_t));
+    if (chunks == NULL || threads == NULL)
+    {
+        free(chunks);
+        free(threads);
+        return 0;
+    }
+
+    chunkSize = size / nthreads;
+
+    for (n = 0; n < nthreads; n++)
+    {
+        chunks[n].p = p;
+        chunks[n].tables = tables;
+        chunks[n].fold = fold;
+        chunks[n].data = buf + n * chunkSize;
+        chunks[n].size = (n == nthreads - 1) ? size - n * chunkSize : chunkSize;
+    }
+
+    /* the calling thread takes the first chunk itself */
+    started = 1;
+    for (n = 1; n < nthreads; n++)
+    {
+        if (pthread_create(&threads[n], NULL, _crcChunk, &chunks[n]) != 0)
+            break;
+
+        started++;
+    }
+
+    _crcChunk(&chunks[0]);
+
+    /* if a thread could not be started, do its work here */
+    for (n = started; n < nthreads; n++)
+        _crcChunk(&chunks[n]);
+
+    for (n = 1; n < started; n++)
+        pthread_join(threads[n], NULL);
+
+    cksum = chunks[0].cksum;
+    for (n = 1; n < nthreads; n++)
+        cksum = crc_combine(p, cksum, chunks[n].cksum, chunks[n].size);
+
+    free(chunks);
+    free(threads);
+
+    return cksum;
+}
+
+
+uint64_t crc(crc_t *p, uint32_t size, uint8_t *m)
+{
+    uint64_t reg;
+
+    reg = crc_init(p);
+    reg = crc_update(p, reg, size, m);
+
+    return crc_final(p, reg);
+}
+
+
+/*
+** checksum of a message held in n fragments (a header, slices of a payload,
+** a trailer...), carrying the register from one fragment to the next so
+** that the fragments are read in place rather than copied together
+*/
+uint64_t crc_iov(crc_t *p, const struct iovec *iov, int n)
+{
+    int k;
+    size_t len;
+    uint32_t piece;
+    uint8_t *base;
+    uint64_t reg;
+
+    reg = crc_init(p);
+
+    for (k = 0; k < n; k++)
+    {
+        base = iov[k].iov_base;
+        len = iov[k].iov_len;
+
+        while (len)
+        {
+            piece = len < CRC_IOV_PIECE ? len : CRC_IOV_PIECE;
+            reg = crc_update(p, reg, piece, base);
+
+            base += piece;
+            len -= piece;
+        }
+    }
+
+    return crc_final(p, reg);
+}
+
+/*
+** reentrant API: a context holds its own copy of the parameters and the
+** tables, so contexts can be used concurrently by any number of threads
+*/
+crc_ctx_t *crc_ctx_new(crc_t *p)
+{
+    size_t size;
+    crc_ctx_t *ctx;
+
+    /* width should be from 1 to 64 bits */
+    if (p->width < 1 || p->width > 64)
+        return NULL;
+
+    /* a context using generated tables has no need for tables of its own */
+    if (_staticTables(p->poly, p->width, p->refin) != NULL)
+        size = offsetof(crc_ctx_t, own);
+    else
+        size = sizeof(crc_ctx_t);
+
+    ctx = malloc(size);
+    if (ctx == NULL)
+        return NULL;
+
+    _buildContext(ctx, p);
+
+    return ctx;
+}
+
+
+void crc_ctx_free(crc_ctx_t *ctx)
+{
+    free(ctx);
+}
+
+
+uint64_t crc_ctx_init(crc_ctx_t *ctx)
+{
+    return crc_init(&ctx->pars);
+}
+
+
+uint64_t crc_ctx_update(crc_ctx_t *ctx, uint64_t reg, uint32_t size, uint8_t *m)
+{
+    return _crcUpdate(&ctx->pars, ctx->tables, &ctx->fold, _sliceCount(size), reg, size, m);
+}
+
+
+/* crc_update_sliced() for a context: 1, 4, 8 or 16 slices, or CRC_SLICE_AUTO */
+int crc_ctx_update_sliced(crc_ctx_t *ctx, uint64_t *reg, int slices, uint32_t size, uint8_t *m)
+{
+    if (slices == CRC_SLICE_AUTO)
+        *reg = crc_ctx_update(ctx, *reg, size, m);
+    else if (slices == 1 || slices == 4 || slices == 8 || slices == 16)
+        *reg = _crcUpdate(&ctx->pars, ctx->tables, NULL, slices, *reg, size, m);
+    else
+        return -1;
+
+    return 0;
+}
+
+uint64_t crc_ctx_final(crc_ctx_t *ctx, uint64_t reg)
+{
+    return crc_final(&ctx->pars, reg);
+}
+
+
+uint64_t crc_ctx_compute(crc_ctx_t *ctx, uint32_t size, uint8_t *m)
+{
+    uint64_t reg;
+
+    reg = crc_ctx_init(ctx);
+    reg = crc_ctx_update(ctx, reg, size, m);
+
+    return crc_ctx_final(ctx, reg);
+}
+
+
+uint64_t crc_ctx_iov(crc_ctx_t *ctx, const struct iovec *iov, int n)
+{
+    int k;
+    size_t len;
+    uint32_t piece;
+    uint8_t *base;
+    uint64_t reg;
+
+    reg = crc_ctx_init(ctx);
+
+    for (k = 0; k < n; k++)
+    {
+        base = iov[k].iov_base;
+        len = iov[k].iov_len;
+
+        while (len)
+        {
+            piece = len < CRC_IOV_PIECE ? len : CRC_IOV_PIECE;
+            reg = crc_ctx_update(ctx, reg, piece, base);
+
+            base += piece;
+            len -= piece;
+        }
+    }
+
+    return crc_ctx_final(ctx, reg);
+}
+
+uint64_t crc_ctx_combine(crc_ctx_t *ctx, uint64_t crc_a, uint64_t crc_b, uint64_t len_b)
+{
+    crc_t *p;
+    uint64_t reg;
+
+    p = &ctx->pars;
+    reg = _crcShift(p, ctx->tables, _crcUnfinal(p, crc_a) ^ crc_init(p), len_b);
+
+    return crc_final(p, reg) ^ p->xorout ^ crc_b;
+}
+
+
+uint64_t crc_ctx_update_range(crc_ctx_t *ctx, uint64_t old_crc, uint64_t total_len, uint64_t offset,
+                              uint32_t size, uint8_t *old_bytes, uint8_t *new_bytes)
+{
+    return _crcUpdateRange(&ctx->pars, ctx->tables, &ctx->fold, old_crc, total_len, offset, size, old_bytes, new_bytes);
+}
+
+
+/*
+** advance the registers of n models over the same message in one pass; the
+** message is taken in blocks small enough to stay in the cache, and each
+** block goes through every model before the next one is read
+*/
+void crc_multi_update(crc_ctx_t **ctxs, int n, uint64_t *regs, uint32_t size, uint8_t *m)
+{
+    int k;
+    uint32_t block;
+
+    while (size)
+    {
+        block = size < CRC_MULTI_BLOCK ? size : CRC_MULTI_BLOCK;
+
+        for (k = 0; k < n; k++)
+            regs[k] = crc_ctx_update(ctxs[k], regs[k], block, m);
+
+        m += block;
+        size -= block;
+    }
+}
+
+
+/* checksums of one message under n models, reading the message once */
+void crc_multi(crc_ctx_t **ctxs, int n, uint32_t size, uint8_t *m, uint64_t *cksums)
+{
+    int k;
+
+    for (k = 0; k < n; k++)
+        cksums[k] = crc_ctx_init(ctxs[k]);
+
+    crc_multi_update(ctxs, n, cksums, size, m);
+
+    for (k = 0; k < n; k++)
+        cksums[k] = crc_ctx_final(ctxs[k], cksums[k]);
+}
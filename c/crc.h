@@ -3,6 +3,7 @@
 
 
 #include <stdint.h>
+#include <sys/uio.h>
 
 #define TRUE  1
 #define FALSE 0
@@ -11,24 +12,121 @@
 
 typedef struct crc
 {
-    uint32_t poly;
+    uint64_t poly;
     uint8_t  width;
-    uint32_t init;
+    uint64_t init;
     uint8_t  refin;
     uint8_t  refout;
-    uint32_t xorout;
+    uint64_t xorout;
 } crc_t;
 
+
+/* counters for the lookup table caches, added up over all threads */
+typedef struct crc_cache_stats
+{
+    uint32_t hits;
+    uint32_t misses;
+    uint32_t evictions;
+} crc_cache_stats_t;
+
     
-extern uint32_t crc(crc_t*, uint32_t size, uint8_t*);
+extern uint64_t crc(crc_t*, uint32_t size, uint8_t*);
+
+/* incremental calculation for messages that arrive in chunks */
+extern uint64_t crc_init(crc_t*);
+extern uint64_t crc_update(crc_t*, uint64_t reg, uint32_t size, uint8_t*);
+extern uint64_t crc_final(crc_t*, uint64_t reg);
+
+/*
+** crc_update() using the slicing-by-N algorithm with 4, 8 or 16 slices,
+** 1 for the byte at a time algorithm, or CRC_SLICE_AUTO to choose by size;
+** with CRC_SLICE_AUTO large messages use the folding engine if the CPU has it;
+** the register is advanced in place, and -1 is returned, leaving it as it
+** is, for any other number of slices
+*/
+#define CRC_SLICE_AUTO 0
+
+extern int crc_update_sliced(crc_t*, uint64_t *reg, int slices, uint32_t size, uint8_t*);
+
+/* checksum of A + B from the checksums of A and B, and the length of B */
+extern uint64_t crc_combine(crc_t*, uint64_t crc_a, uint64_t crc_b, uint64_t len_b);
+
+/*
+** checksum of a buffer of total_len bytes after the size bytes at offset
+** have changed from old_bytes to new_bytes, given its checksum before the
+** change, in time logarithmic in the length of the buffer
+*/
+extern uint64_t crc_update_range(crc_t*, uint64_t old_crc, uint64_t total_len, uint64_t offset,
+                                 uint32_t size, uint8_t *old_bytes, uint8_t *new_bytes);
+
+/* checksum of a message held in n fragments, read in place */
+extern uint64_t crc_iov(crc_t*, const struct iovec *iov, int n);
+
+/* checksum of a large buffer, calculated in chunks by nthreads threads */
+extern uint64_t crc_parallel(crc_t*, uint64_t size, uint8_t*, int nthreads);
+
+/*
+** reentrant API: a context owns the tables for one parameter set and can be
+** shared between threads; the functions above use a table cache private to
+** the calling thread, so they are also safe to call from several threads
+*/
+typedef struct crc_ctx crc_ctx_t;
+
+extern crc_ctx_t *crc_ctx_new(crc_t*);
+extern void crc_ctx_free(crc_ctx_t*);
+extern uint64_t crc_ctx_compute(crc_ctx_t*, uint32_t size, uint8_t*);
+extern uint64_t crc_ctx_init(crc_ctx_t*);
+extern uint64_t crc_ctx_update(crc_ctx_t*, uint64_t reg, uint32_t size, uint8_t*);
+extern int crc_ctx_update_sliced(crc_ctx_t*, uint64_t *reg, int slices, uint32_t size, uint8_t*);
+extern uint64_t crc_ctx_final(crc_ctx_t*, uint64_t reg);
+extern uint64_t crc_ctx_combine(crc_ctx_t*, uint64_t crc_a, uint64_t crc_b, uint64_t len_b);
+extern uint64_t crc_ctx_iov(crc_ctx_t*, const struct iovec *iov, int n);
+extern uint64_t crc_ctx_update_range(crc_ctx_t*, uint64_t old_crc, uint64_t total_len, uint64_t offset,
+                                     uint32_t size, uint8_t *old_bytes, uint8_t *new_bytes);
+
+/*
+** several models over the same message in one pass: crc_multi_update()
+** advances the registers regs[k] of the contexts ctxs[k], and crc_multi()
+** puts the checksums of the whole message in cksums
+*/
+extern void crc_multi_update(crc_ctx_t **ctxs, int n, uint64_t *regs, uint32_t size, uint8_t*);
+extern void crc_multi(crc_ctx_t **ctxs, int n, uint32_t size, uint8_t*, uint64_t *cksums);
+
+/*
+** crc_cache_stats() gives the counters of the table caches of every thread
+** since the last crc_cache_clear(), which empties the cache of the calling
+** thread
+*/
+extern void crc_cache_stats(crc_cache_stats_t*);
+extern void crc_cache_clear(void);
+
+/*
+** named models: the presets of the direct call functions (crc32 etc.) and the
+** catalogue of parametrised CRC models (reveng), by name or alias in any
+** case; check is the checksum of the ASCII string "123456789"; the tables of
+** a model are only built when it is used
+*/
+typedef struct crc_model
+{
+    const char *name;
+    const char *aliases;
+    crc_t       pars;
+    uint64_t    check;
+} crc_model_t;
+
+extern int crc_model(const char *name, crc_model_t*);
+extern int crc_model_at(int n, crc_model_t*);
 
 /* common crc algorithms, so users do not have to construct the parameter set */
-extern uint8_t crc1w(uint32_t, uint8_t*);
+extern uint8_t crc8_onewire(uint32_t, uint8_t*);
 extern uint16_t crc16_arc(uint32_t, uint8_t*);
 extern uint16_t crc16_ccitt(uint32_t, uint8_t*);
 extern uint16_t crc16_xmodem(uint32_t, uint8_t*);
 extern uint32_t crc32(uint32_t, uint8_t*);
 extern uint32_t crc32c(uint32_t, uint8_t*);
+extern uint64_t crc64_ecma(uint32_t, uint8_t*);
+extern uint64_t crc64_xz(uint32_t, uint8_t*);
+extern uint64_t crc64_go_iso(uint32_t, uint8_t*);
 
 
 #endif
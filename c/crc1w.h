@@ -1,9 +1,8 @@
 #ifndef __crc1w_h__
 #define __crc1w_h__
 
-#include <sys/types.h>
+#include <stdint.h>
 
-typedef u_int8_t uint8_t;
 extern uint8_t crc1w(int, uint8_t*);
 
 
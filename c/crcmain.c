@@ -0,0 +1,200 @@
+
+/*
+** command line checksum of files:
+**
+**   crc [-q] [-j threads] model file...
+**   crc -l
+**
+** model is a preset (crc32 etc.) or a name or alias from the catalogue of
+** the library, in any case; -l lists them
+**
+** regular files are memory-mapped; pipes, stdin (named as -) and anything
+** else that cannot be mapped are read in large chunks
+*/
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <time.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include "crc.h"
+
+/* size of the read buffer for files that cannot be mapped */
+#define READ_CHUNK (1 << 20)
+
+double now(void)
+{
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+
+void usage(void)
+{
+    fprintf(stderr, "usage: crc [-q] [-j threads] model file...\n");
+    fprintf(stderr, "       crc -l    (list the models)\n");
+
+    exit(2);
+}
+
+
+/* print the named models with their widths and aliases */
+void listModels(void)
+{
+    int n;
+    crc_model_t model;
+
+    for (n = 0; crc_model_at(n, &model) == 0; n++)
+        printf("%-26s %2d  %s\n", model.name, model.pars.width,
+               model.aliases != NULL ? model.aliases : "");
+}
+
+
+/* checksum a file descriptor with read(); returns -1 on a read error */
+int checksumRead(crc_t *p, int fd, uint64_t *cksum, uint64_t *size)
+{
+    ssize_t len;
+    uint64_t reg;
+    uint8_t *buf;
+
+    buf = malloc(READ_CHUNK);
+    if (buf == NULL)
+        return -1;
+
+    reg = crc_init(p);
+    *size = 0;
+
+    while ((len = read(fd, buf, READ_CHUNK)) > 0)
+    {
+        reg = crc_update(p, reg, len, buf);
+        *size += len;
+    }
+
+    free(buf);
+
+    if (len < 0)
+        return -1;
+
+    *cksum = crc_final(p, reg);
+    return 0;
+}
+
+
+/* checksum a file descriptor by mapping it; returns -1 if it cannot be mapped */
+int checksumMap(crc_t *p, int fd, int nthreads, uint64_t *cksum, uint64_t *size)
+{
+    struct stat st;
+    uint8_t *data;
+
+    if (fstat(fd, &st) < 0 || !S_ISREG(st.st_mode) || st.st_size == 0)
+        return -1;
+
+    data = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (data == MAP_FAILED)
+        return -1;
+
+    madvise(data, st.st_size, MADV_SEQUENTIAL);
+
+    *cksum = crc_parallel(p, st.st_size, data, nthreads);
+    *size = st.st_size;
+
+    munmap(data, st.st_size);
+    return 0;
+}
+
+
+int main(int argc, char **argv)
+{
+    int n;
+    int opt;
+    int fd;
+    int quiet;
+    int status;
+    int nthreads;
+    double start;
+    double elapsed;
+    uint64_t cksum;
+    uint64_t size;
+    crc_t *p;
+    crc_model_t model;
+
+    quiet = FALSE;
+    nthreads = 1;
+
+    while ((opt = getopt(argc, argv, "qj:l")) != -1)
+    {
+        switch (opt)
+        {
+            case 'l':
+                listModels();
+                return 0;
+
+            case 'q':
+                quiet = TRUE;
+                break;
+
+            case 'j':
+                nthreads = atoi(optarg);
+                break;
+
+            default:
+                usage();
+        }
+    }
+
+    if (argc - optind < 2)
+        usage();
+
+    if (crc_model(argv[optind], &model) < 0)
+    {
+        fprintf(stderr, "crc: unknown model %s\n", argv[optind]);
+        usage();
+    }
+
+    p = &model.pars;
+
+    status = 0;
+    for (n = optind + 1; n < argc; n++)
+    {
+        if (strcmp(argv[n], "-") == 0)
+            fd = STDIN_FILENO;
+        else
+            fd = open(argv[n], O_RDONLY);
+
+        if (fd < 0)
+        {
+            perror(argv[n]);
+            status = 1;
+            continue;
+        }
+
+        start = now();
+
+        if (checksumMap(p, fd, nthreads, &cksum, &size) < 0 &&
+            checksumRead(p, fd, &cksum, &size) < 0)
+        {
+            perror(argv[n]);
+            status = 1;
+        }
+        else
+        {
+            elapsed = now() - start;
+            printf("%0*llx  %s\n", (p->width + 3) / 4, (unsigned long long) cksum, argv[n]);
+
+            if (!quiet)
+                fprintf(stderr, "%s: %llu bytes in %.3f s (%.1f MB/s)\n", argv[n],
+                        (unsigned long long) size, elapsed,
+                        elapsed > 0 ? size / elapsed / 1e6 : 0.0);
+        }
+
+        if (fd != STDIN_FILENO)
+            close(fd);
+    }
+
+    return status;
+}
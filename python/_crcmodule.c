@@ -0,0 +1,253 @@
+
+/*
+** Python extension exposing the C library in ../c/crc.c
+**
+** _crc.Model holds a context of the C library, which owns its tables and is
+** only read once built, so a model can be used from several threads at
+** once: messages of at least GIL_THRESHOLD bytes are checksummed with the
+** GIL released. Messages are taken through the buffer protocol and are not
+** copied by the extension.
+**
+** Registers passed to and returned from update() are held the same way by
+** crc.py and the C library, ie. reflected for refin models, so that
+** crc.CrcModel can hand any part of a calculation to the extension.
+**
+** slices selects the engine as for crc_update_sliced(): 1, 4, 8 or 16 for
+** the table engine with that many slices, or 0 (the default) to let the
+** library choose, folding large messages when the CPU allows it. It is
+** checked when the model is made, so the updates cannot fail.
+*/
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include "crc.h"
+
+#if PY_MAJOR_VERSION >= 3
+#define BUFFER_FORMAT "y*"
+#else
+#define BUFFER_FORMAT "s*"
+#endif
+
+/* release the GIL for messages of at least this many bytes */
+#define GIL_THRESHOLD 8192
+
+/* the table engine takes the size as a uint32_t, so feed it in pieces */
+#define UPDATE_PIECE (1 << 30)
+
+
+typedef struct
+{
+    PyObject_HEAD
+    crc_t     pars;
+    crc_ctx_t *ctx;
+    int       slices;
+} ModelObject;
+
+
+static int Model_init(ModelObject *self, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"width", "poly", "init", "refin", "refout", "xorout", "slices", NULL};
+    unsigned int width;
+    unsigned PY_LONG_LONG poly;
+    unsigned PY_LONG_LONG init;
+    int refin;
+    int refout;
+    unsigned PY_LONG_LONG xorout;
+    int slices;
+    uint64_t wmask;
+
+    /*
+    ** other threads may be running the context with the GIL released, so it
+    ** cannot be freed or its parameters changed under them
+    */
+    if (self->ctx != NULL)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "_crc.Model is already initialised");
+        return -1;
+    }
+
+    slices = CRC_SLICE_AUTO;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "IKKiiK|i", kwlist,
+                                     &width, &poly, &init, &refin, &refout, &xorout, &slices))
+        return -1;
+
+    /* width should be from 1 to 64 bits */
+    if (width < 1 || width > 64)
+    {
+        PyErr_Format(PyExc_ValueError, "unsupported width %u", width);
+        return -1;
+    }
+
+    /* 0 lets the library choose the engine from the size of each message */
+    if (slices != CRC_SLICE_AUTO && slices != 1 && slices != 4 && slices != 8 && slices != 16)
+    {
+        PyErr_Format(PyExc_ValueError, "slices must be 1, 4, 8 or 16, not %d", slices);
+        return -1;
+    }
+
+    self->slices = slices;
+
+    wmask = (width == 64) ? ~(uint64_t) 0 : ((uint64_t) 1 << width) - 1;
+
+    self->pars.width = width;
+    self->pars.poly = poly & wmask;
+    self->pars.init = init & wmask;
+    self->pars.refin = refin ? TRUE : FALSE;
+    self->pars.refout = refout ? TRUE : FALSE;
+    self->pars.xorout = xorout & wmask;
+
+    self->ctx = crc_ctx_new(&self->pars);
+    if (self->ctx == NULL)
+    {
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    return 0;
+}
+
+
+static void Model_dealloc(ModelObject *self)
+{
+    crc_ctx_free(self->ctx);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+
+/* a model made with __new__ and never initialised has no context */
+static int Model_ready(ModelObject *self)
+{
+    if (self->ctx == NULL)
+    {
+        PyErr_SetString(PyExc_RuntimeError, "_crc.Model is not initialised");
+        return FALSE;
+    }
+
+    return TRUE;
+}
+
+
+/* advance a C library register over a buffer, releasing the GIL if it is large */
+static uint64_t Model_run(ModelObject *self, uint64_t reg, Py_buffer *view)
+{
+    uint8_t *data;
+    Py_ssize_t done;
+    uint32_t len;
+
+    data = (uint8_t *) view->buf;
+
+    if (view->len < GIL_THRESHOLD)
+    {
+        crc_ctx_update_sliced(self->ctx, &reg, self->slices, view->len, data);
+        return reg;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    for (done = 0; done < view->len; done += len)
+    {
+        len = (view->len - done > UPDATE_PIECE) ? UPDATE_PIECE : view->len - done;
+        crc_ctx_update_sliced(self->ctx, &reg, self->slices, len, data + done);
+    }
+    Py_END_ALLOW_THREADS
+
+    return reg;
+}
+
+
+static PyObject *Model_compute(ModelObject *self, PyObject *args)
+{
+    Py_buffer view;
+    uint64_t reg;
+
+    if (!Model_ready(self) || !PyArg_ParseTuple(args, BUFFER_FORMAT, &view))
+        return NULL;
+
+    reg = Model_run(self, crc_ctx_init(self->ctx), &view);
+    PyBuffer_Release(&view);
+
+    return PyLong_FromUnsignedLongLong(crc_ctx_final(self->ctx, reg));
+}
+
+
+static PyObject *Model_update(ModelObject *self, PyObject *args)
+{
+    Py_buffer view;
+    unsigned PY_LONG_LONG reg;
+
+    if (!Model_ready(self) || !PyArg_ParseTuple(args, "K" BUFFER_FORMAT, &reg, &view))
+        return NULL;
+
+    reg = Model_run(self, reg, &view);
+    PyBuffer_Release(&view);
+
+    return PyLong_FromUnsignedLongLong(reg);
+}
+
+
+static PyMethodDef Model_methods[] = {
+    {"compute", (PyCFunction) Model_compute, METH_VARARGS,
+     "compute(msg) -> checksum of a buffer"},
+    {"update", (PyCFunction) Model_update, METH_VARARGS,
+     "update(reg, msg) -> register advanced over a buffer"},
+    {NULL}
+};
+
+
+static PyTypeObject ModelType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_crc.Model",                   /* tp_name */
+    sizeof(ModelObject),            /* tp_basicsize */
+};
+
+
+#if PY_MAJOR_VERSION >= 3
+static struct PyModuleDef crcmodule = {
+    PyModuleDef_HEAD_INIT,
+    "_crc",
+    "C implementation of the crc module",
+    -1,
+    NULL
+};
+#endif
+
+
+static PyObject *moduleinit(void)
+{
+    PyObject *m;
+
+    ModelType.tp_flags = Py_TPFLAGS_DEFAULT;
+    ModelType.tp_doc = "CRC model using the C library";
+    ModelType.tp_methods = Model_methods;
+    ModelType.tp_init = (initproc) Model_init;
+    ModelType.tp_dealloc = (destructor) Model_dealloc;
+    ModelType.tp_new = PyType_GenericNew;
+
+    if (PyType_Ready(&ModelType) < 0)
+        return NULL;
+
+#if PY_MAJOR_VERSION >= 3
+    m = PyModule_Create(&crcmodule);
+#else
+    m = Py_InitModule3("_crc", NULL, "C implementation of the crc module");
+#endif
+    if (m == NULL)
+        return NULL;
+
+    Py_INCREF(&ModelType);
+    PyModule_AddObject(m, "Model", (PyObject *) &ModelType);
+
+    return m;
+}
+
+
+#if PY_MAJOR_VERSION >= 3
+PyMODINIT_FUNC PyInit__crc(void)
+{
+    return moduleinit();
+}
+#else
+PyMODINIT_FUNC init_crc(void)
+{
+    moduleinit();
+}
+#endif
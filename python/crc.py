@@ -3,10 +3,44 @@
 #
 # CRC calculation and support functions
 #
-# limitations:
-#   width must be multiple of 8 (ie. length of polynomial is on a byte boundary)
+# any width from 1 bit up is supported; widths which are not a multiple of 8
+# are run in a register of whole bytes (see alignedWidth)
 #
 
+import array
+import base64
+import binascii
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+
+from collections import OrderedDict
+
+# the C library, when the extension module has been built (see setup.py)
+try:
+    import _crc
+except ImportError:
+    _crc = None
+
+# the tables of the preset models, when they have been generated (see
+# gentables.py); tables left by an older version of the generator, which
+# wrote them as tuples, are not used
+try:
+    import crctables
+
+    if getattr(crctables, "FORMAT", 1) != 2:
+        crctables = None
+except ImportError:
+    crctables = None
+
+
+# under Python 2 a str is a byte string and iterates as characters
+PY2 = sys.version_info[0] == 2
+
+
 #
 # function to reflect the byte values in a series of bytes (could be a single byte)
 #
@@ -49,15 +83,31 @@ def reflect_bytes(S):
     return None
 
 
+#
+# widths which are not a multiple of 8 are run in a register of whole bytes:
+# MSB-first models keep their register left-aligned in it, padded with zero
+# bits below; reflected models keep it right-aligned, as the reflected
+# algorithm works for any width
+#
+def alignedWidth(width):
+    return max(8, (width + 7) // 8 * 8)
+
+
 #
 # function to calculate mask values for a table driven algorithm
 #
 def buildLookupTable(poly, width):
-    # width should be byte aligned
-    if (width < 8 or width % 8 != 0):
+    if width < 1:
         return None
 
-    wbytes = width / 8
+    # for a width which is not byte aligned, build the table of the
+    # left-aligned register: the poly is shifted up to a whole number of
+    # bytes, and so is every entry
+    if width % 8 != 0:
+        pad = alignedWidth(width) - width
+        return buildLookupTable((poly & ((1 << width) - 1)) << pad, width + pad)
+
+    wbytes = width // 8
 
     # calculate a mask to restrict the values to width bits
     wmask = 0
@@ -75,7 +125,7 @@ def buildLookupTable(poly, width):
 
     for control in range(256):
         # skip this control value if mask has already been calculated
-        if lookup[control] >= 0:
+        if lookup[control] is not None:
             # print "already defined for ", control
             continue
 
@@ -141,153 +191,1292 @@ def buildLookupTable(poly, width):
 
 def dumpLookupTable(table):
     for i in range(16):
-        for j in range(16):
-            print "%04x " %(table[i * 16 + j]),
-        print
+        print(" ".join(["%04x " % table[i * 16 + j] for j in range(16)]))
 
 
 #
-# crc calculation using the table driven algorithm
+# function to reflect the bits of an integer of the given width
 #
-def crc(msg, width, poly, init, refin, refout, xorout):
-    # width should be byte aligned
-    if (width < 8 or width % 8 != 0):
-        return None
+def reflect(x, width):
+    ref = 0
 
-    wbytes = int(width / 8)
+    for n in range(width):
+        ref = (ref << 1) + (x & 1)
+        x = x >> 1
 
-    # calculate a mask to restrict the values to width bits
-    wmask = 0
-    for n in range(wbytes):
-        wmask = (wmask << 8) + 0xff
+    return ref
 
-    # AND the poly just in case it runs over width bits
-    poly = poly & wmask
 
-    # msg could be a string or a list of bytes
-    # if it is a string convert it to a list of bytes
-    if (type(msg) is str):
-        M = []
+#
+# function to convert a lookup table into its reflected (LSB-first) variant
+# as described in section 11 of the Ross Williams guide; the reflected table
+# lets refin models consume the message bytes without reflecting them first;
+# entries are reflected over the register width, which leaves the entries of
+# a left-aligned table right-aligned
+#
+def reflectLookupTable(table, width):
+    reflookup = [None] * 256
+    width = alignedWidth(width)
+
+    for n in range(256):
+        reflookup[reflect(n, 8)] = reflect(table[n], width)
+
+    return reflookup
+
+
+#
+# function to extend a lookup table to the set of tables for the slicing-by-N
+# algorithm; tables[k][n] is the register value for the byte n followed by k
+# zero bytes, so N bytes can be consumed with N independent lookups
+#
+def sliceLookupTables(table, width, reflected, slices):
+    width = alignedWidth(width)
+    wmask = (1 << width) - 1
+    shift = width - 8
+    tables = [table]
+
+    for k in range(1, slices):
+        prev = tables[-1]
+
+        if reflected:
+            tables.append([(r >> 8) ^ table[r & 0xff] for r in prev])
+        else:
+            tables.append([((r << 8) & wmask) ^ table[r >> shift] for r in prev])
 
-        for n in range(len(msg)):
-            if refin:
-                M.append(reflect_bytes(ord(msg[n])))
+    return tables
+
+
+#
+# the tables of a preset as generated by gentables.py: one base64 string of
+# big endian entries of the aligned width, the lookup table followed by its
+# slicing tables, which is much quicker to import than the same tables as
+# tuples of integers; decoded into a tuple of tables
+#
+def thawTables(blob, width):
+    data = base64.b64decode(blob)
+    itemsize = alignedWidth(width) // 8
+
+    for typecode in "BHILQ":
+        try:
+            a = array.array(typecode)
+        except ValueError:
+            continue
+
+        if a.itemsize == itemsize:
+            if hasattr(a, "frombytes"):
+                a.frombytes(data)
             else:
-                M.append(ord(msg[n]))
+                a.fromstring(data)
+
+            if sys.byteorder == "little":
+                a.byteswap()
+
+            values = a.tolist()
+            break
+    else:
+        # no array type of the width, as for a 24 bit register
+        values = [int(binascii.hexlify(data[n:n + itemsize]), 16) for n in range(0, len(data), itemsize)]
 
-    elif (type(msg) is list):
-        # check that each element in msg is an int
-        for x in (msg):
-            if (type(x) is not int):
+    return tuple(tuple(values[n:n + 256]) for n in range(0, len(values), 256))
+
+
+#
+# lookup tables are kept in a bounded LRU cache keyed on (poly, width, reflected)
+# so that models sharing a polynomial share a table and mixed workloads do not
+# rebuild tables every time they switch model; cached tables are tuples as
+# they are shared between models; the sets of tables for the slicing-by-N
+# algorithm are cached alongside under the number of slices
+#
+# frozen maps (poly, width, reflected) to the generated tables of a preset
+# (see thawTables); they are decoded the first time they are looked up and
+# then handed out as they are, without building them or taking a place in
+# the cache
+#
+class TableCache(object):
+
+    def __init__(self, maxsize=32, frozen=None):
+        self.maxsize = maxsize
+        self.frozen = frozen or {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tables = OrderedDict()
+        self._thawed = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, poly, width, reflected, slices=1):
+        key = (poly, width, bool(reflected), slices)
+
+        tables = self._thawed.get(key[:3])
+        if tables is None and key[:3] in self.frozen:
+            # decoding twice in a race does no harm
+            tables = self._thawed[key[:3]] = thawTables(self.frozen[key[:3]], width)
+
+        if tables is not None and slices <= len(tables):
+            # slicing tables do not depend on the number of slices
+            return tables[0] if slices == 1 else tables[:slices]
+
+        with self._lock:
+            table = self._tables.pop(key, None)
+
+            if table is not None:
+                # re-insert to mark the table as most recently used
+                self.hits += 1
+                self._tables[key] = table
+                return table
+
+            self.misses += 1
+
+        if slices > 1:
+            table = self.lookup(poly, width, reflected)
+            if table is None:
                 return None
 
-        if refin:
-            M = reflect_bytes(msg)
+            table = tuple(tuple(t) for t in
+                          sliceLookupTables(table, width, reflected, slices))
+
         else:
-            M = msg
+            table = buildLookupTable(poly, width)
+            if table is None:
+                return None
 
-    # invalid type
+            if reflected:
+                table = reflectLookupTable(table, width)
+
+            table = tuple(table)
+
+        self._insert(key, table)
+
+        return table
+
+    #
+    # the C library model (_crc.Model) for a parameter set, shared by every
+    # CrcModel with those parameters; it is kept in the same LRU as the
+    # tables, under the parameter tuple and the number of slices (0 to let
+    # the library choose), so that building a CrcModel only builds a context
+    # the first time its parameters are seen
+    #
+    def native(self, params, slices=0):
+        key = ("native",) + tuple(params) + (slices,)
+
+        with self._lock:
+            model = self._tables.pop(key, None)
+
+            if model is not None:
+                self.hits += 1
+                self._tables[key] = model
+                return model
+
+            self.misses += 1
+
+        model = _crc.Model(*params, slices=slices)
+        self._insert(key, model)
+
+        return model
+
+    def _insert(self, key, value):
+        with self._lock:
+            self._tables[key] = value
+
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._tables),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+
+tableCache = TableCache(frozen=crctables.TABLES if crctables is not None else None)
+
+
+#
+# a CRC model holds the CRC parameters together with everything that can be
+# derived from them: the width mask and the lookup table; these are fetched
+# once when the model is constructed so that compute() only has to run the
+# table driven loop
+#
+# slices selects the slicing-by-N algorithm (N = 4, 8 or 16) for buffers;
+# under CPython the extra integer operations per lookup cost more than the
+# loop overhead they save, so by default (slices=None) the byte at a time
+# loop is used and slicing is left for models that ask for it; when the C
+# library is used, slices=N runs its table engine with N slices, and None
+# lets it choose the engine from the size of the message
+#
+# struct formats to unpack N message bytes in register order
+SLICE_FORMATS = {
+    (4, False):  ">I",
+    (4, True):   "<I",
+    (8, False):  ">Q",
+    (8, True):   "<Q",
+    (16, False): ">QQ",
+    (16, True):  "<QQ",
+}
+
+class CrcModel(object):
+
+    def __init__(self, width, poly, init, refin, refout, xorout, slices=None):
+        if width < 1:
+            raise ValueError("width must be at least 1, not %r" % width)
+
+        # calculate a mask to restrict the values to width bits
+        self.wmask = (1 << width) - 1
+
+        # AND the parameters just in case they run over width bits
+        self.width = width
+        self.poly = poly & self.wmask
+        self.init = init & self.wmask
+        self.refin = bool(refin)
+        self.refout = bool(refout)
+        self.xorout = xorout & self.wmask
+
+        # refin models run the reflected table over the unreflected message,
+        # so their register (and initial value) is held reflected
+        self.table = tableCache.lookup(self.poly, width, self.refin)
+
+        # the register of an MSB-first model is left-aligned in whole bytes
+        if self.refin:
+            self._pad = 0
+        else:
+            self._pad = alignedWidth(width) - width
+
+        self._regwidth = width + self._pad
+        self._regmask = (1 << self._regwidth) - 1
+
+        if self.refin:
+            self.reginit = reflect(self.init, width)
+        else:
+            self.reginit = self.init << self._pad
+
+        if slices not in (None, 1, 4, 8, 16):
+            raise ValueError("slices must be 1, 4, 8 or 16, not %r" % slices)
+
+        self.slices = slices
+        self._slicetables = {}
+
+        # operators for runs of 1, 2, 4, 8... zero bytes, built as needed
+        self._zeroops = []
+
+        # buffers are handed to the C library when it is available; it takes
+        # widths of up to 64 bits, which covers the CRC-64 models; its models
+        # are shared through the table cache
+        self._native = None
+        if _crc is not None and width <= 64:
+            self._native = tableCache.native(self.params(), slices or 0)
+
+    def params(self):
+        return (self.width, self.poly, self.init, self.refin, self.refout, self.xorout)
+
+    def __repr__(self):
+        return "CrcModel(width=%d, poly=0x%x, init=0x%x, refin=%s, refout=%s, xorout=0x%x)" % (
+            self.width, self.poly, self.init, self.refin, self.refout, self.xorout)
+
+    #
+    # advance the register over the bytes in M
+    #
+    def _update(self, reg, M):
+        if self._native is not None and type(M) is not list:
+            return self._native.update(reg, M)
+
+        slices = self.slices or 1
+
+        # lists cannot be unpacked with struct so always run byte by byte
+        if slices > 1 and type(M) is not list:
+            reg, M = self._updateSliced(reg, M, slices)
+
+        table = self.table
+
+        if self.refin:
+            for b in M:
+                reg = (reg >> 8) ^ table[(reg ^ b) & 0xff]
+
+        else:
+            shift = self._regwidth - 8
+            wmask = self._regmask
+
+            for b in M:
+                reg = ((reg << 8) & wmask) ^ table[(reg >> shift) ^ b]
+
+        return reg
+
+    #
+    # advance the register over as many whole N byte blocks of M as possible
+    # using the slicing-by-N algorithm; returns the register and the bytes
+    # which are left over
+    #
+    def _updateSliced(self, reg, M, slices):
+        tables = self._slicetables.get(slices)
+        if tables is None:
+            tables = tableCache.lookup(self.poly, self.width, self.refin, slices)
+            self._slicetables[slices] = tables
+
+        fmt = SLICE_FORMATS[(slices, self.refin)]
+        unpack = struct.unpack_from
+        width = self._regwidth
+        wmask = self._regmask
+        nbits = slices * 8
+        end = len(M) - len(M) % slices
+
+        # tables in the order the block bytes are consumed from the register
+        # value x: lowest byte first for refin models, highest byte otherwise
+        if self.refin:
+            order = list(reversed(tables))
+        else:
+            order = list(tables)
+
+        for i in range(0, end, slices):
+            words = unpack(fmt, M, i)
+            D = words[0]
+            if slices == 16:
+                if self.refin:
+                    D = D | (words[1] << 64)
+                else:
+                    D = (D << 64) | words[1]
+
+            if self.refin:
+                # the register bytes line up with the first message bytes
+                x = reg ^ D
+                reg = x >> nbits
+            else:
+                # the register is shifted up past the block, so the bits
+                # above width are the ones to be reduced by the tables
+                x = (reg << nbits) ^ (D << width)
+                reg = x & wmask
+                x = x >> width
+
+            for t in order:
+                reg = reg ^ t[x & 0xff]
+                x = x >> 8
+
+        return reg, M[end:]
+
+    #
+    # convert a register value into the checksum
+    #
+    def _final(self, reg):
+        reg = reg >> self._pad
+
+        # the register is already reflected for refin models
+        if self.refin != self.refout:
+            reg = reflect(reg, self.width)
+
+        return reg ^ self.xorout
+
+    #
+    # convert a checksum back into the register value it was made from
+    #
+    def _unfinal(self, cksum):
+        reg = cksum ^ self.xorout
+
+        if self.refin != self.refout:
+            reg = reflect(reg, self.width)
+
+        return reg << self._pad
+
+    #
+    # advance the register over nbytes zero bytes; with no message bytes
+    # coming in the register update is linear, so it is applied as a GF(2)
+    # matrix, squaring the matrix for one zero byte to get the matrices for
+    # runs of 2, 4, 8... zero bytes (as in zlib's crc32_combine)
+    #
+    def _shift(self, reg, nbytes):
+        ops = self._zeroops
+
+        if not ops:
+            ops.append([self._update(1 << i, [0]) for i in range(self._regwidth)])
+
+        k = 0
+        while nbytes:
+            if k == len(ops):
+                ops.append(gf2_matrix_square(ops[-1]))
+
+            if nbytes & 1:
+                reg = gf2_matrix_times(ops[k], reg)
+
+            nbytes = nbytes >> 1
+            k = k + 1
+
+        return reg
+
+    #
+    # the operator which advances the register over nbytes zero bytes, as a
+    # GF(2) matrix, for callers which apply the same shift many times
+    #
+    def _shiftOperator(self, nbytes):
+        return [self._shift(1 << i, nbytes) for i in range(self._regwidth)]
+
+    #
+    # calculate the checksum of the concatenated message A + B from the
+    # checksums of A and B and the length of B
+    #
+    def combine(self, crc_a, crc_b, len_b):
+        # the register after A is carried across B, where B on its own was
+        # started from the initial register; the difference is the register
+        # after A xor the initial value, shifted over len_b zero bytes
+        reg = self._shift(self._unfinal(crc_a) ^ self.reginit, len_b)
+
+        return (self._final(reg) ^ self.xorout) ^ crc_b
+
+    #
+    # checksum of a message of total_len bytes after the bytes at offset have
+    # changed from old_bytes to new_bytes, from its checksum before the change;
+    # the change to the checksum is the register for the xor of the old and
+    # new bytes, started from zero and shifted over the bytes after them, so
+    # the time taken only grows with the log of the length of the message
+    #
+    def update_range(self, old_crc, total_len, offset, old_bytes, new_bytes):
+        O = self._message(old_bytes)
+        N = self._message(new_bytes)
+        if O is None or N is None:
+            raise TypeError("bytes must be a list of byte values or a buffer")
+
+        if len(O) != len(N):
+            raise ValueError("old and new bytes differ in length")
+
+        if offset < 0 or offset + len(O) > total_len:
+            raise ValueError("%d bytes at offset %d do not fit in a message of %d bytes"
+                             % (len(O), offset, total_len))
+
+        delta = bytearray(a ^ b for a, b in zip(O, N))
+        reg = self._shift(self._update(0, delta), total_len - offset - len(O))
+
+        return old_crc ^ self._final(reg) ^ self.xorout
+
+    #
+    # the bytes to write at offset in msg, in place of the (width + 7) / 8
+    # bytes there, so that the checksum of the message becomes target; cksum
+    # is the checksum of msg as it is, which is calculated when not given
+    #
+    # a change to the message changes the checksum by the checksum of the
+    # change alone started from a zero register without xorout, so the change
+    # to the bytes at offset is the solution of a linear system over GF(2):
+    # one column for each bit of the patch, the bit run through the register
+    # and shifted over the bytes after the patch; given cksum, the time taken
+    # only grows with the log of the length of the message
+    #
+    def patch(self, msg, offset, target, cksum=None):
+        M = self._message(msg)
+        if M is None:
+            raise TypeError("message must be a list of byte values or a buffer")
+
+        nbytes = (self.width + 7) // 8
+        if offset < 0 or offset + nbytes > len(M):
+            raise ValueError("%d bytes at offset %d do not fit in a message of %d bytes"
+                             % (nbytes, offset, len(M)))
+
+        if cksum is None:
+            cksum = self.compute(msg)
+
+        trailing = len(M) - offset - nbytes
+        cols = []
+
+        for i in range(nbytes):
+            for b in range(8):
+                unit = [0] * nbytes
+                unit[i] = 1 << b
+                reg = self._shift(self._update(0, unit), trailing)
+                cols.append(self._final(reg) ^ self.xorout)
+
+        # one equation per bit of the checksum
+        nvars = 8 * nbytes
+        diff = target ^ cksum
+        rows = []
+
+        for k in range(self.width):
+            row = (diff >> k) & 1
+            row = row << nvars
+            for j in range(nvars):
+                row = row | (((cols[j] >> k) & 1) << j)
+
+            rows.append(row)
+
+        solved = gf2_solve(rows, nvars)
+        if solved is None:
+            raise ValueError("no bytes at offset %d give the checksum 0x%x" % (offset, target))
+
+        delta = solved[0]
+        old = bytearray(M[offset:offset + nbytes])
+
+        return bytearray(old[i] ^ ((delta >> (8 * i)) & 0xff) for i in range(nbytes))
+
+    #
+    # return msg in a form that iterates as byte values, or None if msg is
+    # invalid; lists, bytes and bytearrays are returned as they are and any
+    # other object supporting the buffer protocol (memoryview, mmap.mmap,
+    # array.array etc.) is viewed as unsigned bytes, so the message is never
+    # copied or checked element by element
+    #
+    def _message(self, msg):
+        if type(msg) is list or type(msg) is bytearray:
+            return msg
+
+        if PY2:
+            # byte strings and old-style buffers have to be copied to get
+            # integer byte values
+            try:
+                return bytearray(buffer(msg))
+            except TypeError:
+                pass
+
+            try:
+                return bytearray(memoryview(msg).tobytes())
+            except TypeError:
+                return None
+
+        if type(msg) is bytes:
+            return msg
+
+        # text is converted one character per byte
+        if type(msg) is str:
+            return msg.encode("latin-1")
+
+        try:
+            M = memoryview(msg)
+        except TypeError:
+            return None
+
+        if M.format != "B" or M.ndim != 1:
+            M = M.cast("B")
+
+        return M
+
+    def compute(self, msg):
+        M = self._message(msg)
+        if M is None:
+            return None
+
+        return self._final(self._update(self.reginit, M))
+
+
+#
+# incremental crc calculation in the style of hashlib: the register is
+# carried between calls to update(), and refout/xorout are only applied
+# when the checksum is read with digest(), hexdigest() or checksum()
+#
+class CrcHash(object):
+
+    def __init__(self, model, msg=None):
+        self.model = model
+        self.digest_size = (model.width + 7) // 8
+        self._reg = model.reginit
+
+        if msg is not None:
+            self.update(msg)
+
+    def update(self, msg):
+        M = self.model._message(msg)
+        if M is None:
+            raise TypeError("cannot calculate a crc over %s" % type(msg).__name__)
+
+        self._reg = self.model._update(self._reg, M)
+
+    def checksum(self):
+        return self.model._final(self._reg)
+
+    def digest(self):
+        # checksum as big endian bytes, most significant byte first
+        cksum = self.checksum()
+        D = bytearray(self.digest_size)
+
+        for n in range(self.digest_size - 1, -1, -1):
+            D[n] = cksum & 0xff
+            cksum = cksum >> 8
+
+        return bytes(D)
+
+    def hexdigest(self):
+        return "%0*x" % (self.digest_size * 2, self.checksum())
+
+    def copy(self):
+        other = CrcHash(self.model)
+        other._reg = self._reg
+        return other
+
+
+def new(model, msg=None):
+    return CrcHash(model, msg)
+
+
+#
+# GF(2) matrix operations; a matrix is a list of its columns, the column at
+# position i being the image of the vector with only bit i set
+#
+def gf2_matrix_times(mat, vec):
+    prod = 0
+
+    for col in mat:
+        if vec == 0:
+            break
+
+        if vec & 1:
+            prod = prod ^ col
+
+        vec = vec >> 1
+
+    return prod
+
+
+def gf2_matrix_square(mat):
+    return [gf2_matrix_times(mat, col) for col in mat]
+
+
+#
+# solve a system of linear equations over GF(2): each row has the
+# coefficients of the nvars variables in its low bits and the right hand
+# side in bit nvars; returns a solution with the free variables clear and a
+# basis of the solutions of the homogeneous system, or None if there is no
+# solution
+#
+def gf2_solve(rows, nvars):
+    vmask = (1 << nvars) - 1
+    pivots = []
+
+    for row in rows:
+        for col, prow in pivots:
+            if (row >> col) & 1:
+                row = row ^ prow
+
+        coeffs = row & vmask
+        if coeffs == 0:
+            if (row >> nvars) & 1:
+                return None
+            continue
+
+        pivots.append(((coeffs & -coeffs).bit_length() - 1, row))
+
+    def substitute(values, rhs):
+        # later pivots do not hold the columns of earlier ones
+        for col, prow in reversed(pivots):
+            bits = prow & vmask & ~(1 << col) & values
+            bit = ((prow >> nvars) & 1 if rhs else 0) ^ (bin(bits).count("1") & 1)
+            values = values | (bit << col)
+
+        return values
+
+    pivotCols = set(col for col, prow in pivots)
+    particular = substitute(0, True)
+    basis = [substitute(1 << f, False) for f in range(nvars) if f not in pivotCols]
+
+    return particular, basis
+
+
+#
+# checksum of A + B from the checksums of A and B, and the length of B
+#
+def crc_combine(model, crc_a, crc_b, len_b):
+    return model.combine(crc_a, crc_b, len_b)
+
+
+#
+# checksum of a message after the bytes at offset change from old_bytes to
+# new_bytes, from its checksum before the change and its length
+#
+def crc_update_range(model, old_crc, total_len, offset, old_bytes, new_bytes):
+    return model.update_range(old_crc, total_len, offset, old_bytes, new_bytes)
+
+
+#
+# bytes to write at offset in msg to give it the checksum target
+#
+def crc_patch(model, msg, offset, target, cksum=None):
+    return model.patch(msg, offset, target, cksum)
+
+
+#
+# checksum of a message held in fragments, given as any iterable of buffers
+# (or lists of byte values); the register is carried from one fragment to the
+# next, so the fragments are read in place rather than joined together
+#
+def crc_iov(model, buffers):
+    reg = model.reginit
+
+    for buf in buffers:
+        M = model._message(buf)
+        if M is None:
+            raise TypeError("cannot calculate a crc over %s" % type(buf).__name__)
+
+        reg = model._update(reg, M)
+
+    return model._final(reg)
+
+
+#
+# crc_multi() runs every model over a block of this size before moving on,
+# so that each block is read from memory once and then stays in the cache
+#
+MULTI_BLOCK = 1 << 16
+
+
+#
+# checksums of one message under several models, in one pass over it
+#
+def crc_multi(models, msg):
+    if not models:
+        return []
+
+    M = models[0]._message(msg)
+    if M is None:
+        raise TypeError("cannot calculate a crc over %s" % type(msg).__name__)
+
+    # blocks of buffers are viewed in place; lists and Python 2 byte strings are copied
+    if not PY2 and type(M) is not list:
+        M = memoryview(M)
+
+    regs = [model.reginit for model in models]
+
+    for offset in range(0, len(M), MULTI_BLOCK):
+        block = M[offset:offset + MULTI_BLOCK]
+
+        for k in range(len(models)):
+            regs[k] = models[k]._update(regs[k], block)
+
+    return [model._final(reg) for model, reg in zip(models, regs)]
+
+
+#
+# crc_parallel() does not split inputs into chunks smaller than this
+#
+PARALLEL_MIN_CHUNK = 1 << 20
+
+
+#
+# checksum of one chunk for crc_parallel(); this runs in a worker process,
+# so the model is passed as its parameters and rebuilt in the worker, and a
+# chunk of a file is memory-mapped there rather than sent through a pipe
+#
+def _crcChunk(args):
+    params, path, data, offset, length = args
+    model = CrcModel(*params)
+
+    if path is None:
+        return model.compute(data)
+
+    f = open(path, "rb")
+    try:
+        m = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=offset)
+        try:
+            return model.compute(m)
+        finally:
+            m.close()
+    finally:
+        f.close()
+
+
+#
+# checksum of a large file or buffer using a pool of worker processes: the
+# input is split into chunks which are checksummed concurrently, and the
+# chunk checksums are joined with crc_combine(); source is either the path
+# of a file or a buffer
+#
+def crc_parallel(source, model, workers=None):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    # under Python 2 a str is taken as a path, so buffers should be passed
+    # as bytearrays
+    if isinstance(source, str) or (PY2 and isinstance(source, unicode)):
+        path = source
+        size = os.path.getsize(path)
     else:
-        return None
+        path = None
+        if PY2:
+            view = buffer(source)
+        else:
+            view = memoryview(source).cast("B")
+        size = len(view)
+
+    # chunks of a file must start on a multiple of the mmap granularity
+    chunk = max((size + workers - 1) // max(workers, 1), PARALLEL_MIN_CHUNK)
+    chunk = chunk + (-chunk) % mmap.ALLOCATIONGRANULARITY
+
+    tasks = []
+    for offset in range(0, size, chunk):
+        length = min(chunk, size - offset)
+
+        if path is None:
+            # buffers are copied to the workers chunk by chunk
+            data = bytes(view[offset:offset + length])
+            tasks.append((model.params(), None, data, offset, length))
+        else:
+            tasks.append((model.params(), path, None, offset, length))
+
+    if len(tasks) == 0:
+        return model.compute(bytearray())
+
+    if len(tasks) == 1 or workers < 2:
+        cksums = [_crcChunk(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        try:
+            cksums = pool.map(_crcChunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
 
-    # generate the lookup table
-    table = buildLookupTable(poly, width)
-    if table is None:
+    cksum = cksums[0]
+    for n in range(1, len(tasks)):
+        cksum = model.combine(cksum, cksums[n], tasks[n][4])
+
+    return cksum
+
+
+#
+# crc calculation using the table driven algorithm
+#
+def crc(msg, width, poly, init, refin, refout, xorout):
+    try:
+        model = _cachedModel((width, poly, init, bool(refin), bool(refout), xorout))
+    except ValueError:
         return None
-    # dumpLookupTable(table)
 
-    reg = init
-    mlen = len(M)
+    return model.compute(msg)
 
 
-    for n in range(mlen):
-        # print "%2d %08x" %(n, reg)
-        hireg = reg >> (width - 8)
+#
+# models built by crc(), kept in a small LRU keyed on their parameters so
+# that repeated calls with the same parameters do not build a model each time
+#
+CRC_MODELS = 32
 
-        reg = (reg << 8) & wmask
-        index = hireg ^ M[0]
-        mask = table[index]
+_crcModels = OrderedDict()
+_crcLock = threading.Lock()
 
-        M.pop(0)
-        reg = reg ^ mask
 
-    if (refout):
-        # need to decompose reg into bytes...
-        regbytes = []
-        for n in range(wbytes):
-            regbytes.append(reg & 0xff)
-            reg = (reg >> 8)
+def _cachedModel(params):
+    with _crcLock:
+        model = _crcModels.pop(params, None)
+        if model is None:
+            model = CrcModel(*params)
 
-        # ... reflect...
-        refbytes = reflect_bytes(regbytes)
+        _crcModels[params] = model
 
-        # ... and then reconstruct
-        reg = 0
-        for n in range(wbytes):
-            reg = (reg << 8) + refbytes[n]
+        while len(_crcModels) > CRC_MODELS:
+            _crcModels.popitem(last=False)
 
-    reg = reg ^ xorout
+    return model
 
-    return reg
+
+#
+# function to reflect each value in a numpy array over width bits, one byte
+# at a time using a reflected byte table
+#
+def _reflectArray(values, width, numpy):
+    nbytes = (width + 7) // 8
+    revbyte = numpy.array([reflect(n, 8) for n in range(256)], dtype=values.dtype)
+    ref = numpy.zeros_like(values)
+
+    for n in range(nbytes):
+        ref = (ref << 8) | revbyte[(values >> (8 * n)) & 0xff]
+
+    return ref >> (8 * nbytes - width)
+
+
+#
+# crc calculation over a batch of records held in an (N, L) numpy array of
+# uint8, one record per row; all N registers are advanced together one
+# column at a time with a vectorised table lookup, and an N-vector of
+# checksums is returned; for ragged records lengths gives the number of
+# bytes used from each row, and registers stop advancing past the end of
+# their record
+#
+def crc_batch(records, model, lengths=None):
+    import numpy
+
+    R = numpy.asarray(records, dtype=numpy.uint8)
+    if R.ndim != 2:
+        raise ValueError("records must be a two dimensional array")
+
+    nrec, ncol = R.shape
+
+    if model._regwidth > 64:
+        raise ValueError("crc_batch handles models of up to 64 bits")
+
+    if model._regwidth > 32:
+        dtype = numpy.uint64
+    else:
+        dtype = numpy.uint32
+
+    if lengths is not None:
+        lengths = numpy.asarray(lengths)
+        if lengths.shape != (nrec,):
+            raise ValueError("lengths must have one entry per record")
+
+        if nrec > 0 and (lengths.min() < 0 or lengths.max() > ncol):
+            raise ValueError("lengths must be between 0 and %d" % ncol)
+
+        if nrec > 0:
+            ncol = int(lengths.max())
+
+    table = numpy.array(model.table, dtype=dtype)
+    wmask = dtype(model._regmask)
+    shift = model._regwidth - 8
+    regs = numpy.full(nrec, model.reginit, dtype=dtype)
+
+    for n in range(ncol):
+        column = R[:, n].astype(dtype)
+
+        if model.refin:
+            advanced = (regs >> 8) ^ table[(regs ^ column) & 0xff]
+        else:
+            advanced = ((regs << 8) & wmask) ^ table[(regs >> shift) ^ column]
+
+        if lengths is None:
+            regs = advanced
+        else:
+            regs = numpy.where(lengths > n, advanced, regs)
+
+    # as CrcModel._final(), for every register at once
+    regs = regs >> dtype(model._pad)
+
+    if model.refin != model.refout:
+        regs = _reflectArray(regs, model.width, numpy)
+
+    return regs ^ dtype(model.xorout)
+
+
+#
+# models for the common crc algorithms, built once when the module is loaded
+#
+CRC1W        = CrcModel(8, 0x31, 0x00, True, True, 0x00)
+CRC16_ARC    = CrcModel(16, 0x8005, 0x0000, True, True, 0x0000)
+CRC16_CCITT  = CrcModel(16, 0x1021, 0xffff, False, False, 0x0000)
+CRC16_XMODEM = CrcModel(16, 0x8408, 0x0000, True, True, 0x0000)
+CRC32        = CrcModel(32, 0x04C11DB7, 0xffffffff, True, True, 0xffffffff)
+CRC32C       = CrcModel(32, 0x1EDC6F41, 0xffffffff, False, False, 0x00000000)
+CRC64_ECMA   = CrcModel(64, 0x42F0E1EBA9EA3693, 0x0000000000000000, False, False, 0x0000000000000000)
+CRC64_XZ     = CrcModel(64, 0x42F0E1EBA9EA3693, 0xffffffffffffffff, True, True, 0xffffffffffffffff)
+CRC64_GO_ISO = CrcModel(64, 0x000000000000001B, 0xffffffffffffffff, True, True, 0xffffffffffffffff)
 
 
 def crc1w(msg):
     # CRC 1-Wire
-    poly     = 0x31
-    width    = 8
-    init     = 0x00
-    refin    = True
-    refout   = True
-    xorout   = 0x00
-    return crc(msg, width, poly, init, refin, refout, xorout)
+    return CRC1W.compute(msg)
 
 def crc16_arc(msg):
     # CRC16/ARC
-    poly     = 0x8005
-    width    = 16
-    init     = 0x0000
-    refin    = True
-    refout   = True
-    xorout   = 0x0000
-    return crc(msg, width, poly, init, refin, refout, xorout)
+    return CRC16_ARC.compute(msg)
 
 def crc16_ccitt(msg):
     # CRC16/CCITT
-    poly     = 0x1021
-    width    = 16
-    init     = 0xffff
-    refin    = False
-    refout   = False
-    xorout   = 0x0000
-    return crc(msg, width, poly, init, refin, refout, xorout)
+    return CRC16_CCITT.compute(msg)
 
 def crc16_xmodem(msg):
     # CRC16/XMODEM
-    poly     = 0x8408
-    width    = 16
-    init     = 0x0000
-    refin    = True
-    refout   = True
-    xorout   = 0x0000
-    return crc(msg, width, poly, init, refin, refout, xorout)
+    return CRC16_XMODEM.compute(msg)
 
 def crc32(msg):
     # CRC32
-    poly     = 0x04C11DB7
-    width    = 32
-    init     = 0xffffffff
-    refin    = True
-    refout   = True
-    xorout   = 0xffffffff
-    return crc(msg, width, poly, init, refin, refout, xorout)
+    return CRC32.compute(msg)
 
 def crc32c(msg):
     # CRC32c
-    poly     = 0x1EDC6F41
-    width    = 32
-    init     = 0xffffffff
-    refin    = False
-    refout   = False
-    xorout   = 0x00000000
-    return crc(msg, width, poly, init, refin, refout, xorout)
+    return CRC32C.compute(msg)
+
+def crc64_ecma(msg):
+    # CRC-64/ECMA-182
+    return CRC64_ECMA.compute(msg)
+
+def crc64_xz(msg):
+    # CRC-64/XZ
+    return CRC64_XZ.compute(msg)
+
+def crc64_go_iso(msg):
+    # CRC-64/GO-ISO
+    return CRC64_GO_ISO.compute(msg)
+
+
+#
+# models which can be named on the command line
+#
+PRESETS = {
+    "crc1w":        CRC1W,
+    "crc16_arc":    CRC16_ARC,
+    "crc16_ccitt":  CRC16_CCITT,
+    "crc16_xmodem": CRC16_XMODEM,
+    "crc32":        CRC32,
+    "crc32c":       CRC32C,
+    "crc64_ecma":   CRC64_ECMA,
+    "crc64_xz":     CRC64_XZ,
+    "crc64_go_iso": CRC64_GO_ISO,
+}
+
+
+#
+# catalogue of parametrised CRC models, after Greg Cook's "Catalogue of
+# parametrised CRC algorithms" (reveng), as
+# (name, width, poly, init, refin, refout, xorout, check, aliases); check is
+# the checksum of the ASCII string "123456789"
+#
+# models are named with crc_model(), and are only built, together with their
+# tables, the first time they are asked for
+#
+CATALOGUE = [
+    # name                        width  poly                     init                     refin  refout xorout                   check                    aliases
+    ("CRC-3/GSM",                  3,  0x3,                     0x0,                     False, False, 0x7,                     0x4,                     ()),
+    ("CRC-3/ROHC",                 3,  0x3,                     0x7,                     True,  True,  0x0,                     0x6,                     ()),
+    ("CRC-4/G-704",                4,  0x3,                     0x0,                     True,  True,  0x0,                     0x7,                     ("CRC-4/ITU",)),
+    ("CRC-4/INTERLAKEN",           4,  0x3,                     0xf,                     False, False, 0xf,                     0xb,                     ()),
+    ("CRC-5/EPC-C1G2",             5,  0x09,                    0x09,                    False, False, 0x00,                    0x00,                    ("CRC-5/EPC",)),
+    ("CRC-5/G-704",                5,  0x15,                    0x00,                    True,  True,  0x00,                    0x07,                    ("CRC-5/ITU",)),
+    ("CRC-5/USB",                  5,  0x05,                    0x1f,                    True,  True,  0x1f,                    0x19,                    ()),
+    ("CRC-6/CDMA2000-A",           6,  0x27,                    0x3f,                    False, False, 0x00,                    0x0d,                    ()),
+    ("CRC-6/CDMA2000-B",           6,  0x07,                    0x3f,                    False, False, 0x00,                    0x3b,                    ()),
+    ("CRC-6/DARC",                 6,  0x19,                    0x00,                    True,  True,  0x00,                    0x26,                    ()),
+    ("CRC-6/G-704",                6,  0x03,                    0x00,                    True,  True,  0x00,                    0x06,                    ("CRC-6/ITU",)),
+    ("CRC-6/GSM",                  6,  0x2f,                    0x00,                    False, False, 0x3f,                    0x13,                    ()),
+    ("CRC-7/MMC",                  7,  0x09,                    0x00,                    False, False, 0x00,                    0x75,                    ("CRC-7",)),
+    ("CRC-7/ROHC",                 7,  0x4f,                    0x7f,                    True,  True,  0x00,                    0x53,                    ()),
+    ("CRC-7/UMTS",                 7,  0x45,                    0x00,                    False, False, 0x00,                    0x61,                    ()),
+    ("CRC-8/AUTOSAR",              8,  0x2f,                    0xff,                    False, False, 0xff,                    0xdf,                    ()),
+    ("CRC-8/BLUETOOTH",            8,  0xa7,                    0x00,                    True,  True,  0x00,                    0x26,                    ()),
+    ("CRC-8/CDMA2000",             8,  0x9b,                    0xff,                    False, False, 0x00,                    0xda,                    ()),
+    ("CRC-8/DARC",                 8,  0x39,                    0x00,                    True,  True,  0x00,                    0x15,                    ()),
+    ("CRC-8/DVB-S2",               8,  0xd5,                    0x00,                    False, False, 0x00,                    0xbc,                    ()),
+    ("CRC-8/GSM-A",                8,  0x1d,                    0x00,                    False, False, 0x00,                    0x37,                    ()),
+    ("CRC-8/GSM-B",                8,  0x49,                    0x00,                    False, False, 0xff,                    0x94,                    ()),
+    ("CRC-8/HITAG",                8,  0x1d,                    0xff,                    False, False, 0x00,                    0xb4,                    ()),
+    ("CRC-8/I-432-1",              8,  0x07,                    0x00,                    False, False, 0x55,                    0xa1,                    ("CRC-8/ITU",)),
+    ("CRC-8/I-CODE",               8,  0x1d,                    0xfd,                    False, False, 0x00,                    0x7e,                    ()),
+    ("CRC-8/LTE",                  8,  0x9b,                    0x00,                    False, False, 0x00,                    0xea,                    ()),
+    ("CRC-8/MAXIM-DOW",            8,  0x31,                    0x00,                    True,  True,  0x00,                    0xa1,                    ("CRC-8/MAXIM", "DOW-CRC")),
+    ("CRC-8/MIFARE-MAD",           8,  0x1d,                    0xc7,                    False, False, 0x00,                    0x99,                    ()),
+    ("CRC-8/NRSC-5",               8,  0x31,                    0xff,                    False, False, 0x00,                    0xf7,                    ()),
+    ("CRC-8/OPENSAFETY",           8,  0x2f,                    0x00,                    False, False, 0x00,                    0x3e,                    ()),
+    ("CRC-8/ROHC",                 8,  0x07,                    0xff,                    True,  True,  0x00,                    0xd0,                    ()),
+    ("CRC-8/SAE-J1850",            8,  0x1d,                    0xff,                    False, False, 0xff,                    0x4b,                    ()),
+    ("CRC-8/SMBUS",                8,  0x07,                    0x00,                    False, False, 0x00,                    0xf4,                    ("CRC-8",)),
+    ("CRC-8/TECH-3250",            8,  0x1d,                    0xff,                    True,  True,  0x00,                    0x97,                    ("CRC-8/AES", "CRC-8/EBU")),
+    ("CRC-8/WCDMA",                8,  0x9b,                    0x00,                    True,  True,  0x00,                    0x25,                    ()),
+    ("CRC-10/ATM",                 10, 0x233,                   0x000,                   False, False, 0x000,                   0x199,                   ("CRC-10", "CRC-10/I-610")),
+    ("CRC-10/CDMA2000",            10, 0x3d9,                   0x3ff,                   False, False, 0x000,                   0x233,                   ()),
+    ("CRC-10/GSM",                 10, 0x175,                   0x000,                   False, False, 0x3ff,                   0x12a,                   ()),
+    ("CRC-11/FLEXRAY",             11, 0x385,                   0x01a,                   False, False, 0x000,                   0x5a3,                   ("CRC-11",)),
+    ("CRC-11/UMTS",                11, 0x307,                   0x000,                   False, False, 0x000,                   0x061,                   ()),
+    ("CRC-12/CDMA2000",            12, 0xf13,                   0xfff,                   False, False, 0x000,                   0xd4d,                   ()),
+    ("CRC-12/DECT",                12, 0x80f,                   0x000,                   False, False, 0x000,                   0xf5b,                   ("X-CRC-12",)),
+    ("CRC-12/GSM",                 12, 0xd31,                   0x000,                   False, False, 0xfff,                   0xb34,                   ()),
+    ("CRC-12/UMTS",                12, 0x80f,                   0x000,                   False, True,  0x000,                   0xdaf,                   ("CRC-12/3GPP",)),
+    ("CRC-13/BBC",                 13, 0x1cf5,                  0x0000,                  False, False, 0x0000,                  0x04fa,                  ()),
+    ("CRC-14/DARC",                14, 0x0805,                  0x0000,                  True,  True,  0x0000,                  0x082d,                  ()),
+    ("CRC-14/GSM",                 14, 0x202d,                  0x0000,                  False, False, 0x3fff,                  0x30ae,                  ()),
+    ("CRC-15/CAN",                 15, 0x4599,                  0x0000,                  False, False, 0x0000,                  0x059e,                  ("CRC-15",)),
+    ("CRC-15/MPT1327",             15, 0x6815,                  0x0000,                  False, False, 0x0001,                  0x2566,                  ()),
+    ("CRC-16/ARC",                 16, 0x8005,                  0x0000,                  True,  True,  0x0000,                  0xbb3d,                  ("ARC", "CRC-16", "CRC-16/LHA", "CRC-IBM")),
+    ("CRC-16/CDMA2000",            16, 0xc867,                  0xffff,                  False, False, 0x0000,                  0x4c06,                  ()),
+    ("CRC-16/CMS",                 16, 0x8005,                  0xffff,                  False, False, 0x0000,                  0xaee7,                  ()),
+    ("CRC-16/DDS-110",             16, 0x8005,                  0x800d,                  False, False, 0x0000,                  0x9ecf,                  ()),
+    ("CRC-16/DECT-R",              16, 0x0589,                  0x0000,                  False, False, 0x0001,                  0x007e,                  ("R-CRC-16",)),
+    ("CRC-16/DECT-X",              16, 0x0589,                  0x0000,                  False, False, 0x0000,                  0x007f,                  ("X-CRC-16",)),
+    ("CRC-16/DNP",                 16, 0x3d65,                  0x0000,                  True,  True,  0xffff,                  0xea82,                  ()),
+    ("CRC-16/EN-13757",            16, 0x3d65,                  0x0000,                  False, False, 0xffff,                  0xc2b7,                  ()),
+    ("CRC-16/GENIBUS",             16, 0x1021,                  0xffff,                  False, False, 0xffff,                  0xd64e,                  ("CRC-16/DARC", "CRC-16/EPC", "CRC-16/EPC-C1G2", "CRC-16/I-CODE")),
+    ("CRC-16/GSM",                 16, 0x1021,                  0x0000,                  False, False, 0xffff,                  0xce3c,                  ()),
+    ("CRC-16/IBM-3740",            16, 0x1021,                  0xffff,                  False, False, 0x0000,                  0x29b1,                  ("CRC-16/AUTOSAR", "CRC-16/CCITT-FALSE")),
+    ("CRC-16/IBM-SDLC",            16, 0x1021,                  0xffff,                  True,  True,  0xffff,                  0x906e,                  ("CRC-16/ISO-HDLC", "CRC-16/ISO-IEC-14443-3-B", "CRC-16/X-25", "CRC-B", "X-25")),
+    ("CRC-16/ISO-IEC-14443-3-A",   16, 0x1021,                  0xc6c6,                  True,  True,  0x0000,                  0xbf05,                  ("CRC-A",)),
+    ("CRC-16/KERMIT",              16, 0x1021,                  0x0000,                  True,  True,  0x0000,                  0x2189,                  ("CRC-16/BLUETOOTH", "CRC-16/CCITT", "CRC-16/CCITT-TRUE", "CRC-16/V-41-LSB", "CRC-CCITT", "KERMIT")),
+    ("CRC-16/LJ1200",              16, 0x6f63,                  0x0000,                  False, False, 0x0000,                  0xbdf4,                  ()),
+    ("CRC-16/M17",                 16, 0x5935,                  0xffff,                  False, False, 0x0000,                  0x772b,                  ()),
+    ("CRC-16/MAXIM-DOW",           16, 0x8005,                  0x0000,                  True,  True,  0xffff,                  0x44c2,                  ("CRC-16/MAXIM",)),
+    ("CRC-16/MCRF4XX",             16, 0x1021,                  0xffff,                  True,  True,  0x0000,                  0x6f91,                  ()),
+    ("CRC-16/MODBUS",              16, 0x8005,                  0xffff,                  True,  True,  0x0000,                  0x4b37,                  ("MODBUS",)),
+    ("CRC-16/NRSC-5",              16, 0x080b,                  0xffff,                  True,  True,  0x0000,                  0xa066,                  ()),
+    ("CRC-16/OPENSAFETY-A",        16, 0x5935,                  0x0000,                  False, False, 0x0000,                  0x5d38,                  ()),
+    ("CRC-16/OPENSAFETY-B",        16, 0x755b,                  0x0000,                  False, False, 0x0000,                  0x20fe,                  ()),
+    ("CRC-16/PROFIBUS",            16, 0x1dcf,                  0xffff,                  False, False, 0xffff,                  0xa819,                  ("CRC-16/IEC-61158-2",)),
+    ("CRC-16/RIELLO",              16, 0x1021,                  0xb2aa,                  True,  True,  0x0000,                  0x63d0,                  ()),
+    ("CRC-16/SPI-FUJITSU",         16, 0x1021,                  0x1d0f,                  False, False, 0x0000,                  0xe5cc,                  ("CRC-16/AUG-CCITT",)),
+    ("CRC-16/T10-DIF",             16, 0x8bb7,                  0x0000,                  False, False, 0x0000,                  0xd0db,                  ()),
+    ("CRC-16/TELEDISK",            16, 0xa097,                  0x0000,                  False, False, 0x0000,                  0x0fb3,                  ()),
+    ("CRC-16/TMS37157",            16, 0x1021,                  0x89ec,                  True,  True,  0x0000,                  0x26b1,                  ()),
+    ("CRC-16/UMTS",                16, 0x8005,                  0x0000,                  False, False, 0x0000,                  0xfee8,                  ("CRC-16/BUYPASS", "CRC-16/VERIFONE")),
+    ("CRC-16/USB",                 16, 0x8005,                  0xffff,                  True,  True,  0xffff,                  0xb4c8,                  ()),
+    ("CRC-16/XMODEM",              16, 0x1021,                  0x0000,                  False, False, 0x0000,                  0x31c3,                  ("CRC-16/ACORN", "CRC-16/LTE", "CRC-16/V-41-MSB", "XMODEM", "ZMODEM")),
+    ("CRC-17/CAN-FD",              17, 0x1685b,                 0x00000,                 False, False, 0x00000,                 0x04f03,                 ()),
+    ("CRC-21/CAN-FD",              21, 0x102899,                0x000000,                False, False, 0x000000,                0x0ed841,                ()),
+    ("CRC-24/BLE",                 24, 0x00065b,                0x555555,                True,  True,  0x000000,                0xc25a56,                ()),
+    ("CRC-24/FLEXRAY-A",           24, 0x5d6dcb,                0xfedcba,                False, False, 0x000000,                0x7979bd,                ()),
+    ("CRC-24/FLEXRAY-B",           24, 0x5d6dcb,                0xabcdef,                False, False, 0x000000,                0x1f23b8,                ()),
+    ("CRC-24/INTERLAKEN",          24, 0x328b63,                0xffffff,                False, False, 0xffffff,                0xb4f3e6,                ()),
+    ("CRC-24/LTE-A",               24, 0x864cfb,                0x000000,                False, False, 0x000000,                0xcde703,                ()),
+    ("CRC-24/LTE-B",               24, 0x800063,                0x000000,                False, False, 0x000000,                0x23ef52,                ()),
+    ("CRC-24/OPENPGP",             24, 0x864cfb,                0xb704ce,                False, False, 0x000000,                0x21cf02,                ("CRC-24",)),
+    ("CRC-24/OS-9",                24, 0x800063,                0xffffff,                False, False, 0xffffff,                0x200fa5,                ()),
+    ("CRC-30/CDMA",                30, 0x2030b9c7,              0x3fffffff,              False, False, 0x3fffffff,              0x04c34abf,              ()),
+    ("CRC-31/PHILIPS",             31, 0x04c11db7,              0x7fffffff,              False, False, 0x7fffffff,              0x0ce9e46c,              ()),
+    ("CRC-32/AIXM",                32, 0x814141ab,              0x00000000,              False, False, 0x00000000,              0x3010bf7f,              ("CRC-32Q",)),
+    ("CRC-32/AUTOSAR",             32, 0xf4acfb13,              0xffffffff,              True,  True,  0xffffffff,              0x1697d06a,              ()),
+    ("CRC-32/BASE91-D",            32, 0xa833982b,              0xffffffff,              True,  True,  0xffffffff,              0x87315576,              ("CRC-32D",)),
+    ("CRC-32/BZIP2",               32, 0x04c11db7,              0xffffffff,              False, False, 0xffffffff,              0xfc891918,              ("CRC-32/AAL5", "CRC-32/DECT-B", "B-CRC-32")),
+    ("CRC-32/CD-ROM-EDC",          32, 0x8001801b,              0x00000000,              True,  True,  0x00000000,              0x6ec2edc4,              ()),
+    ("CRC-32/CKSUM",               32, 0x04c11db7,              0x00000000,              False, False, 0xffffffff,              0x765e7680,              ("CKSUM", "CRC-32/POSIX")),
+    ("CRC-32/ISCSI",               32, 0x1edc6f41,              0xffffffff,              True,  True,  0xffffffff,              0xe3069283,              ("CRC-32/BASE91-C", "CRC-32/CASTAGNOLI", "CRC-32/INTERLAKEN", "CRC-32C", "CRC-32/NVME")),
+    ("CRC-32/ISO-HDLC",            32, 0x04c11db7,              0xffffffff,              True,  True,  0xffffffff,              0xcbf43926,              ("CRC-32", "CRC-32/ADCCP", "CRC-32/V-42", "CRC-32/XZ", "PKZIP")),
+    ("CRC-32/JAMCRC",              32, 0x04c11db7,              0xffffffff,              True,  True,  0x00000000,              0x340bc6d9,              ("JAMCRC",)),
+    ("CRC-32/MEF",                 32, 0x741b8cd7,              0xffffffff,              True,  True,  0x00000000,              0xd2c22f51,              ()),
+    ("CRC-32/MPEG-2",              32, 0x04c11db7,              0xffffffff,              False, False, 0x00000000,              0x0376e6e7,              ()),
+    ("CRC-32/XFER",                32, 0x000000af,              0x00000000,              False, False, 0x00000000,              0xbd0be338,              ("XFER",)),
+    ("CRC-40/GSM",                 40, 0x0004820009,            0x0000000000,            False, False, 0xffffffffff,            0xd4164fc646,            ()),
+    ("CRC-64/ECMA-182",            64, 0x42f0e1eba9ea3693,      0x0000000000000000,      False, False, 0x0000000000000000,      0x6c40df5f0b497347,      ("CRC-64",)),
+    ("CRC-64/GO-ISO",              64, 0x000000000000001b,      0xffffffffffffffff,      True,  True,  0xffffffffffffffff,      0xb90956c775a41001,      ()),
+    ("CRC-64/MS",                  64, 0x259c84cba6426349,      0xffffffffffffffff,      True,  True,  0x0000000000000000,      0x75d4b74f024eceea,      ()),
+    ("CRC-64/NVME",                64, 0xad93d23594c93659,      0xffffffffffffffff,      True,  True,  0xffffffffffffffff,      0xae8b14860a799888,      ()),
+    ("CRC-64/REDIS",               64, 0xad93d23594c935a9,      0x0000000000000000,      True,  True,  0x0000000000000000,      0xe9c6d914c4b8d9ca,      ()),
+    ("CRC-64/WE",                  64, 0x42f0e1eba9ea3693,      0xffffffffffffffff,      False, False, 0xffffffffffffffff,      0x62ec59e3f1a4f00a,      ()),
+    ("CRC-64/XZ",                  64, 0x42f0e1eba9ea3693,      0xffffffffffffffff,      True,  True,  0xffffffffffffffff,      0x995dc9bbdf1939fa,      ("CRC-64/GO-ECMA",)),
+    ("CRC-82/DARC",                82, 0x0308c0111011401440411, 0x000000000000000000000, True,  True,  0x000000000000000000000, 0x09ea83f625023801fd612, ()),
+]
+
+# catalogue entries by name and alias in upper case, made on the first lookup
+_catalogueIndex = None
+
+# models built by crc_model(), by catalogue name
+_namedModels = {}
+_namedLock = threading.Lock()
+
+
+#
+# the catalogue entry for a name or alias in any case, or None
+#
+def catalogueEntry(name):
+    global _catalogueIndex
+
+    if _catalogueIndex is None:
+        index = {}
+        for entry in CATALOGUE:
+            for n in (entry[0],) + entry[8]:
+                index[n.upper()] = entry
+
+        _catalogueIndex = index
+
+    return _catalogueIndex.get(name.upper())
+
+
+#
+# the model for a name: one of the PRESETS, or a name or alias from the
+# catalogue in any case; the preset names are looked up first, as
+# crc16_ccitt, crc16_xmodem and crc32c are not the catalogue models of
+# similar names; aliases share the model of their catalogue entry
+#
+def crc_model(name):
+    if name in PRESETS:
+        return PRESETS[name]
+
+    entry = catalogueEntry(name)
+    if entry is None:
+        raise KeyError("unknown crc model %r" % name)
+
+    with _namedLock:
+        m = _namedModels.get(entry[0])
+        if m is None:
+            m = CrcModel(*entry[1:7])
+            _namedModels[entry[0]] = m
+
+    return m
+
+# size of the read buffer for files that cannot be mapped
+READ_CHUNK = 1 << 20
+
+
+#
+# checksum an open file: regular files are memory-mapped, anything else
+# (pipes, stdin) is read in large chunks into a reused buffer
+#
+def checksumFile(f, model):
+    try:
+        size = os.fstat(f.fileno()).st_size
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, EnvironmentError, mmap.error):
+        m = None
+
+    if m is not None:
+        try:
+            return model.compute(m), size
+        finally:
+            m.close()
+
+    h = new(model)
+    buf = bytearray(READ_CHUNK)
+    size = 0
+
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+
+        if PY2:
+            h.update(buffer(buf, 0, n))
+        else:
+            h.update(memoryview(buf)[:n])
+
+        size = size + n
+
+    return h.checksum(), size
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="crc", description="checksum files")
+    parser.add_argument("model", help="preset (%s) or catalogue model, eg. CRC-16/MODBUS" %
+                        ", ".join(sorted(PRESETS)))
+    parser.add_argument("files", nargs="+", metavar="file", help="file to checksum, - for stdin")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print throughput")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of worker processes for each file")
+    args = parser.parse_args(argv)
+
+    try:
+        model = crc_model(args.model)
+    except KeyError:
+        parser.error("unknown model %s" % args.model)
+
+    status = 0
+
+    for name in args.files:
+        start = time.time()
+
+        try:
+            if name == "-":
+                stdin = sys.stdin if PY2 else sys.stdin.buffer
+                cksum, size = checksumFile(stdin, model)
+            elif args.workers > 1:
+                cksum = crc_parallel(name, model, args.workers)
+                size = os.path.getsize(name)
+            else:
+                f = open(name, "rb")
+                try:
+                    cksum, size = checksumFile(f, model)
+                finally:
+                    f.close()
+        except EnvironmentError as e:
+            sys.stderr.write("%s: %s\n" % (name, e.strerror))
+            status = 1
+            continue
+
+        elapsed = time.time() - start
+        sys.stdout.write("%0*x  %s\n" % ((model.width + 3) // 4, cksum, name))
+
+        if not args.quiet:
+            sys.stdout.flush()
+            rate = size / elapsed / 1e6 if elapsed > 0 else 0.0
+            sys.stderr.write("%s: %d bytes in %.3f s (%.1f MB/s)\n" % (name, size, elapsed, rate))
+
+    return status
+
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+
+#
+# asyncio helpers to update a CRC as data arrives on a stream
+#
+# chunks of OFFLOAD_THRESHOLD bytes or more are checksummed in a thread pool
+# so that a large buffer never stalls the event loop; smaller chunks are
+# checksummed inline, where the thread hand-off would cost more than the crc
+#
+# this module needs Python 3 (asyncio); crc.py itself also runs on Python 2
+#
+
+import asyncio
+
+import crc
+
+
+# chunks at least this large are checksummed in a worker thread
+OFFLOAD_THRESHOLD = 1 << 16
+
+
+#
+# update a CrcHash with data, in the executor if the data is large
+#
+async def _update(h, data, threshold, executor):
+    if len(data) >= threshold:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, h.update, data)
+    else:
+        h.update(data)
+
+
+#
+# wrapper around an asyncio.StreamReader which updates a crc with
+# everything that is read through it; each read returns once the crc has
+# been updated, so checksum() always covers the data returned so far
+#
+class CrcStreamReader(object):
+
+    def __init__(self, reader, model, threshold=OFFLOAD_THRESHOLD, executor=None):
+        self.reader = reader
+        self.model = model
+        self.threshold = threshold
+        self.executor = executor
+        self.hash = crc.new(model)
+
+    async def read(self, n=-1):
+        data = await self.reader.read(n)
+        await _update(self.hash, data, self.threshold, self.executor)
+        return data
+
+    async def readexactly(self, n):
+        data = await self.reader.readexactly(n)
+        await _update(self.hash, data, self.threshold, self.executor)
+        return data
+
+    async def readuntil(self, separator=b"\n"):
+        data = await self.reader.readuntil(separator)
+        await _update(self.hash, data, self.threshold, self.executor)
+        return data
+
+    async def readline(self):
+        data = await self.reader.readline()
+        await _update(self.hash, data, self.threshold, self.executor)
+        return data
+
+    def at_eof(self):
+        return self.reader.at_eof()
+
+    # start a new checksum, eg. at a frame boundary
+    def reset(self):
+        self.hash = crc.new(self.model)
+
+    def checksum(self):
+        return self.hash.checksum()
+
+    def digest(self):
+        return self.hash.digest()
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+#
+# checksum everything up to the end of the stream, or the next nbytes bytes,
+# reading chunk_size bytes at a time; only one chunk is held in memory
+#
+# if the stream ends before nbytes bytes, IncompleteReadError is raised with
+# expected set to nbytes; the data is not kept, so its partial is empty, and
+# the number of bytes which were read is given by its consumed attribute
+#
+async def checksum_stream(reader, model, nbytes=None, chunk_size=1 << 16,
+                          threshold=OFFLOAD_THRESHOLD, executor=None):
+    h = crc.new(model)
+    consumed = 0
+
+    while nbytes is None or consumed < nbytes:
+        if nbytes is None:
+            data = await reader.read(chunk_size)
+        else:
+            data = await reader.read(min(chunk_size, nbytes - consumed))
+
+        if not data:
+            if nbytes is not None:
+                e = asyncio.IncompleteReadError(b"", nbytes)
+                e.consumed = consumed
+                raise e
+            break
+
+        await _update(h, data, threshold, executor)
+        consumed = consumed + len(data)
+
+    return h.checksum()
+
+
+#
+# mixin for asyncio.Protocol classes which keeps a crc of the data passed to
+# data_received(); it must come before the protocol class in the bases:
+#
+#   class FrameProtocol(CrcProtocolMixin, asyncio.Protocol):
+#       crc_model = crc.CRC32
+#
+# large chunks are checksummed in the executor; the updates are chained so
+# that they are applied in arrival order, and crc_checksum() waits for any
+# which are still pending
+#
+class CrcProtocolMixin(object):
+
+    crc_model = crc.CRC32
+    crc_threshold = OFFLOAD_THRESHOLD
+    crc_executor = None
+
+    def crc_reset(self, model=None):
+        if model is not None:
+            self.crc_model = model
+
+        self._crc_hash = crc.new(self.crc_model)
+        self._crc_pending = None
+
+    def crc_feed(self, data):
+        if not hasattr(self, "_crc_hash"):
+            self.crc_reset()
+
+        pending = self._crc_pending
+        if pending is not None and pending.done():
+            # re-raise any error from the offloaded update
+            pending.result()
+            pending = None
+
+        if pending is None and len(data) < self.crc_threshold:
+            self._crc_hash.update(data)
+            self._crc_pending = None
+            return
+
+        self._crc_pending = asyncio.ensure_future(
+            self._crc_chain(pending, self._crc_hash, bytes(data)))
+
+    async def _crc_chain(self, pending, h, data):
+        if pending is not None:
+            await pending
+
+        await _update(h, data, self.crc_threshold, self.crc_executor)
+
+    async def crc_checksum(self):
+        if not hasattr(self, "_crc_hash"):
+            self.crc_reset()
+
+        if self._crc_pending is not None:
+            await self._crc_pending
+            self._crc_pending = None
+
+        return self._crc_hash.checksum()
+
+    def data_received(self, data):
+        self.crc_feed(data)
+        super(CrcProtocolMixin, self).data_received(data)
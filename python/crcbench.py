@@ -0,0 +1,369 @@
+#!/usr/bin/python
+
+#
+# benchmark of the crc engines:
+#
+#   python crcbench.py [-o results.json] [-s sizes] [-e engines] [-m models]
+#
+# every engine is run over every model it supports at every message size, and
+# the throughput, the time per call and whether the checksum is correct are
+# written as JSON (to stdout, or to the file given with -o); a summary table
+# goes to stderr
+#
+# engines:
+#   s8, s9, s10, s11  the reference algorithms in crctest.py (lists only, and
+#                     slow, so they stop at small sizes)
+#   python            crc.CrcModel without the C library, byte at a time
+#   python-s8         crc.CrcModel without the C library, slicing-by-8
+#   native            crc.CrcModel using the _crc extension (the C library)
+#   zlib, binascii    zlib.crc32 for crc32 and binascii.crc_hqx for crc16_ccitt
+#
+# the time to build the tables of each model is measured separately, for the
+# pure Python table cache and for the C library, and so is the time to
+# import crc with and without the generated tables
+#
+
+from __future__ import division
+
+import binascii
+import json
+import os
+import platform
+import sys
+import time
+import zlib
+
+import crc
+import crctest
+
+
+# time.perf_counter is not available in Python 2
+timer = getattr(time, "perf_counter", time.time)
+
+# default message sizes, 8 bytes to 1 GB
+DEFAULT_SIZES = [8, 64, 512, 4 << 10, 64 << 10, 1 << 20, 16 << 20, 256 << 20, 1 << 30]
+
+# each case is repeated until it has run for at least this many seconds
+MIN_TIME = 0.2
+
+
+#
+# an engine is made for a model by a factory returning a function of one
+# message, or None if the engine does not implement the model; maxsize is the
+# largest message the engine is run over, and lists is True for engines which
+# take the message as a list of byte values
+#
+class Engine(object):
+
+    def __init__(self, name, factory, maxsize=None, lists=False):
+        self.name = name
+        self.factory = factory
+        self.maxsize = maxsize
+        self.lists = lists
+
+
+def _pureModel(model, slices=None):
+    m = crc.CrcModel(*model.params(), slices=slices)
+    m._native = None
+    return m
+
+
+def _pure(model):
+    return _pureModel(model).compute
+
+
+def _pureSliced(model):
+    return _pureModel(model, 8).compute
+
+
+def _native(model):
+    if crc._crc is None or model._native is None:
+        return None
+
+    return model.compute
+
+
+def _zlib(model):
+    if model.params() != crc.CRC32.params():
+        return None
+
+    return lambda msg: zlib.crc32(msg) & 0xffffffff
+
+
+def _binascii(model):
+    # crc_hqx is the CRC16/CCITT of crc.py when started from 0xffff
+    if model.params() != crc.CRC16_CCITT.params():
+        return None
+
+    return lambda msg: binascii.crc_hqx(msg, 0xffff)
+
+
+#
+# the reference algorithms take a list which they consume, so each call
+# works on a copy, as crctest.crc() does
+#
+def _simple(model):
+    width, poly, init, refin, refout, xorout = model.params()
+    return lambda M: crctest.s8crc(M[:], width, poly, init, refin, refout, xorout)
+
+
+def _reference(fn, reftable):
+    def factory(model):
+        width, poly, init, refin, refout, xorout = model.params()
+        if width % 8 != 0:
+            return None
+
+        return lambda M: fn(M[:], width, poly, init, refin, refout, reftable, xorout)
+
+    return factory
+
+
+ENGINES = [
+    Engine("s8", _simple, maxsize=4 << 10, lists=True),
+    Engine("s9", _reference(crctest.s9crc, False), maxsize=4 << 10, lists=True),
+    Engine("s10", _reference(crctest.s10crc, False), maxsize=4 << 10, lists=True),
+    Engine("s11", _reference(crctest.s11crc, True), maxsize=4 << 10, lists=True),
+    Engine("python", _pure, maxsize=16 << 20),
+    Engine("python-s8", _pureSliced, maxsize=16 << 20),
+    Engine("native", _native),
+    Engine("zlib", _zlib),
+    Engine("binascii", _binascii),
+]
+
+
+#
+# run fn(msg) repeatedly for at least mintime seconds; returns the number of
+# calls, the total time and the result of the last call
+#
+def timeCalls(fn, msg, mintime):
+    calls = 0
+    start = timer()
+
+    while True:
+        result = fn(msg)
+        calls = calls + 1
+        elapsed = timer() - start
+
+        if elapsed >= mintime:
+            return calls, elapsed, result
+
+        # grow the batch so that the timer is not read after every short call
+        for n in range(calls):
+            fn(msg)
+
+        calls = calls + calls
+
+
+#
+# time to build the lookup tables of a model, from an empty cache
+#
+def tableBuildTimes(name, model):
+    width, poly, init, refin, refout, xorout = model.params()
+
+    crc.tableCache.clear()
+    start = timer()
+    crc.tableCache.lookup(poly, width, refin)
+    python = timer() - start
+
+    result = {"model": name, "python_s": python, "native_s": None}
+
+    if crc._crc is not None and width <= 64:
+        start = timer()
+        crc._crc.Model(width, poly, init, refin, refout, xorout)
+        result["native_s"] = timer() - start
+
+    return result
+
+
+#
+# time to import crc and make the first call for a preset, in a fresh
+# interpreter, with the generated tables of crctables.py (when they have
+# been generated) and without them, in which case the tables of the presets
+# are built at import time; the best of a few runs is kept
+#
+STARTUP_SCRIPT = """
+import sys, time
+timer = getattr(time, "perf_counter", time.time)
+if not %(frozen)r:
+    sys.modules["crctables"] = None
+start = timer()
+import crc
+imported = timer()
+crc.PRESETS["crc32"].compute(b"123456789")
+called = timer()
+sys.stdout.write("%%r %%r %%r" %% (crc.crctables is not None, imported - start, called - imported))
+"""
+
+
+def startupTimes(runs=5):
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+
+    for frozen in (True, False):
+        best = None
+
+        for n in range(runs):
+            out = subprocess.check_output([sys.executable, "-c", STARTUP_SCRIPT % {"frozen": frozen}], cwd=here)
+            generated, imported, called = out.decode("ascii").split()
+            if best is None or float(imported) < best["import_s"]:
+                best = {"generated": generated == "True", "import_s": float(imported),
+                        "first_call_s": float(called)}
+
+        if frozen and not best["generated"]:
+            # crctables.py has not been generated
+            continue
+
+        results.append(best)
+
+    return results
+
+
+#
+# message of the given size: random bytes, repeated in 1 MB blocks so that a
+# large message does not take long to make
+#
+def makeMessage(size):
+    block = os.urandom(min(size, 1 << 20))
+    message = bytearray(size)
+    view = memoryview(message)
+
+    for n in range(0, size, len(block)):
+        view[n:n + len(block)] = block[:size - n]
+
+    return message
+
+
+def parseSize(s):
+    units = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+
+    s = s.strip().lower()
+    if s and s[-1] in units:
+        return int(s[:-1]) * units[s[-1]]
+
+    return int(s)
+
+
+def formatSize(size):
+    for unit, shift in (("G", 30), ("M", 20), ("K", 10)):
+        if size >= 1 << shift and size % (1 << shift) == 0:
+            return "%d%s" % (size >> shift, unit)
+
+    return "%d" % size
+
+
+def run(models, engines, sizes, mintime=MIN_TIME, log=None):
+    results = []
+
+    message = makeMessage(max(sizes))
+    view = memoryview(message)
+
+    for name in sorted(models):
+        model = models[name]
+
+        for engine in engines:
+            fn = engine.factory(model)
+            if fn is None:
+                continue
+
+            for size in sizes:
+                if engine.maxsize is not None and size > engine.maxsize:
+                    continue
+
+                if engine.lists:
+                    msg = list(bytearray(view[:size]))
+                elif crc.PY2:
+                    # zlib and binascii do not take a memoryview in Python 2
+                    msg = buffer(message, 0, size)
+                else:
+                    msg = view[:size]
+
+                calls, elapsed, cksum = timeCalls(fn, msg, mintime)
+
+                result = {
+                    "engine": engine.name,
+                    "model": name,
+                    "size": size,
+                    "calls": calls,
+                    "seconds": elapsed,
+                    "mb_per_s": size * calls / elapsed / 1e6,
+                    "latency_us": elapsed / calls * 1e6,
+                    "ok": cksum == model.compute(msg),
+                }
+                results.append(result)
+
+                if log is not None:
+                    log.write("%-13s %-10s %6s %10.1f MB/s %12.2f us%s\n" % (
+                        name, engine.name, formatSize(size), result["mb_per_s"],
+                        result["latency_us"], "" if result["ok"] else "  WRONG"))
+                    log.flush()
+
+    return results
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="crcbench", description="benchmark the crc engines")
+    parser.add_argument("-o", "--output", help="file to write the JSON results to (default stdout)")
+    parser.add_argument("-s", "--sizes", help="comma separated message sizes, eg. 8,4k,1m (default 8 to 1g)")
+    parser.add_argument("-e", "--engines", help="comma separated engines (default all)")
+    parser.add_argument("-m", "--models", help="comma separated models (default all presets)")
+    parser.add_argument("-t", "--time", type=float, default=MIN_TIME,
+                        help="minimum time in seconds for each case")
+    args = parser.parse_args(argv)
+
+    if args.sizes:
+        sizes = [parseSize(s) for s in args.sizes.split(",")]
+    else:
+        sizes = DEFAULT_SIZES
+
+    engines = ENGINES
+    if args.engines:
+        names = args.engines.split(",")
+        unknown = set(names) - set(e.name for e in ENGINES)
+        if unknown:
+            parser.error("unknown engine %s" % ", ".join(sorted(unknown)))
+
+        engines = [e for e in ENGINES if e.name in names]
+
+    models = crc.PRESETS
+    if args.models:
+        names = args.models.split(",")
+        unknown = set(names) - set(crc.PRESETS)
+        if unknown:
+            parser.error("unknown model %s" % ", ".join(sorted(unknown)))
+
+        models = dict((n, crc.PRESETS[n]) for n in names)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "native": crc._crc is not None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tables": [tableBuildTimes(n, models[n]) for n in sorted(models)],
+        "startup": startupTimes(),
+        "results": run(models, engines, sizes, args.time, sys.stderr),
+    }
+
+    for result in report["startup"]:
+        sys.stderr.write("import crc, %-16s %8.1f ms, first call %8.2f us\n" % (
+            "generated tables" if result["generated"] else "built tables", result["import_s"] * 1e3,
+            result["first_call_s"] * 1e6))
+
+    if args.output:
+        f = open(args.output, "w")
+        try:
+            json.dump(report, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+    else:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write("\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
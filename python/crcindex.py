@@ -0,0 +1,394 @@
+#!/usr/bin/python
+
+#
+# block CRC index of a file, kept in a sidecar file next to it:
+#
+#   python crcindex.py [-m model] [-b blocksize] [-s fraction] [-q] file...
+#
+# the index holds the checksum of every fixed size block of the file, with
+# the size and modification time of the file when it was indexed; the
+# checksum of the whole file is derived from the block checksums with
+# crc_combine, without reading the file
+#
+# a scan of a file whose size and modification time match its index only
+# reads a random sample of its blocks (none by default) to check them for
+# silent corruption; a file which has changed has its blocks checksummed
+# again, the blocks which differ are reported and the index is rewritten,
+# and a file without an index is indexed; so a nightly scan of a large
+# dataset only reads the files which have changed
+#
+# the sidecar (file.crcidx) is a header of big endian fields, the block
+# checksums as an array of unsigned integers of the width of the model
+# rounded up to a whole number of bytes, and the CRC-32 of all of it:
+#
+#   magic       8 bytes   "CRCIDX1\n"
+#   width       uint16
+#   refin       uint8
+#   refout      uint8
+#   poly        uint64
+#   init        uint64
+#   xorout      uint64
+#   blocksize   uint64
+#   size        uint64    size of the file
+#   mtime       uint64    modification time of the file in nanoseconds
+#   nblocks     uint64
+#   checksums   nblocks * itemsize bytes
+#   crc32       uint32
+#
+# models of up to 64 bits can be used
+#
+
+import array
+import mmap
+import os
+import random
+import struct
+import sys
+
+import crc
+
+
+MAGIC = b"CRCIDX1\n"
+HEADER = struct.Struct(">8sHBBQQQQQQQ")
+TRAILER = struct.Struct(">I")
+
+SUFFIX = ".crcidx"
+
+# default block size; 1 MB blocks make an index of 4 MB per TB for CRC-32
+DEFAULT_BLOCK = 1 << 20
+
+
+#
+# array typecode of the smallest unsigned integer holding a checksum of the
+# given width; Python 2 has no "Q", but its "L" is 64 bits on LP64 systems
+#
+def arrayType(width):
+    for typecode in "BHILQ":
+        try:
+            itemsize = array.array(typecode).itemsize
+        except ValueError:
+            continue
+
+        if itemsize * 8 >= width:
+            return typecode
+
+    raise ValueError("no array type holds a %d bit checksum" % width)
+
+
+def _toBytes(a):
+    if sys.byteorder == "little":
+        a = array.array(a.typecode, a)
+        a.byteswap()
+
+    return a.tobytes() if hasattr(a, "tobytes") else a.tostring()
+
+
+def _fromBytes(typecode, data):
+    a = array.array(typecode)
+
+    if hasattr(a, "frombytes"):
+        a.frombytes(data)
+    else:
+        a.fromstring(data)
+
+    if sys.byteorder == "little":
+        a.byteswap()
+
+    return a
+
+
+#
+# rename a file over another in one step; Python 2 has no os.replace, but
+# its os.rename does the same on POSIX systems, and elsewhere the old file
+# has to be removed first
+#
+def replaceFile(src, dst):
+    if hasattr(os, "replace"):
+        os.replace(src, dst)
+    elif os.name == "posix":
+        os.rename(src, dst)
+    else:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def mtimeNs(st):
+    ns = getattr(st, "st_mtime_ns", None)
+    if ns is None:
+        ns = int(st.st_mtime * 1e9)
+
+    return ns
+
+
+#
+# the checksums of the given blocks of an open file, as (number, checksum)
+# pairs; the file is memory-mapped when it can be, and read block by block
+# otherwise
+#
+def blockChecksums(f, size, blocksize, model, numbers):
+    try:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+    except (ValueError, EnvironmentError, mmap.error):
+        m = None
+
+    if m is not None:
+        view = None if crc.PY2 else memoryview(m)
+        try:
+            for n in numbers:
+                offset = n * blocksize
+                length = min(blocksize, size - offset)
+
+                if crc.PY2:
+                    yield n, model.compute(buffer(m, offset, length))
+                else:
+                    yield n, model.compute(view[offset:offset + length])
+        finally:
+            if view is not None:
+                view.release()
+            m.close()
+
+        return
+
+    for n in numbers:
+        f.seek(n * blocksize)
+        yield n, model.compute(f.read(min(blocksize, size - n * blocksize)))
+
+
+class CrcIndex(object):
+
+    def __init__(self, model, blocksize, size=0, mtime=0, checksums=None):
+        if model.width > 64:
+            raise ValueError("the index holds checksums of up to 64 bits")
+
+        self.model = model
+        self.blocksize = blocksize
+        self.size = size
+        self.mtime = mtime
+
+        if checksums is None:
+            checksums = array.array(arrayType(model.width))
+        self.checksums = checksums
+
+    def nblocks(self):
+        return len(self.checksums)
+
+    #
+    # checksum of the whole file, joined from the block checksums; this is
+    # crc_combine for each block, run on the registers with the operator for
+    # blocksize zero bytes built once, as a table of its products with each
+    # value of each byte of the register, so that a whole block costs a few
+    # lookups; only a short last block goes through a general combine
+    #
+    def checksum(self):
+        model = self.model
+        nblocks = len(self.checksums)
+
+        if nblocks == 0:
+            return model.compute(bytearray())
+
+        full = nblocks
+        if self.size % self.blocksize:
+            full = nblocks - 1
+
+        reg = model._unfinal(self.checksums[0])
+
+        if full > 1:
+            op = model._shiftOperator(self.blocksize)
+            tables = [[crc.gf2_matrix_times(op, v << k) for v in range(256)]
+                      for k in range(0, model._regwidth, 8)]
+
+            for n in range(1, full):
+                x = reg ^ model.reginit
+                reg = model._unfinal(self.checksums[n])
+
+                for table in tables:
+                    reg = reg ^ table[x & 0xff]
+                    x = x >> 8
+
+        cksum = model._final(reg)
+
+        if full < nblocks and nblocks > 1:
+            cksum = model.combine(cksum, self.checksums[-1], self.size % self.blocksize)
+
+        return cksum
+
+    def save(self, path):
+        width, poly, init, refin, refout, xorout = self.model.params()
+        header = HEADER.pack(MAGIC, width, int(refin), int(refout), poly, init, xorout,
+                             self.blocksize, self.size, self.mtime, len(self.checksums))
+        data = header + _toBytes(self.checksums)
+        data = data + TRAILER.pack(crc.crc32(data))
+
+        # write through a temporary file, on disk before it replaces the
+        # index, so that an interrupted scan or a crash leaves the old index
+        tmp = path + ".tmp"
+        f = open(tmp, "wb")
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+
+        replaceFile(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+
+        if len(data) < HEADER.size + TRAILER.size or data[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a crc index" % path)
+
+        body = data[:-TRAILER.size]
+        if TRAILER.unpack(data[-TRAILER.size:])[0] != crc.crc32(body):
+            raise ValueError("%s is corrupt" % path)
+
+        (magic, width, refin, refout, poly, init, xorout,
+         blocksize, size, mtime, nblocks) = HEADER.unpack(body[:HEADER.size])
+
+        model = crc.CrcModel(width, poly, init, bool(refin), bool(refout), xorout)
+        checksums = _fromBytes(arrayType(width), body[HEADER.size:])
+
+        if blocksize == 0 or len(checksums) != nblocks or nblocks != (size + blocksize - 1) // blocksize:
+            raise ValueError("%s is corrupt" % path)
+
+        return cls(model, blocksize, size, mtime, checksums)
+
+
+#
+# index a file from scratch
+#
+def build(path, model, blocksize=DEFAULT_BLOCK):
+    f = open(path, "rb")
+    try:
+        st = os.fstat(f.fileno())
+        index = CrcIndex(model, blocksize, st.st_size, mtimeNs(st))
+        nblocks = (st.st_size + blocksize - 1) // blocksize
+
+        for n, cksum in blockChecksums(f, st.st_size, blocksize, model, range(nblocks)):
+            index.checksums.append(cksum)
+    finally:
+        f.close()
+
+    return index
+
+
+#
+# bring the index of a file up to date; returns the index (a new one if the
+# file has changed) and the numbers of the blocks whose checksums do not
+# match the old index
+#
+# when the size and modification time of the file match the index, the
+# given fraction of its blocks is read and checked against the index, which
+# is kept as it is; a mismatch then means the data changed underneath the
+# file system; otherwise every block is checksummed again
+#
+def scan(path, index, sample=0.0):
+    f = open(path, "rb")
+    try:
+        st = os.fstat(f.fileno())
+
+        if st.st_size == index.size and mtimeNs(st) == index.mtime:
+            nblocks = index.nblocks()
+            count = min(nblocks, int(nblocks * sample + 0.999999))
+            numbers = sorted(random.sample(range(nblocks), count))
+
+            bad = [n for n, cksum in blockChecksums(f, st.st_size, index.blocksize, index.model, numbers)
+                   if cksum != index.checksums[n]]
+
+            return index, bad
+
+        new = CrcIndex(index.model, index.blocksize, st.st_size, mtimeNs(st))
+        nblocks = (st.st_size + index.blocksize - 1) // index.blocksize
+        changed = []
+
+        for n, cksum in blockChecksums(f, st.st_size, index.blocksize, index.model, range(nblocks)):
+            new.checksums.append(cksum)
+
+            # a block has changed if its length has, as the last block of a file can
+            offset = n * index.blocksize
+            same = n < index.nblocks() and min(index.blocksize, index.size - offset) == \
+                min(index.blocksize, st.st_size - offset)
+            if not same or cksum != index.checksums[n]:
+                changed.append(n)
+
+        changed.extend(range(nblocks, index.nblocks()))
+    finally:
+        f.close()
+
+    return new, changed
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="crcindex", description="keep block crc indexes of files")
+    parser.add_argument("files", nargs="+", metavar="file", help="file to index or check")
+    parser.add_argument("-m", "--model", default="crc32", help="model for new indexes (default crc32)")
+    parser.add_argument("-b", "--blocksize", type=int, default=DEFAULT_BLOCK,
+                        help="block size for new indexes in bytes (default %d)" % DEFAULT_BLOCK)
+    parser.add_argument("-s", "--sample", type=float, default=0.0,
+                        help="fraction of the blocks of unchanged files to check (default 0)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only report changes and errors")
+    args = parser.parse_args(argv)
+
+    try:
+        model = crc.crc_model(args.model)
+    except KeyError:
+        parser.error("unknown model %s" % args.model)
+
+    if model.width > 64:
+        parser.error("the index holds checksums of up to 64 bits")
+
+    if args.blocksize < 1:
+        parser.error("block size must be positive")
+
+    status = 0
+
+    for name in args.files:
+        if name.endswith(SUFFIX):
+            continue
+
+        sidecar = name + SUFFIX
+
+        try:
+            try:
+                index = CrcIndex.load(sidecar)
+            except EnvironmentError:
+                index = None
+
+            if index is None:
+                index = build(name, model, args.blocksize)
+                index.save(sidecar)
+                report = "indexed %d blocks" % index.nblocks()
+            else:
+                new, blocks = scan(name, index, args.sample)
+
+                if new is index:
+                    if blocks:
+                        report = "CORRUPT blocks %s" % " ".join(str(n) for n in blocks)
+                        status = 1
+                    else:
+                        report = "ok"
+                else:
+                    new.save(sidecar)
+                    index = new
+                    report = "changed blocks %s" % " ".join(str(n) for n in blocks) if blocks else "touched"
+        except (EnvironmentError, ValueError) as e:
+            sys.stderr.write("%s: %s\n" % (name, getattr(e, "strerror", None) or e))
+            status = 1
+            continue
+
+        if not args.quiet or report not in ("ok", "touched"):
+            sys.stdout.write("%0*x  %s  %s\n" % ((index.model.width + 3) // 4, index.checksum(), name, report))
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,608 @@
+#!/usr/bin/python
+
+#
+# find the parameters of a CRC from messages and their checksums:
+#
+#   python crcsolve.py -w width [-j workers] [--refin 0|1] [--refout 0|1] message:checksum...
+#   python crcsolve.py -w width -f samples.txt
+#
+# messages and checksums are given in hex; a file holds one "message checksum"
+# pair per line
+#
+# the search uses the linearity of the CRC instead of trying every model:
+#
+# for a model of width w, with its register running MSB-first, the register
+# after a message M of n bytes is I.x^8n + M.x^w mod P, where I is the
+# initial value and P the polynomial (refin reflects the bytes of M, refout
+# the register), and the checksum is the register xor xorout
+#
+# for two messages of the same length the initial value and xorout cancel,
+# so P divides (M1 + M2).x^w + (c1 + c2); for two pairs of messages of
+# different lengths the initial value is cancelled by combining the pairs;
+# the polynomial is then a divisor of degree w of the greatest common divisor
+# of these polynomials, and the initial value and xorout follow by solving a
+# linear system over GF(2)
+#
+# when the greatest common divisor has a higher degree than the polynomial,
+# it is factored into irreducible polynomials (squarefree, distinct degree
+# and equal degree factorisation, the last by the Cantor-Zassenhaus method),
+# and the candidates are the products of its factors of degree w; so a pair
+# of messages of the same length and one more message are enough, whatever
+# their length; when there are many candidates, their initial values and
+# xorouts are solved for in a pool of worker processes
+#
+# as for every CRC in use, the polynomial is taken to have a +1 term
+#
+
+from __future__ import division
+
+import binascii
+import multiprocessing
+import random
+import sys
+
+import crc
+
+# more candidate polynomials than this are checked in worker processes
+POOL_THRESHOLD = 64
+
+# more candidate polynomials than this are refused
+MAX_CANDIDATES = 1 << 16
+
+# initial values and xorouts are listed in full when there are at most this
+# many of them; otherwise only those with init 0 and init all ones are given
+MAX_FREE = 4
+
+# the four combinations of refin and refout, the usual ones first
+REFLECTIONS = [(False, False), (True, True), (False, True), (True, False)]
+
+
+#
+# polynomials over GF(2) are held as integers, bit n being the coefficient
+# of x^n
+#
+def polyDegree(a):
+    return a.bit_length() - 1
+
+
+def polyMod(a, b):
+    db = b.bit_length()
+
+    while True:
+        shift = a.bit_length() - db
+        if shift < 0:
+            return a
+
+        a = a ^ (b << shift)
+
+
+def polyDiv(a, b):
+    db = b.bit_length()
+    q = 0
+
+    while True:
+        shift = a.bit_length() - db
+        if shift < 0:
+            return q
+
+        a = a ^ (b << shift)
+        q = q | (1 << shift)
+
+
+def polyMul(a, b):
+    r = 0
+
+    while b:
+        if b & 1:
+            r = r ^ a
+
+        a = a << 1
+        b = b >> 1
+
+    return r
+
+
+def polyGcd(a, b):
+    while b:
+        a, b = b, polyMod(a, b)
+
+    return a
+
+
+# squaring only spreads the coefficients out, as the cross terms cancel
+def _spread(n):
+    r = 0
+    for k in range(8):
+        r = r | (((n >> k) & 1) << (2 * k))
+
+    return r
+
+
+SQUARES = [_spread(n) for n in range(256)]
+
+
+def polySquare(a):
+    r = 0
+    shift = 0
+
+    while a:
+        r = r | (SQUARES[a & 0xff] << shift)
+        a = a >> 8
+        shift = shift + 16
+
+    return r
+
+
+# the square root of a polynomial which is a square: its even coefficients
+def polySqrt(a):
+    r = 0
+    n = 0
+
+    while a:
+        r = r | ((a & 1) << n)
+        a = a >> 2
+        n = n + 1
+
+    return r
+
+
+#
+# a function reducing polynomials modulo f, a byte at a time: the table holds
+# the multiple of f which clears each value of the top byte
+#
+def polyReducer(f):
+    df = polyDegree(f)
+    table = [(t << df) ^ polyMod(t << df, f) for t in range(256)]
+
+    def reduce(a):
+        while True:
+            shift = a.bit_length() - df - 8
+            if shift < 0:
+                return polyMod(a, f)
+
+            a = a ^ (table[a >> (shift + df)] << shift)
+
+    return reduce
+
+
+def polyDerivative(a):
+    # the odd powers go down by one, the even ones vanish
+    r = 0
+    n = 1
+
+    while a >> n:
+        r = r | (((a >> n) & 1) << (n - 1))
+        n = n + 2
+
+    return r
+
+
+#
+# factorisation over GF(2), in three steps: the squarefree factorisation
+# splits a polynomial into squarefree factors, each the product of the
+# irreducible factors of one multiplicity; the distinct degree factorisation
+# splits a squarefree polynomial into products of irreducibles of one
+# degree; the equal degree factorisation (Cantor-Zassenhaus) splits those
+#
+def _squarefree(f):
+    factors = []
+
+    c = polyGcd(f, polyDerivative(f))
+    w = polyDiv(f, c)
+    i = 1
+
+    while w != 1:
+        y = polyGcd(w, c)
+        z = polyDiv(w, y)
+        if z != 1:
+            factors.append((z, i))
+
+        w = y
+        c = polyDiv(c, y)
+        i = i + 1
+
+    # what is left is a square: its factors have even multiplicities
+    if c != 1:
+        factors.extend((z, 2 * i) for z, i in _squarefree(polySqrt(c)))
+
+    return factors
+
+
+#
+# the product of the irreducible factors of a squarefree f of degree up to
+# maxDegree; each of those degrees divides a d between maxDegree / 2 and
+# maxDegree, so the gcds of f with x^(2^d) - x for those d hold all of them,
+# which takes half the gcds of f that the distinct degree factorisation
+# would; the gcds are small, and are joined by their lcm
+#
+def _lowDegreePart(f, maxDegree):
+    reduce = polyReducer(f)
+    part = 1
+    h = 2
+
+    for d in range(1, maxDegree + 1):
+        h = reduce(polySquare(h))
+
+        if 2 * d > maxDegree:
+            g = polyGcd(f, h ^ 2)
+            part = polyMul(part, polyDiv(g, polyGcd(part, g)))
+
+    return part
+
+
+def _distinctDegree(f, maxDegree):
+    factors = []
+    h = 2
+    d = 1
+
+    # h is x^(2^d) mod f, and x^(2^d) - x is the product of the irreducible
+    # polynomials of degrees dividing d
+    while polyDegree(f) >= 2 * d:
+        if d > maxDegree:
+            return factors
+
+        h = polyMod(polySquare(h), f)
+        g = polyGcd(f, h ^ 2)
+
+        if g != 1:
+            factors.append((g, d))
+            f = polyDiv(f, g)
+            h = polyMod(h, f)
+
+        d = d + 1
+
+    # what is left has no factor of degree d or less, so it is irreducible
+    if f != 1 and polyDegree(f) <= maxDegree:
+        factors.append((f, polyDegree(f)))
+
+    return factors
+
+
+def _equalDegree(f, d, rng):
+    if polyDegree(f) == d:
+        return [f]
+
+    while True:
+        # the trace a + a^2 + ... + a^(2^(d-1)) is 0 or 1 modulo each factor,
+        # either with even chances, so it splits f about half of the time
+        a = rng.getrandbits(polyDegree(f))
+        t = a
+        for n in range(d - 1):
+            a = polyMod(polySquare(a), f)
+            t = t ^ a
+
+        g = polyGcd(f, t)
+        if 0 < polyDegree(g) < polyDegree(f):
+            return _equalDegree(g, d, rng) + _equalDegree(polyDiv(f, g), d, rng)
+
+
+#
+# the irreducible factors of f of up to maxDegree (all of them by default),
+# as a sorted list of (factor, multiplicity); the random choices are seeded
+# with f, so the result does not change from run to run
+#
+def polyFactor(f, maxDegree=None):
+    if maxDegree is None:
+        maxDegree = polyDegree(f)
+
+    rng = random.Random(f)
+    factors = []
+
+    for s, i in _squarefree(f):
+        if polyDegree(s) > 2 * maxDegree:
+            s = _lowDegreePart(s, maxDegree)
+
+        for g, d in _distinctDegree(s, maxDegree):
+            factors.extend((p, i) for p in _equalDegree(g, d, rng))
+
+    return sorted(factors)
+
+
+REFLECTED_BYTES = [crc.reflect(n, 8) for n in range(256)]
+
+
+#
+# the polynomial of a message as it is fed to the register, first byte
+# highest; refin reflects each byte
+#
+def messagePoly(msg, refin):
+    msg = bytearray(msg)
+    if len(msg) == 0:
+        return 0
+
+    if refin:
+        msg = bytearray(REFLECTED_BYTES[b] for b in msg)
+
+    return int(binascii.hexlify(bytes(msg)), 16)
+
+
+#
+# the polynomials which P must divide, for one combination of refin and
+# refout: one for each message paired with the first of the same length,
+# and one for each pair of messages of different lengths combined with the
+# first such pair
+#
+def _constraints(samples, width, refin, refout):
+    result = []
+    firstOfLength = {}
+    mixed = None
+
+    for msg, cksum in samples:
+        mpoly = messagePoly(msg, refin)
+        cpoly = crc.reflect(cksum, width) if refout else cksum
+        n = len(msg)
+
+        if n in firstOfLength:
+            m0, c0 = firstOfLength[n]
+            a = ((m0 ^ mpoly) << width) ^ c0 ^ cpoly
+            if a:
+                result.append(a)
+            continue
+
+        firstOfLength[n] = (mpoly, cpoly)
+
+        # pair with the first message, which has a different length
+        if len(firstOfLength) == 1:
+            first = (n, mpoly, cpoly)
+            continue
+
+        a = ((first[1] ^ mpoly) << width) ^ first[2] ^ cpoly
+        b = (1 << 8 * first[0]) ^ (1 << 8 * n)
+
+        if mixed is None:
+            mixed = (a, b)
+        else:
+            result.append(polyMul(a, mixed[1]) ^ polyMul(mixed[0], b))
+
+    return result
+
+
+#
+# the divisors of g of degree width with a +1 term: the products of the
+# irreducible factors of g whose degrees add up to the width, so factors of
+# a higher degree are not looked for
+#
+def _candidates(g, width):
+    # the polynomial has a +1 term, so factors of x can be dropped
+    while g and not g & 1:
+        g = g >> 1
+
+    excess = polyDegree(g) - width
+    if excess < 0:
+        return []
+
+    if excess == 0:
+        return [g]
+
+    factors = polyFactor(g, width)
+    found = []
+
+    # each factor is taken up to its multiplicity; rest[n] is the highest
+    # degree the factors from n on can add, to cut the search short
+    rest = [0] * (len(factors) + 1)
+    for n in range(len(factors) - 1, -1, -1):
+        rest[n] = rest[n + 1] + polyDegree(factors[n][0]) * factors[n][1]
+
+    def choose(n, product, degree):
+        if degree == width:
+            found.append(product)
+            if len(found) > MAX_CANDIDATES:
+                raise ValueError("too many candidate polynomials: give more messages of the same length")
+            return
+
+        if n == len(factors) or degree + rest[n] < width:
+            return
+
+        p, count = factors[n]
+        for k in range(count + 1):
+            if degree + k * polyDegree(p) > width:
+                break
+
+            choose(n + 1, product, degree + k * polyDegree(p))
+            product = polyMul(product, p)
+
+    choose(0, 1, 0)
+
+    return found
+
+
+#
+# the models with a candidate polynomial which give every checksum; a
+# module level function so that it can be run in a worker process
+#
+def _checkCandidate(args):
+    samples, width, poly, refin, refout = args
+    wmask = (1 << width) - 1
+    found = []
+
+    for init, xorout in _initXorout(samples, width, poly, refin, refout):
+        params = (width, poly & wmask, init, refin, refout, xorout)
+        model = crc.CrcModel(*params)
+
+        if all(model.compute(msg) == cksum for msg, cksum in samples):
+            found.append(params)
+
+    return found
+
+
+#
+# the (init, xorout) pairs which give every checksum for the polynomial
+# (with its x^width term); the unknowns are init and xorout as seen by the
+# register (reflected for refout), 2 * width bits
+#
+def _initXorout(samples, width, poly, refin, refout, extra=()):
+    rows = list(extra)
+    wmask = (1 << width) - 1
+    shifts = {}
+
+    for msg, cksum in samples:
+        n = len(msg)
+        raw = polyMod(messagePoly(msg, refin) << width, poly)
+        target = (crc.reflect(cksum, width) if refout else cksum) ^ raw
+
+        # the register bits set by each bit of init: x^b.x^8n mod P
+        if n not in shifts:
+            t = polyMod(1 << (8 * n), poly)
+            cols = []
+            for b in range(width):
+                cols.append(t)
+                t = polyMod(t << 1, poly)
+
+            shifts[n] = cols
+
+        cols = shifts[n]
+        for k in range(width):
+            row = (1 << (width + k)) | (((target >> k) & 1) << (2 * width))
+            for b in range(width):
+                row = row | (((cols[b] >> k) & 1) << b)
+
+            rows.append(row)
+
+    solved = crc.gf2_solve(rows, 2 * width)
+    if solved is None:
+        return []
+
+    particular, basis = solved
+
+    if len(basis) > MAX_FREE:
+        # with all the messages of one length, init and xorout cannot be
+        # told apart: give the solutions for the usual initial values
+        if extra:
+            return []
+
+        result = []
+        for init in (0, wmask):
+            fixed = [(1 << b) | (((init >> b) & 1) << (2 * width)) for b in range(width)]
+            result.extend(_initXorout(samples, width, poly, refin, refout, fixed))
+
+        return result
+
+    result = []
+    for n in range(1 << len(basis)):
+        values = particular
+        for k in range(len(basis)):
+            if (n >> k) & 1:
+                values = values ^ basis[k]
+
+        xorout = values >> width
+        if refout:
+            xorout = crc.reflect(xorout, width)
+
+        result.append((values & wmask, xorout))
+
+    return result
+
+
+#
+# find the models of the given width which give every checksum of samples,
+# a list of (message, checksum) pairs; refin and refout restrict the search
+# when they are given; returns a sorted list of parameter tuples
+# (width, poly, init, refin, refout, xorout), as CrcModel.params()
+#
+# at least two messages of the same length, or three messages, are needed,
+# and more messages narrow the search; the initial value and xorout can only
+# be told apart if the messages have different lengths
+#
+def crc_solve(samples, width, refin=None, refout=None, workers=None):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    samples = [(bytearray(msg), cksum) for msg, cksum in samples]
+    wmask = (1 << width) - 1
+
+    if any(cksum & ~wmask for msg, cksum in samples):
+        return []
+
+    found = set()
+
+    for ri, ro in REFLECTIONS:
+        if (refin is not None and ri != bool(refin)) or (refout is not None and ro != bool(refout)):
+            continue
+
+        g = 0
+        for a in _constraints(samples, width, ri, ro):
+            g = polyGcd(g, a)
+
+        if g == 0:
+            raise ValueError("need two messages of the same length, or three messages")
+
+        tasks = [(samples, width, poly, ri, ro) for poly in _candidates(g, width)]
+
+        if len(tasks) > POOL_THRESHOLD and workers > 1:
+            pool = multiprocessing.Pool(workers)
+            try:
+                results = pool.map(_checkCandidate, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_checkCandidate(task) for task in tasks]
+
+        for models in results:
+            found.update(models)
+
+    return sorted(found)
+
+
+#
+# names of the catalogue models with the given parameters
+#
+def catalogueNames(params):
+    return [entry[0] for entry in crc.CATALOGUE if tuple(entry[1:7]) == tuple(params)]
+
+
+def parseSample(s):
+    if ":" in s:
+        msg, cksum = s.split(":", 1)
+    else:
+        msg, cksum = s.split()
+
+    return bytearray(binascii.unhexlify(msg.strip())), int(cksum, 16)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="crcsolve", description="find the parameters of a CRC")
+    parser.add_argument("samples", nargs="*", metavar="message:checksum", help="message and checksum in hex")
+    parser.add_argument("-w", "--width", type=int, required=True, help="width of the CRC in bits")
+    parser.add_argument("-f", "--file", help="file of samples, one \"message checksum\" pair per line")
+    parser.add_argument("-j", "--workers", type=int, help="number of worker processes for checking candidates")
+    parser.add_argument("--refin", type=int, choices=(0, 1), help="only search models with this refin")
+    parser.add_argument("--refout", type=int, choices=(0, 1), help="only search models with this refout")
+    args = parser.parse_args(argv)
+
+    try:
+        samples = [parseSample(s) for s in args.samples]
+
+        if args.file:
+            f = open(args.file)
+            try:
+                samples.extend(parseSample(line) for line in f if line.strip())
+            finally:
+                f.close()
+    except (ValueError, TypeError, binascii.Error):
+        parser.error("samples are message:checksum in hex")
+
+    try:
+        solutions = crc_solve(samples, args.width, args.refin, args.refout, args.workers)
+    except ValueError as e:
+        sys.stderr.write("crcsolve: %s\n" % e)
+        return 1
+
+    digits = (args.width + 3) // 4
+    for width, poly, init, refin, refout, xorout in solutions:
+        names = catalogueNames((width, poly, init, refin, refout, xorout))
+        sys.stdout.write("width=%d poly=0x%0*x init=0x%0*x refin=%s refout=%s xorout=0x%0*x%s\n" % (
+            width, digits, poly, digits, init, str(refin).lower(), str(refout).lower(),
+            digits, xorout, "  " + " ".join(names) if names else ""))
+
+    if not solutions:
+        sys.stderr.write("crcsolve: no model found\n")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
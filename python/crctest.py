@@ -1,5 +1,7 @@
 #!/usr/bin/python
 
+from __future__ import print_function
+
 #
 # CRC functions based on the descriptions in
 # "A Painless Guide to CRC Error Detection Algorithms"
@@ -91,7 +93,7 @@ def reflect_bytes(S):
 ###########################################
 
 def crcLookupTable(poly, width, reftable):
-    wbytes = width / 8
+    wbytes = width // 8
 
     # calculate a mask to restrict the values to width bits
     wmask = 0
@@ -109,7 +111,7 @@ def crcLookupTable(poly, width, reftable):
 
     for control in range(256):
         # skip this control value if mask has already been calculated
-        if lookup[control] >= 0:
+        if lookup[control] is not None and lookup[control] >= 0:
             continue
 
         # load the top byte of register with the control value
@@ -188,16 +190,16 @@ def dumpTable(table, width, ncols):
     if len(table) != 256:
         return None
 
-    nhex = width / 4
+    nhex = width // 4
     fmt = "%%0%dx" % nhex
 
     nrows = int(256 / ncols)
     for j in range(nrows):
         for i in range(ncols):
             k = j * ncols + i
-            print fmt % table[k],
+            print(fmt % table[k], end=" ")
 
-        print
+        print()
 
 
 #
@@ -443,15 +445,15 @@ def crc(msg, width, poly, init, refin, refout, reftable, xorout):
     # otherwise the reference M will be passed
     # and contents will be modified
     cksum = s8crc(M[:], width, poly, init, refin, refout, xorout)
-    print "SIMPLE    algorithm: %08x" % cksum
+    print("SIMPLE    algorithm: %08x" % cksum)
 
     cksum = s9crc(M[:], width, poly, init, refin, refout, reftable, xorout)
-    print "TABLE     algorithm: %08x" % cksum
+    print("TABLE     algorithm: %08x" % cksum)
 
     cksum = s10crc(M[:], width, poly, init, refin, refout, reftable, xorout)
-    print "OPTIMISED algorithm: %08x" % cksum
+    print("OPTIMISED algorithm: %08x" % cksum)
 
     cksum = s11crc(M[:], width, poly, init, refin, refout, reftable, xorout)
-    print "REFLECTED algorithm: %08x" % cksum
+    print("REFLECTED algorithm: %08x" % cksum)
 
 
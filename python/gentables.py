@@ -0,0 +1,214 @@
+#!/usr/bin/python
+
+#
+# generate the lookup tables of the preset models at build time:
+#
+#   python gentables.py [-c crctables.h] [-p crctables.py]
+#
+# the C header holds the lookup table, slicing tables and fold constants of
+# every preset as static const arrays, which crc.c uses in place when built
+# with -DCRC_STATIC_TABLES (the Makefile and setup.py do this), and the
+# Python module holds the same tables packed into a string for each preset,
+# which crc.py decodes the first time they are looked up and hands out from
+# its table cache when the module can be imported; either way the tables of
+# the presets are not built at run time, and the C tables live in read-only
+# memory shared by every process using the library
+#
+# tables are stored in the form the engines use them: reflected for refin
+# models, with tables[k][n] the register value for the byte n followed by k
+# zero bytes
+#
+
+import base64
+import binascii
+import os
+import sys
+
+import crc
+
+# number of slicing tables generated for each model (CRC_MAX_SLICES in crc.c)
+SLICES = 16
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+#
+# the tables of every preset, as (name, poly, width, reflected, tables) in
+# the order of their names; models with the same (poly, width, reflected)
+# share their tables, so only the first of them is kept
+#
+def presetTables():
+    result = []
+    seen = set()
+
+    for name in sorted(crc.PRESETS):
+        model = crc.PRESETS[name]
+        key = (model.poly, model.width, model.refin)
+        if key in seen:
+            continue
+
+        seen.add(key)
+
+        table = crc.buildLookupTable(model.poly, model.width)
+        if model.refin:
+            table = crc.reflectLookupTable(table, model.width)
+
+        tables = crc.sliceLookupTables(table, model.width, model.refin, SLICES)
+        result.append((name, model.poly, model.width, model.refin, tables))
+
+    return result
+
+
+# x^n mod P, where P is the full polynomial of width bits
+def xPowMod(n, poly, width):
+    r = 1
+
+    for i in range(n):
+        r = r << 1
+        if r >> width:
+            r = r ^ poly ^ (1 << width)
+
+    return r
+
+
+#
+# the fold constants of a model and the engines it can use, calculated as
+# _foldConstants in crc.c does at run time for other models
+#
+def foldConstants(poly, width, reflected):
+    poly = poly & ((1 << width) - 1)
+
+    # MSB-first models fold the left-aligned register
+    if not reflected and width % 8 != 0:
+        poly = poly << (crc.alignedWidth(width) - width)
+        width = crc.alignedWidth(width)
+
+    if reflected:
+        k512 = [crc.reflect(xPowMod(512 + 63, poly, width), 64), crc.reflect(xPowMod(512 - 1, poly, width), 64)]
+        k128 = [crc.reflect(xPowMod(128 + 63, poly, width), 64), crc.reflect(xPowMod(128 - 1, poly, width), 64)]
+    else:
+        k512 = [xPowMod(512, poly, width), xPowMod(512 + 64, poly, width)]
+        k128 = [xPowMod(128, poly, width), xPowMod(128 + 64, poly, width)]
+
+    engines = ["CRC_ENGINE_CLMUL"]
+
+    # the crc32 instruction implements the reflected CRC-32C polynomial
+    if reflected and width == 32 and poly == 0x1edc6f41:
+        engines.append("CRC_ENGINE_CRC32C")
+
+    return engines, k512, k128
+
+
+def writeHeader(f, presets):
+    f.write("/*\n")
+    f.write("** lookup tables and fold constants of the preset models\n")
+    f.write("**\n")
+    f.write("** generated by python/gentables.py: do not edit\n")
+    f.write("*/\n\n")
+
+    for name, poly, width, reflected, tables in presets:
+        digits = crc.alignedWidth(width) // 4
+
+        f.write("static const crc_table_t crcTable_%s[CRC_MAX_SLICES] = {\n" % name)
+
+        for table in tables:
+            f.write("    {\n")
+
+            for n in range(0, 256, 4):
+                f.write("        %s,\n" % ", ".join("0x%0*xULL" % (digits, v) for v in table[n:n + 4]))
+
+            f.write("    },\n")
+
+        f.write("};\n\n")
+
+    f.write("static const crc_static_t crcStaticTables[] = {\n")
+    f.write("    /* poly, width, reflected, tables, { engines, k512, k128 } */\n")
+
+    for name, poly, width, reflected, tables in presets:
+        engines, k512, k128 = foldConstants(poly, width, reflected)
+
+        f.write("    {\n")
+        f.write("        0x%016xULL, %d, %s, crcTable_%s,\n" % (
+            poly, width, "TRUE" if reflected else "FALSE", name))
+        f.write("        { %s, { 0x%016xULL, 0x%016xULL }, { 0x%016xULL, 0x%016xULL } }\n" % (
+            " | ".join(engines), k512[0], k512[1], k128[0], k128[1]))
+        f.write("    },\n")
+
+    f.write("};\n\n")
+    f.write("#define CRC_NUM_STATIC %d\n" % len(presets))
+
+
+#
+# the tables of each preset go into the module as one base64 string of big
+# endian entries (see crc.thawTables), split over lines of 76 characters;
+# importing a few strings is much quicker than parsing the same tables as
+# tuples of integers, which made importing crc take several times as long
+#
+def writeModule(f, presets):
+    f.write("#\n")
+    f.write("# lookup tables of the preset models, keyed on (poly, width, reflected)\n")
+    f.write("#\n")
+    f.write("# generated by gentables.py: do not edit\n")
+    f.write("#\n\n")
+    f.write("FORMAT = 2\n")
+    f.write("SLICES = %d\n\n" % SLICES)
+    f.write("TABLES = {\n")
+
+    for name, poly, width, reflected, tables in presets:
+        itemsize = crc.alignedWidth(width) // 8
+        data = b"".join(binascii.unhexlify("%0*x" % (itemsize * 2, v)) for table in tables for v in table)
+        blob = base64.b64encode(data).decode("ascii")
+
+        f.write("    # %s\n" % name)
+        f.write("    (0x%x, %d, %r): (\n" % (poly, width, reflected))
+
+        for n in range(0, len(blob), 76):
+            f.write("        b\"%s\"\n" % blob[n:n + 76])
+
+        f.write("    ),\n")
+
+    f.write("}\n")
+
+
+# write through a temporary file so that an interrupted build leaves no partial output
+def generate(path, writer, presets):
+    tmp = path + ".tmp"
+
+    f = open(tmp, "w")
+    try:
+        writer(f, presets)
+    finally:
+        f.close()
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    os.rename(tmp, path)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="gentables", description="generate the preset lookup tables")
+    parser.add_argument("-c", "--header", help="C header to write (default ../c/crctables.h)")
+    parser.add_argument("-p", "--module", help="Python module to write (default crctables.py)")
+    args = parser.parse_args(argv)
+
+    # with neither given, write both to their places in the source tree
+    if args.header is None and args.module is None:
+        args.header = os.path.join(HERE, os.pardir, "c", "crctables.h")
+        args.module = os.path.join(HERE, "crctables.py")
+
+    presets = presetTables()
+
+    if args.header is not None:
+        generate(args.header, writeHeader, presets)
+
+    if args.module is not None:
+        generate(args.module, writeModule, presets)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,18 @@
 #
 # test harness for crc algorithm check
 #
+#   python harness.py
+#
+# prints the checksums of a few models, then checks every engine against a
+# bit at a time reference and the check values of the catalogue, and exits
+# with a non-zero status if any check fails
+#
+
+from __future__ import print_function
+
+import os
+import random
+import sys
 
 import crc
 
@@ -33,7 +45,7 @@ refout   = True
 xorout   = 0xffffffff
 # checksum should be cbf43926
 # cksum = crc.crc(s, width, poly, init, refin, refout, xorout)
-# print "CRC32 checksum = %08x" % cksum
+# print("CRC32 checksum = %08x" % cksum)
 
 # CRC16/CCITT
 poly     = 0x1021
@@ -44,7 +56,7 @@ refout   = False
 xorout   = 0x0000
 # checksum should be
 cksum = crc.crc(s, width, poly, init, refin, refout, xorout)
-print "CRC16/CCITT checksum = %04x" % cksum
+print("CRC16/CCITT checksum = %04x" % cksum)
 
 # CRC16/ARC
 poly     = 0x8005
@@ -55,7 +67,7 @@ refout   = True
 xorout   = 0x0000
 # checksum should be
 cksum = crc.crc(s, width, poly, init, refin, refout, xorout)
-print "CRC16/ARC checksum = %04x" % cksum
+print("CRC16/ARC checksum = %04x" % cksum)
 
 # CRC16/XMODEM
 poly     = 0x8408
@@ -66,7 +78,7 @@ refout   = True
 xorout   = 0x0000
 # checksum should be
 cksum = crc.crc(s, width, poly, init, refin, refout, xorout)
-print "CRC16/XMODEM checksum = %04x" % cksum
+print("CRC16/XMODEM checksum = %04x" % cksum)
 
 # CRC8
 poly     = 0x31
@@ -108,6 +120,545 @@ s = [0x02, 0x1c, 0xb8, 0x01, 0x00, 0x00, 0x00]
 s = [0x2d, 0x00, 0x4b, 0x46, 0xff, 0xff, 0x08, 0x10]
 s = [0x44, 0x01, 0x1e, 0x0a, 0x7f, 0xff, 0x0c, 0x10]
 # cksum = crc.crc(s, width, poly, init, refin, refout, xorout)
-# print "checksum = %02x" % cksum
+# print("checksum = %02x" % cksum)
+
+
+
+
+#
+# checks of every engine; each check is counted, and failures are printed
+#
+checks = [0]
+failures = []
+
+def check(ok, what):
+    checks[0] = checks[0] + 1
+    if not ok:
+        failures.append(what)
+        print("FAIL: %s" % what)
+
+
+#
+# bit at a time reference, straight from the definition of the CRC model,
+# for any width
+#
+def reference(msg, width, poly, init, refin, refout, xorout):
+    top = 1 << (width - 1)
+    wmask = (1 << width) - 1
+    reg = init
+
+    for b in bytearray(msg):
+        if refin:
+            b = crc.reflect(b, 8)
+
+        for i in range(7, -1, -1):
+            feedback = bool(reg & top) != bool((b >> i) & 1)
+            reg = (reg << 1) & wmask
+            if feedback:
+                reg = reg ^ poly
+
+    if refout:
+        reg = crc.reflect(reg, width)
+
+    return reg ^ xorout
+
+
+# the models of the catalogue, as CrcModel objects built from the parameters
+def catalogueModels():
+    return [(entry[0], crc.crc_model(entry[0])) for entry in crc.CATALOGUE]
+
+
+# a model running without the C library, with the given number of slices
+def pureModel(model, slices=None):
+    m = crc.CrcModel(*model.params(), slices=slices)
+    m._native = None
+    return m
+
+
+#
+# the check value (the checksum of "123456789") of every model in the
+# catalogue, from the reference, the pure Python engine, the C library and crc()
+#
+def checkCatalogue():
+    for name, width, poly, init, refin, refout, xorout, value, aliases in crc.CATALOGUE:
+        params = (width, poly, init, refin, refout, xorout)
+        model = crc.crc_model(name)
+
+        check(reference(b"123456789", *params) == value, "reference check value of %s" % name)
+        check(pureModel(model).compute(b"123456789") == value, "pure Python check value of %s" % name)
+        check(model.compute(b"123456789") == value, "check value of %s" % name)
+        check(crc.crc(b"123456789", *params) == value, "crc() check value of %s" % name)
+
+        for alias in aliases:
+            check(crc.crc_model(alias) is model, "alias %s of %s" % (alias, name))
+
+
+#
+# every engine against the reference over messages of the sizes at which
+# the engines switch (slicing from 64 bytes, folding from 256), read from
+# bytes, bytearrays, memoryviews at odd offsets and lists
+#
+ENGINE_SIZES = [0, 1, 3, 8, 15, 16, 17, 63, 64, 65, 255, 256, 257, 1024, 1500]
+
+def checkEngines(rng):
+    data = bytearray(rng.getrandbits(8) for n in range(max(ENGINE_SIZES) + 1))
+
+    for name, model in catalogueModels():
+        engines = [("bytewise", pureModel(model))]
+        engines.extend(("slices=%d" % n, pureModel(model, n)) for n in (4, 8, 16))
+
+        if model._native is not None:
+            engines.append(("native", model))
+            engines.extend(("native slices=%d" % n, crc.CrcModel(*model.params(), slices=n))
+                           for n in (1, 4, 8, 16))
+
+        for size in ENGINE_SIZES:
+            msg = bytes(data[1:size + 1])
+            want = reference(msg, *model.params())
+
+            for engine, m in engines:
+                got = [m.compute(msg), m.compute(bytearray(msg))]
+                if not crc.PY2:
+                    got.append(m.compute(memoryview(data)[1:size + 1]))
+                if m._native is None:
+                    got.append(m.compute(list(bytearray(msg))))
+
+                check(got == [want] * len(got), "%s %s over %d bytes" % (name, engine, size))
+
+            # incremental calculation in uneven chunks
+            h = crc.new(model)
+            for n in range(0, size, 7):
+                h.update(msg[n:n + 7])
+            check(h.checksum() == want, "%s incremental over %d bytes" % (name, size))
+
+
+#
+# crc_combine against checksums of the joined message, cut at random
+#
+def checkCombine(rng):
+    for size in (0, 1, 17, 300, 5000):
+        msg = bytes(bytearray(rng.getrandbits(8) for n in range(size)))
+        cut = rng.randint(0, size)
+
+        for name, model in catalogueModels():
+            a, b = msg[:cut], msg[cut:]
+            check(crc.crc_combine(model, model.compute(a), model.compute(b), len(b)) == model.compute(msg),
+                  "%s combine at %d of %d bytes" % (name, cut, size))
+
+
+#
+# crc_iov against checksums of the joined fragments, cut at random
+#
+def checkIov(rng):
+    for size in (0, 1, 17, 300, 5000):
+        msg = bytes(bytearray(rng.getrandbits(8) for n in range(size)))
+        cuts = sorted(rng.randint(0, size) for n in range(3))
+        fragments = [msg[:cuts[0]], bytearray(msg[cuts[0]:cuts[1]]), msg[cuts[1]:cuts[2]], msg[cuts[2]:]]
+
+        for name, model in catalogueModels():
+            check(crc.crc_iov(model, fragments) == model.compute(msg), "%s crc_iov of %d bytes" % (name, size))
+
+
+#
+# crc_multi against each model on its own
+#
+def checkMulti(rng):
+    models = [model for name, model in catalogueModels()]
+
+    for size in (0, 1, 17, 300, 5000):
+        msg = bytes(bytearray(rng.getrandbits(8) for n in range(size)))
+        check(crc.crc_multi(models, msg) == [model.compute(msg) for model in models],
+              "crc_multi of %d bytes" % size)
+
+
+#
+# crc_batch against each record on its own, when NumPy is installed
+#
+def checkBatch(rng):
+    try:
+        import numpy
+    except ImportError:
+        return
+
+    records = numpy.array([[rng.getrandbits(8) for n in range(40)] for r in range(20)], dtype=numpy.uint8)
+    lengths = [rng.randint(0, 40) for r in range(20)]
+
+    for name, model in catalogueModels():
+        if model.width > 64:
+            continue
+
+        got = [int(c) for c in crc.crc_batch(records, model, lengths)]
+        want = [model.compute(bytes(bytearray(records[r, :lengths[r]]))) for r in range(20)]
+        check(got == want, "%s crc_batch" % name)
+
+
+#
+# the solver should find every model of up to 32 bits from a few messages
+# and their checksums; it may also list models which agree on them
+#
+def checkSolver(rng):
+    import crcsolve
+
+    for name, model in catalogueModels()[::4]:
+        if model.width > 32:
+            continue
+
+        samples = []
+        for size in (9, 9, 9, 9, 13, 20):
+            msg = bytearray(rng.getrandbits(8) for n in range(size))
+            samples.append((msg, model.compute(msg)))
+
+        check(model.params() in crcsolve.crc_solve(samples, model.width), "solver finds %s" % name)
+
+    # two messages of the same length and one more are enough
+    for name in ("CRC-24/OPENPGP", "CRC-31/PHILIPS", "CRC-32/ISCSI", "CRC-32/ISO-HDLC"):
+        model = crc.crc_model(name)
+
+        samples = []
+        for size in (200, 200, 45):
+            msg = bytearray(rng.getrandbits(8) for n in range(size))
+            samples.append((msg, model.compute(msg)))
+
+        check(model.params() in crcsolve.crc_solve(samples, model.width), "solver finds %s from three messages" % name)
+
+
+#
+# crc_patch and crc_update_range at the start, the middle and the end of
+# messages, for every model of the catalogue: every width, including those
+# which are not a multiple of 8, and every combination of refin and refout
+#
+def editPositions(size, nbytes):
+    return sorted(set([0, (size - nbytes) // 2, size - nbytes]))
+
+
+def checkPatch(rng):
+    for name, model in catalogueModels():
+        nbytes = (model.width + 7) // 8
+
+        for m in (model, pureModel(model)):
+            for size in (nbytes, nbytes + 1, 100, 5000):
+                msg = bytearray(rng.getrandbits(8) for n in range(size))
+                cksum = m.compute(msg)
+
+                for offset in editPositions(size, nbytes):
+                    target = rng.getrandbits(model.width)
+                    patched = bytearray(msg)
+                    patched[offset:offset + nbytes] = crc.crc_patch(m, msg, offset, target, cksum)
+                    check(m.compute(patched) == target, "%s patch at %d of %d bytes" % (name, offset, size))
+
+            # the patch is found with and without the checksum of the message
+            check(crc.crc_patch(m, msg, 0, 0) == crc.crc_patch(m, msg, 0, 0, m.compute(msg)),
+                  "%s patch without the checksum" % name)
+
+
+def checkUpdateRange(rng):
+    for name, model in catalogueModels():
+        for m in (model, pureModel(model)):
+            for size in (1, 100, 5000):
+                msg = bytearray(rng.getrandbits(8) for n in range(size))
+                cksum = m.compute(msg)
+
+                for length in sorted(set(min(size, n) for n in (0, 1, 8, 1500))):
+                    for offset in editPositions(size, length):
+                        new = bytearray(rng.getrandbits(8) for n in range(length))
+                        edited = bytearray(msg)
+                        edited[offset:offset + length] = new
+
+                        got = crc.crc_update_range(m, cksum, size, offset, msg[offset:offset + length], new)
+                        check(got == m.compute(edited),
+                              "%s update_range of %d bytes at %d of %d" % (name, length, offset, size))
+
+
+#
+# the C extension refuses to initialise a model twice, which would free a
+# context other threads may be using, and to run one never initialised
+#
+def checkExtension():
+    if crc._crc is None:
+        return
+
+    model = crc._crc.Model(32, 0x04C11DB7, 0xffffffff, True, True, 0xffffffff)
+
+    try:
+        model.__init__(16, 0x8005, 0, True, True, 0)
+        check(False, "_crc.Model initialised twice")
+    except RuntimeError:
+        pass
+
+    check(model.compute(b"123456789") == 0xcbf43926, "_crc.Model kept after a second __init__")
+
+    try:
+        crc._crc.Model.__new__(crc._crc.Model).compute(b"123456789")
+        check(False, "_crc.Model run without __init__")
+    except RuntimeError:
+        pass
+
+
+#
+# crcindex on temporary files: the index built from a file, saved and
+# loaded, the checksum of the whole file from it, scans of files which are
+# unchanged, silently corrupted and edited, growing or shrinking their last
+# block, and sidecars which are damaged
+#
+INDEX_BLOCK = 1000
+
+def indexEdits(rng, data):
+    edited = bytearray(data)
+    edited[1500] = edited[1500] ^ 0x01
+
+    return [("a byte changed", edited),
+            ("the last block shrunk", data[:3200]),
+            ("the last block grown", data + bytearray(rng.getrandbits(8) for n in range(300))),
+            ("a block added", data + bytearray(rng.getrandbits(8) for n in range(700))),
+            ("a block removed", data[:2500]),
+            ("emptied", bytearray())]
+
+
+def writeFile(path, data):
+    f = open(path, "wb")
+    try:
+        f.write(data)
+    finally:
+        f.close()
+
+
+def checkIndex(rng):
+    import shutil
+    import tempfile
+
+    import crcindex
+
+    models = [(name, model) for name, model in catalogueModels()[::5] if model.width <= 64]
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "data")
+    sidecar = path + crcindex.SUFFIX
+
+    try:
+        for name, model in models:
+            for size in (0, 1, 999, 1000, 3500):
+                data = bytearray(rng.getrandbits(8) for n in range(size))
+                writeFile(path, data)
+                what = "%s index of %d bytes" % (name, size)
+
+                index = crcindex.build(path, model, INDEX_BLOCK)
+                blocks = [bytes(data[n:n + INDEX_BLOCK]) for n in range(0, size, INDEX_BLOCK)]
+                check(list(index.checksums) == [model.compute(b) for b in blocks], "%s blocks" % what)
+                check(index.checksum() == model.compute(data), "%s checksum()" % what)
+
+                index.save(sidecar)
+                loaded = crcindex.CrcIndex.load(sidecar)
+                check(loaded.model.params() == model.params() and loaded.size == size and
+                      loaded.mtime == index.mtime and loaded.checksums == index.checksums, "%s saved" % what)
+
+                check(crcindex.scan(path, loaded) == (loaded, []), "%s scan unchanged" % what)
+                check(crcindex.scan(path, loaded, 1.0) == (loaded, []), "%s scan sampled" % what)
+
+            # corruption under an unchanged size and modification time is found by sampling
+            st = os.stat(path)
+            corrupt = bytearray(data)
+            corrupt[1234] = corrupt[1234] ^ 0x80
+            writeFile(path, corrupt)
+            os.utime(path, (st.st_atime, st.st_mtime))
+            loaded.mtime = crcindex.mtimeNs(os.stat(path))
+            check(crcindex.scan(path, loaded, 1.0) == (loaded, [1]), "%s scan of a corrupt block" % name)
+
+            for edit, edited in indexEdits(rng, data):
+                writeFile(path, edited)
+                os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+                count = max(len(data), len(edited))
+                want = [n for n in range(0, (count + INDEX_BLOCK - 1) // INDEX_BLOCK)
+                        if data[n * INDEX_BLOCK:(n + 1) * INDEX_BLOCK] != edited[n * INDEX_BLOCK:(n + 1) * INDEX_BLOCK]]
+
+                new, changed = crcindex.scan(path, loaded)
+                check(new is not loaded and changed == want, "%s scan with %s" % (name, edit))
+                check(new.checksums == crcindex.build(path, model, INDEX_BLOCK).checksums and
+                      new.checksum() == model.compute(edited), "%s index with %s" % (name, edit))
+
+        # a damaged sidecar is refused
+        index.save(sidecar)
+        f = open(sidecar, "rb")
+        try:
+            saved = bytearray(f.read())
+        finally:
+            f.close()
+
+        flipped = bytearray(saved)
+        flipped[len(saved) // 2] = flipped[len(saved) // 2] ^ 0x04
+        damaged = [("a flipped bit", flipped), ("a truncated file", saved[:-3]),
+                   ("a bad magic", b"CRCIDX9\n" + saved[8:]), ("an empty file", bytearray())]
+
+        for damage, content in damaged:
+            writeFile(sidecar, content)
+            try:
+                crcindex.CrcIndex.load(sidecar)
+                check(False, "index load with %s" % damage)
+            except ValueError:
+                pass
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+#
+# crcasync under Python 3, driven with run_until_complete so that this file
+# still parses under Python 2: reads through CrcStreamReader, checksum_stream
+# to the end of a stream, over a given length and past the end of a short
+# stream, and CrcProtocolMixin fed a mix of chunks checksummed inline and in
+# a thread pool, which must still be applied in the order they arrive; the
+# threshold is lowered so that both paths are taken
+#
+ASYNC_THRESHOLD = 1000
+
+def streamOf(asyncio, data, piece=3000):
+    reader = asyncio.StreamReader()
+    for n in range(0, len(data), piece):
+        reader.feed_data(bytes(data[n:n + piece]))
+    reader.feed_eof()
+
+    return reader
+
+
+def checkAsync(rng):
+    if crc.PY2:
+        return
+
+    import asyncio
+    import concurrent.futures
+
+    import crcasync
+
+    model = crc.CRC32C
+    data = bytearray(rng.getrandbits(8) for n in range(60000))
+    data = data.replace(b"|", b"-").replace(b"\n", b"-")
+    data[7000] = ord("|")
+    data[12000] = ord("\n")
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    executor = concurrent.futures.ThreadPoolExecutor(4)
+
+    try:
+        stream = crcasync.CrcStreamReader(streamOf(asyncio, data), model, ASYNC_THRESHOLD, executor)
+        got = b"".join([loop.run_until_complete(stream.readexactly(100)),
+                        loop.run_until_complete(stream.readexactly(5000)),
+                        loop.run_until_complete(stream.readuntil(b"|")),
+                        loop.run_until_complete(stream.readline()),
+                        loop.run_until_complete(stream.read(3000))])
+        check(got == bytes(data[:len(got)]) and stream.checksum() == model.compute(got),
+              "CrcStreamReader over %d bytes" % len(got))
+
+        stream.reset()
+        rest = loop.run_until_complete(stream.read())
+        check(rest == bytes(data[len(got):]) and stream.checksum() == model.compute(rest) and stream.at_eof(),
+              "CrcStreamReader reset and read to the end")
+
+        for nbytes in (None, 0, 999, 1000, 50000, len(data)):
+            reader = streamOf(asyncio, data)
+            cksum = loop.run_until_complete(crcasync.checksum_stream(reader, model, nbytes, 4096,
+                                                                     ASYNC_THRESHOLD, executor))
+            length = len(data) if nbytes is None else nbytes
+            check(cksum == model.compute(data[:length]) and loop.run_until_complete(reader.read()) == data[length:],
+                  "checksum_stream of %s bytes" % nbytes)
+
+        try:
+            loop.run_until_complete(crcasync.checksum_stream(streamOf(asyncio, data), model, len(data) + 10))
+            check(False, "checksum_stream past the end")
+        except asyncio.IncompleteReadError as e:
+            check(e.expected == len(data) + 10 and e.consumed == len(data) and e.partial == b"",
+                  "checksum_stream past the end")
+
+        class Protocol(crcasync.CrcProtocolMixin, asyncio.Protocol):
+            crc_model = model
+            crc_threshold = ASYNC_THRESHOLD
+            crc_executor = executor
+
+        protocol = Protocol()
+        sizes = [10, 5000, 1, 999, 1000, 20000, 3, 0, 7000, 50, 2]
+        fed = bytearray()
+
+        for rounds in range(2):
+            # without yielding to the loop, so that offloaded updates queue up
+            for size in sizes:
+                chunk = bytes(bytearray(rng.getrandbits(8) for n in range(size)))
+                protocol.data_received(chunk)
+                fed.extend(chunk)
+
+            check(loop.run_until_complete(protocol.crc_checksum()) == model.compute(fed),
+                  "CrcProtocolMixin over %d bytes" % len(fed))
+
+        protocol.crc_reset()
+        protocol.data_received(bytes(data))
+        check(loop.run_until_complete(protocol.crc_checksum()) == model.compute(data), "CrcProtocolMixin reset")
+    finally:
+        executor.shutdown()
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+#
+# crc_parallel over buffers and files against the checksum of the whole
+# input, for worker counts which do and do not divide the size, and sizes
+# either side of PARALLEL_MIN_CHUNK, below which an input is not split
+# further; without the C extension fewer models and counts are run, as the
+# pure Python engine takes seconds over these sizes
+#
+def checkParallel(rng):
+    import shutil
+    import tempfile
+
+    mb = crc.PARALLEL_MIN_CHUNK
+    sizes = [0, 1, mb - 1, mb, mb + 1, 2 * mb + 1, 3 * mb + 12345]
+
+    if crc._crc is not None:
+        models = [crc.CRC32, crc.CRC64_XZ, crc.crc_model("CRC-5/USB")]
+        counts = [1, 2, 3, 8]
+    else:
+        models = [crc.CRC32]
+        counts = [3]
+
+    # a random block of a length prime to the chunk sizes, repeated
+    block = bytearray(rng.getrandbits(8) for n in range(65521))
+    data = (block * (max(sizes) // len(block) + 1))[:max(sizes)]
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "data")
+
+    try:
+        for size in sizes:
+            msg = data[:size]
+            writeFile(path, msg)
+
+            for model in models:
+                want = model.compute(msg)
+
+                for workers in counts:
+                    what = "%r crc_parallel of %d bytes with %d workers" % (model, size, workers)
+                    check(crc.crc_parallel(msg, model, workers) == want, what)
+                    check(crc.crc_parallel(path, model, workers) == want, "%s from a file" % what)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def runChecks():
+    rng = random.Random(1)
+
+    checkCatalogue()
+    checkExtension()
+    checkEngines(rng)
+    checkCombine(rng)
+    checkIov(rng)
+    checkMulti(rng)
+    checkBatch(rng)
+    checkSolver(rng)
+    checkPatch(rng)
+    checkUpdateRange(rng)
+    checkIndex(rng)
+    checkAsync(rng)
+    checkParallel(rng)
+
+    print("%d checks, %d failed (%s)" % (checks[0], len(failures),
+                                         "C library" if crc._crc is not None else "pure Python"))
+
+    return 1 if failures else 0
 
 
+sys.exit(runChecks())
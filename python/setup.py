@@ -0,0 +1,49 @@
+#!/usr/bin/python
+
+#
+# build the _crc extension module from the C library:
+#
+#   python setup.py build_ext --inplace
+#
+# crc.py uses the extension when it can be imported and otherwise falls
+# back to its pure Python implementation
+#
+# the lookup tables of the preset models are generated first by
+# gentables.py, into ../c/crctables.h for the extension and crctables.py for
+# crc.py
+#
+
+from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
+from setuptools.command.build_py import build_py
+
+import gentables
+
+
+def withTables(command):
+    class WithTables(command):
+
+        def run(self):
+            gentables.main([])
+            command.run(self)
+
+    return WithTables
+
+
+setup(
+    name="crc",
+    py_modules=["crc", "crcasync", "crctables"],
+    cmdclass={
+        "build_ext": withTables(build_ext),
+        "build_py": withTables(build_py),
+    },
+    ext_modules=[
+        Extension(
+            "_crc",
+            sources=["_crcmodule.c", "../c/crc.c"],
+            include_dirs=["../c"],
+            define_macros=[("CRC_STATIC_TABLES", None)],
+            libraries=["pthread"],
+        ),
+    ],
+)
@@ -1,11 +1,447 @@
+
 #include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <pthread.h>
 #include "../c/crc.h"
 
+/* message sizes at which the engines switch: slicing from 64 bytes, folding from 256 */
+static const uint32_t engineSizes[] = {0, 1, 3, 8, 15, 16, 17, 63, 64, 65, 255, 256, 257, 1024, 4096, 5000};
+
+#define NUM_SIZES  ((int) (sizeof(engineSizes) / sizeof(engineSizes[0])))
+#define MAX_SIZE   5000
+
+static const int sliceCounts[] = {1, 4, 8, 16, CRC_SLICE_AUTO};
+
+#define NUM_SLICES ((int) (sizeof(sliceCounts) / sizeof(sliceCounts[0])))
+
+static const int badSliceCounts[] = {-1, 2, 3, 17};
+
+#define NUM_BAD_SLICES ((int) (sizeof(badSliceCounts) / sizeof(badSliceCounts[0])))
+
+static int checks;
+static int failures;
+
+
+void check(int ok, const char *what, const char *name, uint32_t size)
+{
+    checks++;
+    if (!ok)
+    {
+        failures++;
+        printf("FAIL: %s %s over %u bytes\n", name, what, size);
+    }
+}
+
+
+/*
+** bit at a time reference, straight from the definition of the CRC model,
+** for any width
+*/
+uint64_t reference(crc_t *p, uint32_t size, uint8_t *msg)
+{
+    int i;
+    uint32_t n;
+    uint64_t top;
+    uint64_t wmask;
+    uint64_t reg;
+    uint64_t out;
+    uint8_t b;
+    int feedback;
+
+    top = (uint64_t) 1 << (p->width - 1);
+    wmask = (p->width == 64) ? ~(uint64_t) 0 : ((uint64_t) 1 << p->width) - 1;
+    reg = p->init;
+
+    for (n = 0; n < size; n++)
+    {
+        b = msg[n];
+        for (i = 0; i < 8; i++)
+        {
+            /* bits of a refin byte are taken from the least significant end */
+            feedback = ((reg & top) != 0) ^ ((p->refin ? b >> i : b >> (7 - i)) & 1);
+            reg = (reg << 1) & wmask;
+            if (feedback)
+                reg ^= p->poly;
+        }
+    }
+
+    if (p->refout)
+    {
+        out = 0;
+        for (i = 0; i < p->width; i++)
+            out |= ((reg >> i) & 1) << (p->width - 1 - i);
+        reg = out;
+    }
+
+    return reg ^ p->xorout;
+}
+
+
+/* the checksum of a message with a given number of slices, and the status of the update */
+int sliced(crc_t *p, int slices, uint32_t size, uint8_t *msg, uint64_t *cksum)
+{
+    uint64_t reg;
+    int status;
+
+    reg = crc_init(p);
+    status = crc_update_sliced(p, &reg, slices, size, msg);
+    *cksum = crc_final(p, reg);
+
+    return status;
+}
+
+
+int ctxSliced(crc_ctx_t *ctx, int slices, uint32_t size, uint8_t *msg, uint64_t *cksum)
+{
+    uint64_t reg;
+    int status;
+
+    reg = crc_ctx_init(ctx);
+    status = crc_ctx_update_sliced(ctx, &reg, slices, size, msg);
+    *cksum = crc_ctx_final(ctx, reg);
+
+    return status;
+}
+
+
+/* the check value of every named model, from the reference and the library */
+void checkModels(void)
+{
+    int n;
+    crc_model_t model;
+    uint8_t s[10] = "123456789";
+
+    for (n = 0; crc_model_at(n, &model) == 0; n++)
+    {
+        check(reference(&model.pars, 9, s) == model.check, "reference check value", model.name, 9);
+        check(crc(&model.pars, 9, s) == model.check, "check value", model.name, 9);
+    }
+}
+
+
+/*
+** every engine against the reference: the byte at a time loop, slicing-by-4,
+** 8 and 16, and the automatic choice, which folds large messages when the
+** CPU can, through the table cache and through a context; the messages
+** start at an odd address so that the engines see unaligned data
+*/
+void checkEngines(uint8_t *data)
+{
+    int n;
+    int k;
+    int i;
+    uint32_t size;
+    uint32_t done;
+    uint64_t want;
+    uint64_t reg;
+    uint64_t got;
+    crc_model_t model;
+    crc_ctx_t *ctx;
+
+    for (n = 0; crc_model_at(n, &model) == 0; n++)
+    {
+        ctx = crc_ctx_new(&model.pars);
+
+        for (k = 0; k < NUM_SIZES; k++)
+        {
+            size = engineSizes[k];
+            want = reference(&model.pars, size, data + 1);
+
+            check(crc(&model.pars, size, data + 1) == want, "crc()", model.name, size);
+            check(crc_ctx_compute(ctx, size, data + 1) == want, "crc_ctx_compute()", model.name, size);
+
+            for (i = 0; i < NUM_SLICES; i++)
+            {
+                check(sliced(&model.pars, sliceCounts[i], size, data + 1, &got) == 0 && got == want,
+                      "crc_update_sliced()", model.name, size);
+                check(ctxSliced(ctx, sliceCounts[i], size, data + 1, &got) == 0 && got == want,
+                      "crc_ctx_update_sliced()", model.name, size);
+            }
+
+            /* any other number of slices is refused, and the register left as it is */
+            for (i = 0; i < NUM_BAD_SLICES; i++)
+            {
+                check(sliced(&model.pars, badSliceCounts[i], size, data + 1, &got) == -1 &&
+                      got == crc_final(&model.pars, crc_init(&model.pars)),
+                      "crc_update_sliced() with bad slices", model.name, size);
+                check(ctxSliced(ctx, badSliceCounts[i], size, data + 1, &got) == -1 &&
+                      got == crc_ctx_final(ctx, crc_ctx_init(ctx)),
+                      "crc_ctx_update_sliced() with bad slices", model.name, size);
+            }
+
+            /* incremental calculation in uneven chunks */
+            reg = crc_init(&model.pars);
+            for (done = 0; done < size; done += 300)
+                reg = crc_update(&model.pars, reg, size - done < 300 ? size - done : 300, data + 1 + done);
+            check(crc_final(&model.pars, reg) == want, "incremental", model.name, size);
+        }
+
+        crc_ctx_free(ctx);
+    }
+}
+
+
+/* crc_combine against checksums of the joined message */
+void checkCombine(uint8_t *data)
+{
+    int n;
+    int k;
+    uint32_t size;
+    uint32_t cut;
+    uint64_t want;
+    uint64_t a;
+    uint64_t b;
+    crc_model_t model;
+    crc_ctx_t *ctx;
+
+    for (n = 0; crc_model_at(n, &model) == 0; n++)
+    {
+        ctx = crc_ctx_new(&model.pars);
+
+        for (k = 0; k < NUM_SIZES; k++)
+        {
+            size = engineSizes[k];
+            cut = size / 3;
+            want = crc(&model.pars, size, data);
+
+            a = crc(&model.pars, cut, data);
+            b = crc(&model.pars, size - cut, data + cut);
+            check(crc_combine(&model.pars, a, b, size - cut) == want, "crc_combine()", model.name, size);
+            check(crc_ctx_combine(ctx, a, b, size - cut) == want, "crc_ctx_combine()", model.name, size);
+        }
+
+        crc_ctx_free(ctx);
+    }
+}
+
+
+/* crc_iov over fragments, one of them empty, against the joined message */
+void checkIov(uint8_t *data)
+{
+    int n;
+    int k;
+    uint32_t size;
+    uint32_t cut;
+    uint64_t want;
+    crc_model_t model;
+    crc_ctx_t *ctx;
+    struct iovec iov[4];
+
+    for (n = 0; crc_model_at(n, &model) == 0; n++)
+    {
+        ctx = crc_ctx_new(&model.pars);
+
+        for (k = 0; k < NUM_SIZES; k++)
+        {
+            size = engineSizes[k];
+            cut = size / 3;
+            want = crc(&model.pars, size, data);
+
+            iov[0].iov_base = data;
+            iov[0].iov_len = cut;
+            iov[1].iov_base = data + cut;
+            iov[1].iov_len = 0;
+            iov[2].iov_base = data + cut;
+            iov[2].iov_len = size / 2 - cut;
+            iov[3].iov_base = data + size / 2;
+            iov[3].iov_len = size - size / 2;
+
+            check(crc_iov(&model.pars, iov, 4) == want, "crc_iov()", model.name, size);
+            check(crc_ctx_iov(ctx, iov, 4) == want, "crc_ctx_iov()", model.name, size);
+        }
+
+        crc_ctx_free(ctx);
+    }
+}
+
+
+/* crc_multi over every named model at once, against each model on its own */
+void checkMulti(uint8_t *data)
+{
+    int n;
+    int k;
+    int nmodels;
+    uint32_t size;
+    crc_model_t model;
+    crc_ctx_t *ctxs[256];
+    uint64_t cksums[256];
+
+    for (nmodels = 0; nmodels < 256 && crc_model_at(nmodels, &model) == 0; nmodels++)
+        ctxs[nmodels] = crc_ctx_new(&model.pars);
+
+    for (k = 0; k < NUM_SIZES; k++)
+    {
+        size = engineSizes[k];
+        crc_multi(ctxs, nmodels, size, data, cksums);
+
+        for (n = 0; n < nmodels; n++)
+        {
+            crc_model_at(n, &model);
+            check(cksums[n] == crc(&model.pars, size, data), "crc_multi()", model.name, size);
+        }
+    }
+
+    for (n = 0; n < nmodels; n++)
+        crc_ctx_free(ctxs[n]);
+}
+
+
+/*
+** crc_update_range at the start, the middle and the end of buffers, with
+** edits larger than the pieces the library works in, against checksums of
+** the edited buffer, for every named model
+*/
+void checkUpdateRange(uint8_t *data)
+{
+    int n;
+    int k;
+    int e;
+    int p;
+    uint32_t size;
+    uint32_t len;
+    uint64_t offset;
+    uint64_t old;
+    uint64_t want;
+    crc_model_t model;
+    crc_ctx_t *ctx;
+    uint8_t *edited;
+    static const uint32_t editSizes[] = {0, 1, 8, 1500};
+
+    edited = malloc(MAX_SIZE);
+
+    for (n = 0; crc_model_at(n, &model) == 0; n++)
+    {
+        ctx = crc_ctx_new(&model.pars);
+
+        for (k = 0; k < NUM_SIZES; k++)
+        {
+            size = engineSizes[k];
+            old = crc(&model.pars, size, data);
+
+            for (e = 0; e < 4; e++)
+            {
+                len = editSizes[e] < size ? editSizes[e] : size;
+
+                for (p = 0; p < 3; p++)
+                {
+                    offset = (p == 0) ? 0 : (p == 1) ? (size - len) / 2 : size - len;
+
+                    memcpy(edited, data, size);
+                    memcpy(edited + offset, data + MAX_SIZE - len, len);
+                    want = crc(&model.pars, size, edited);
+
+                    check(crc_update_range(&model.pars, old, size, offset, len, data + offset, edited + offset) == want,
+                          "crc_update_range()", model.name, size);
+                    check(crc_ctx_update_range(ctx, old, size, offset, len, data + offset, edited + offset) == want,
+                          "crc_ctx_update_range()", model.name, size);
+                }
+            }
+        }
+
+        crc_ctx_free(ctx);
+    }
+
+    free(edited);
+}
+
+/*
+** crc_parallel against the checksum of the whole buffer in one thread, for
+** thread counts which do and do not divide the size, and sizes either side
+** of the 1 MB below which a buffer is not split further; the buffer starts
+** at an odd address, so the chunks after the first do too
+*/
+#define PARALLEL_MB (1 << 20)
+
+static const uint32_t parallelSizes[] = {0, 1, PARALLEL_MB - 1, PARALLEL_MB, PARALLEL_MB + 1,
+                                         2 * PARALLEL_MB + 1, 3 * PARALLEL_MB + 12345, 8 * PARALLEL_MB + 7};
+static const int threadCounts[] = {0, 1, 2, 3, 4, 7, 8, 64};
+static const char *parallelModels[] = {"CRC-32/ISO-HDLC", "CRC-32/ISCSI", "CRC-64/XZ", "CRC-64/ECMA-182",
+                                       "CRC-16/ARC", "CRC-12/DECT", "CRC-5/USB"};
+
+#define NUM_PARALLEL_SIZES ((int) (sizeof(parallelSizes) / sizeof(parallelSizes[0])))
+#define NUM_THREAD_COUNTS  ((int) (sizeof(threadCounts) / sizeof(threadCounts[0])))
+#define NUM_PARALLEL_MODELS ((int) (sizeof(parallelModels) / sizeof(parallelModels[0])))
+
+void checkParallel(void)
+{
+    int n;
+    int k;
+    int t;
+    uint32_t size;
+    uint64_t want;
+    crc_model_t model;
+    uint8_t *buf;
+    char what[64];
+
+    buf = malloc(8 * PARALLEL_MB + 8);
+    for (n = 0; n < 8 * PARALLEL_MB + 8; n++)
+        buf[n] = rand();
+
+    for (n = 0; n < NUM_PARALLEL_MODELS; n++)
+    {
+        if (crc_model(parallelModels[n], &model) != 0)
+        {
+            check(FALSE, "missing from the catalogue", parallelModels[n], 0);
+            continue;
+        }
+
+        for (k = 0; k < NUM_PARALLEL_SIZES; k++)
+        {
+            size = parallelSizes[k];
+            want = crc(&model.pars, size, buf + 1);
+
+            for (t = 0; t < NUM_THREAD_COUNTS; t++)
+            {
+                sprintf(what, "crc_parallel() with %d threads", threadCounts[t]);
+                check(crc_parallel(&model.pars, size, buf + 1, threadCounts[t]) == want, what, model.name, size);
+            }
+        }
+    }
+
+    free(buf);
+}
+
+
+/* a model no other check uses, so that its tables are not in any cache */
+static crc_t threadModel = {0x1cf5, 13, 0x0000, TRUE, FALSE, 0x0000};
+
+
+void *cacheThread(void *data)
+{
+    crc(&threadModel, 64, data);
+    return NULL;
+}
+
+
+/* crc_cache_stats() counts the lookups of other threads, which have exited */
+void checkCacheStats(uint8_t *data)
+{
+    crc_cache_stats_t before;
+    crc_cache_stats_t after;
+    pthread_t thread;
+
+    crc_cache_stats(&before);
+
+    if (pthread_create(&thread, NULL, cacheThread, data) == 0)
+    {
+        pthread_join(thread, NULL);
+        crc_cache_stats(&after);
+        check(after.misses == before.misses + 1, "crc_cache_stats() of another thread", "cache", 64);
+    }
+
+    crc_cache_clear();
+    crc_cache_stats(&after);
+    check(after.hits == 0 && after.misses == 0 && after.evictions == 0, "crc_cache_clear()", "cache", 0);
+}
+
 int main(void)
 {
     uint32_t cksum;
     uint8_t  msg[8] = {0x44, 0x01, 0x1e, 0x0a, 0x7f, 0xff, 0x0c, 0x10};
     unsigned char s[10] = "123456789";
+    uint8_t *data;
+    int n;
 
     cksum = 0;
     // cksum = crc8_onewire(8, msg);
@@ -20,6 +456,24 @@ int main(void)
     cksum = crc32(9, s);
     printf("CRC32 checksum = %08x\n", cksum);
 
-    return 0;
-}
+    /* checks of every engine, against the reference */
+    data = malloc(MAX_SIZE + 1);
+    srand(1);
+    for (n = 0; n <= MAX_SIZE; n++)
+        data[n] = rand();
+
+    checkModels();
+    checkEngines(data);
+    checkCombine(data);
+    checkIov(data);
+    checkMulti(data);
+    checkUpdateRange(data);
+    checkParallel();
+    checkCacheStats(data);
 
+    free(data);
+
+    printf("%d checks, %d failed\n", checks, failures);
+
+    return failures != 0;
+}